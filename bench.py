@@ -0,0 +1,303 @@
+"""
+Offline benchmarks for bot.py's pure-Python hot paths on synthetic catalogs.
+
+Runs in a scratch directory so the bot's cache and config files are never touched,
+and needs no Discord connection: embeds and views are built locally and the few
+interaction objects involved are stubbed. Results are printed (or written) as JSON
+so runs can be compared across commits.
+
+    python bench.py --sizes 1000 10000 --output bench_output.txt
+"""
+import argparse
+import asyncio
+import copy
+import json
+import logging
+import os
+import platform
+import random
+import statistics
+import string
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+REPO_ROOT = os.path.dirname(os.path.abspath(__file__))
+INSTRUMENTS = ['vocals', 'guitar', 'bass', 'drums', 'plastic-bass', 'plastic-drums', 'plastic-guitar', 'plastic-keys']
+GENRES = ['Rock', 'Metal', 'Pop', 'Alternative', 'Punk', 'Electronic', 'Hip-Hop', 'Country']
+KEYS = ['A Major', 'B♭ Minor', 'C Major', 'D♭ Major', 'E Minor', 'F♯ Minor', 'G Major']
+WORDS = ['night', 'fire', 'heart', 'electric', 'dream', 'stone', 'river', 'ghost', 'summer', 'static',
+         'velvet', 'thunder', 'echo', 'neon', 'shadow', 'crystal', 'wild', 'midnight', 'silver', 'broken']
+
+
+def synthetic_words(rng: random.Random, count: int) -> str:
+    return ' '.join(rng.choice(WORDS).title() for _ in range(count))
+
+
+def synthetic_track(rng: random.Random, index: int) -> dict:
+    shortname = f"{''.join(rng.choices(string.ascii_lowercase, k=6))}{index}"
+    created = datetime(2023, 1, 1) + timedelta(minutes=rng.randrange(0, 1_000_000))
+    return {
+        'id': shortname,
+        'title': synthetic_words(rng, rng.randint(1, 4)),
+        'artist': synthetic_words(rng, rng.randint(1, 2)),
+        'album': synthetic_words(rng, rng.randint(1, 3)),
+        'genre': rng.choice(GENRES),
+        'releaseYear': rng.randint(1965, 2025),
+        'duration': f"{rng.randint(2, 7)}m {rng.randint(0, 59)}s",
+        'bpm': rng.randint(70, 220),
+        'key': rng.choice(KEYS),
+        'rating': rng.choice(['Family Friendly', 'Supervision Recommended']),
+        'charter': synthetic_words(rng, 1),
+        'complete': f"{rng.choice([25, 50, 75, 100])}% Complete",
+        'createdAt': created.isoformat() + 'Z',
+        'lastFeatured': created.strftime('%m/%d/%Y, %I:%M:%S %p'),
+        'currentversion': rng.randint(1, 4),
+        'cover': f"{shortname}.png",
+        'previewUrl': f"assets/audio/{shortname}.mp3",
+        'previewTime': rng.randint(0, 60000),
+        'previewEndTime': rng.randint(60000, 120000),
+        'videoUrl': f"{shortname}.mp4",
+        'spotify': ''.join(rng.choices(string.ascii_letters + string.digits, k=22)),
+        'download': f"https://example.invalid/charts/{shortname}.zip",
+        'loading_phrase': synthetic_words(rng, 6),
+        'difficulties': {inst: rng.randint(-1, 6) for inst in INSTRUMENTS},
+        'youtubeLinks': {part: f"https://youtu.be/{shortname}{part}" for part in ('vocals', 'lead', 'drums', 'bass') if rng.random() < 0.5},
+        'embedColor': 'color1',
+        'modalShadowColors': {
+            'default': {'color1': f"#{rng.randrange(0x1000000):06X}", 'color2': f"#{rng.randrange(0x1000000):06X}"},
+            'hover': {'color1': f"#{rng.randrange(0x1000000):06X}", 'color2': f"#{rng.randrange(0x1000000):06X}"},
+        },
+    }
+
+
+def modify_track(rng: random.Random, track: dict) -> dict:
+    modified = copy.deepcopy(track)
+    modified['currentversion'] += 1
+    modified['bpm'] += rng.randint(1, 5)
+    modified['difficulties'][rng.choice(INSTRUMENTS)] = rng.randint(0, 6)
+    modified['modalShadowColors']['hover']['color1'] = f"#{rng.randrange(0x1000000):06X}"
+    return modified
+
+
+def synthetic_history(rng: random.Random, tracks: list, entries_per_track: int = 8) -> tuple[dict, dict]:
+    history, midi_changes = {}, {}
+    for track in tracks:
+        entries = []
+        for n in range(rng.randint(0, entries_per_track)):
+            timestamp = (datetime(2024, 1, 1) + timedelta(hours=rng.randrange(0, 20000), microseconds=n)).isoformat()
+            changes = {'bpm': {'old': rng.randint(70, 220), 'new': rng.randint(70, 220)},
+                       f"difficulties.{rng.choice(INSTRUMENTS)}": {'old': rng.randint(0, 6), 'new': rng.randint(0, 6)}}
+            if rng.random() < 0.3:
+                changes['currentversion'] = {'old': 1, 'new': 2}
+                midi_changes[timestamp] = [{'instrument': 'PART DRUMS', 'image_file': f"{track['id']}_drums.png"}]
+            entries.append({'timestamp': timestamp, 'changes': changes})
+        if entries:
+            history[track['id']] = sorted(entries, key=lambda e: e['timestamp'], reverse=True)
+    return history, midi_changes
+
+
+def measure(func, min_time: float, max_iterations: int) -> dict:
+    timings = []
+    deadline = time.perf_counter() + min_time
+    while len(timings) < max_iterations and (not timings or time.perf_counter() < deadline):
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1000)
+    return {
+        'iterations': len(timings),
+        'min_ms': round(min(timings), 4),
+        'median_ms': round(statistics.median(timings), 4),
+        'mean_ms': round(statistics.fmean(timings), 4),
+    }
+
+
+async def measure_async(func, min_time: float, max_iterations: int) -> dict:
+    timings = []
+    deadline = time.perf_counter() + min_time
+    while len(timings) < max_iterations and (not timings or time.perf_counter() < deadline):
+        started = time.perf_counter()
+        await func()
+        timings.append((time.perf_counter() - started) * 1000)
+    return {
+        'iterations': len(timings),
+        'min_ms': round(min(timings), 4),
+        'median_ms': round(statistics.median(timings), 4),
+        'mean_ms': round(statistics.fmean(timings), 4),
+    }
+
+
+async def run_size(bot, size: int, rng: random.Random, min_time: float, max_iterations: int) -> list:
+    results = []
+
+    def record(name: str, stats: dict, **params):
+        results.append({'size': size, 'name': name, **params, **stats})
+        logging.warning(f"[{size}] {name} {params or ''}: median {stats['median_ms']:.3f} ms over {stats['iterations']} runs")
+
+    tracks = [synthetic_track(rng, i) for i in range(size)]
+    with open('tracks.json', 'w') as f:
+        json.dump({t['id']: {k: v for k, v in t.items() if k != 'id'} for t in tracks}, f)
+    with open('tracks.json', 'r') as f:
+        raw = json.load(f)
+    tracks = [{**info, 'id': track_id} for track_id, info in raw.items()]
+    bot.catalog.swap(tracks, persist=False)
+
+    history, midi_changes = synthetic_history(rng, tracks[:min(size, 2000)])
+    bot.save_json_file(bot.TRACK_HISTORY_FILE, history)
+    bot.save_json_file(bot.MIDI_CHANGES_FILE, midi_changes)
+
+    sample = rng.sample(tracks, min(50, size))
+    queries = [sample[0]['title'].lower(), sample[1]['artist'].split(' ')[0].lower(), sample[2]['id'], 'midnigth echo']
+
+    for query in queries:
+        record('fuzzy_search_tracks', measure(lambda: bot.fuzzy_search_tracks(bot.get_cached_track_data(), query), min_time, max_iterations), query=query)
+    for sort_method in ('latest', 'earliest', 'longest', 'shortest', 'fastest', 'slowest', 'newest', 'oldest',
+                        'charter', 'charter_za', 'hardest', 'easiest'):
+        record('fuzzy_search_tracks', measure(lambda: bot.fuzzy_search_tracks(bot.get_cached_track_data(), '', sort_method), min_time, max_iterations), sort=sort_method)
+
+    interaction = SimpleNamespace(user=SimpleNamespace(id=1), guild=None)
+    for current in ('', 'ni', sample[3]['title'][:5].lower()):
+        record('track_autocomplete', await measure_async(lambda: bot.track_autocomplete(interaction, current), min_time, max_iterations), current=current)
+
+    def embed_cold():
+        bot.track_embed_cache.clear()
+        for track in sample:
+            bot.create_track_embed_and_view(track, interaction.user.id)
+    record('create_track_embed_and_view', measure(embed_cold, min_time, max_iterations), tracks=len(sample), cache='cold')
+    record('create_track_embed_and_view', measure(lambda: [bot.create_track_embed_and_view(t, interaction.user.id) for t in sample], min_time, max_iterations),
+           tracks=len(sample), cache='warm')
+
+    pairs = [(track, modify_track(rng, track)) for track in sample]
+    record('create_update_log_embed', measure(lambda: [bot.create_update_log_embed(old, new) for old, new in pairs], min_time, max_iterations), tracks=len(pairs))
+
+    modified_ids = {t['id'] for t in rng.sample(tracks, max(1, size // 100))}
+    live_tracks = [modify_track(rng, t) if t['id'] in modified_ids else copy.deepcopy(t) for t in tracks[:-max(1, size // 200)]]
+    live_tracks += [synthetic_track(rng, size + i) for i in range(max(1, size // 200))]
+    live_tracks = [bot.Track(t) for t in live_tracks]
+    record('detect_track_changes', measure(lambda: bot.detect_track_changes(bot.catalog.by_id, bot.catalog.fingerprints, live_tracks),
+                                           min_time, max_iterations), modified=len(modified_ids))
+
+    history_tracks = [t for t in tracks if t['id'] in history][:20]
+    record('HistoryPaginatorView', measure(lambda: [bot.HistoryPaginatorView(t, interaction.user.id) for t in history_tracks], min_time, max_iterations),
+           tracks=len(history_tracks), stage='init')
+    views = [bot.HistoryPaginatorView(t, interaction.user.id) for t in history_tracks]
+    record('HistoryPaginatorView.create_embed', measure(lambda: [view.create_embed() for view in views], min_time, max_iterations), tracks=len(views))
+    record_track_storage(results, record, raw, min_time, max_iterations)
+    record_catalog_ingest(results, record, raw, min_time, max_iterations)
+    return results
+
+
+def record_track_storage(results: list, record, raw: dict, min_time: float, max_iterations: int):
+    """Compares plain JSON dicts with Track records: retained memory and field access over the catalog."""
+    from track_record import Track
+
+    def retained_bytes(build) -> int:
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        built = build()
+        size = tracemalloc.get_traced_memory()[0] - before
+        tracemalloc.stop()
+        del built
+        return size
+
+    text = json.dumps(raw)
+    dict_bytes = retained_bytes(lambda: [{**info, 'id': track_id} for track_id, info in json.loads(text).items()])
+    track_bytes = retained_bytes(lambda: [Track({**info, 'id': track_id}) for track_id, info in json.loads(text).items()])
+    for storage, total in (('dict', dict_bytes), ('Track', track_bytes)):
+        per_track = round(total / max(1, len(raw)))
+        results.append({'size': len(raw), 'name': 'track_storage_bytes', 'storage': storage, 'bytes_per_track': per_track})
+        logging.warning(f"[{len(raw)}] track_storage_bytes {{'storage': '{storage}'}}: {per_track} bytes per track")
+
+    dicts = [{**info, 'id': track_id} for track_id, info in raw.items()]
+    records = [Track(t) for t in dicts]
+    record('track_field_access', measure(lambda: [(t.get('title'), t.get('artist'), t.get('id')) for t in dicts], min_time, max_iterations), storage='dict.get')
+    record('track_field_access', measure(lambda: [(t.title, t.artist, t.id) for t in records], min_time, max_iterations), storage='Track attribute')
+    record('track_field_access', measure(lambda: [(t.get('title'), t.get('artist'), t.get('id')) for t in records], min_time, max_iterations), storage='Track.get')
+
+
+def record_catalog_ingest(results: list, record, raw: dict, min_time: float, max_iterations: int):
+    """Compares parsing the whole live catalog body at once with the streaming parser: time and peak memory."""
+    from catalog_store import track_fingerprint
+    from track_record import Track
+    from track_stream import CHUNK_SIZE, TrackStreamParser
+
+    body = json.dumps(raw, indent=4).encode()
+
+    def whole():
+        tracks = []
+        for track_id, track_info in json.loads(body.decode()).items():
+            track_info['id'] = track_id
+            tracks.append(Track(track_info))
+        return tracks, {t.id: track_fingerprint(t) for t in tracks}
+
+    def streamed():
+        parser, tracks_by_id, fingerprints = TrackStreamParser(), {}, {}
+        for offset in range(0, len(body) + 1, CHUNK_SIZE):
+            entries = parser.feed(body[offset:offset + CHUNK_SIZE]) if offset < len(body) else parser.close()
+            for track_id, track_info in entries:
+                track_info['id'] = track_id
+                fingerprints[track_id] = track_fingerprint(track_info)
+                tracks_by_id[track_id] = Track(track_info)
+        return list(tracks_by_id.values()), fingerprints
+
+    for mode, ingest in (('whole', whole), ('streamed', streamed)):
+        tracemalloc.start()
+        ingest()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        results.append({'size': len(raw), 'name': 'catalog_ingest_peak_bytes', 'mode': mode, 'peak_bytes': peak})
+        logging.warning(f"[{len(raw)}] catalog_ingest_peak_bytes {{'mode': '{mode}'}}: {peak / 1e6:.1f} MB peak for a {len(body) / 1e6:.1f} MB body")
+        record('catalog_ingest', measure(ingest, min_time, max_iterations), mode=mode)
+
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def main(args):
+    sys.path.insert(0, REPO_ROOT)
+    output = os.path.abspath(args.output) if args.output else None
+    original_cwd = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="encore_bench_", ignore_cleanup_errors=True) as scratch:
+        os.chdir(scratch)
+        try:
+            logging.disable(logging.INFO)
+            import bot
+
+            results = []
+            for size in args.sizes:
+                results.extend(await run_size(bot, size, random.Random(args.seed), args.min_time, args.max_iterations))
+        finally:
+            os.chdir(original_cwd)
+
+    report = {
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'timestamp': datetime.now().isoformat(),
+        'seed': args.seed,
+        'results': results,
+    }
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            f.write(text)
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark bot.py hot paths on synthetic catalogs.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000], help="Catalog sizes to generate.")
+    parser.add_argument('--min-time', type=float, default=1.0, help="Minimum seconds to spend repeating each benchmark.")
+    parser.add_argument('--max-iterations', type=int, default=200, help="Upper bound on repetitions per benchmark.")
+    parser.add_argument('--seed', type=int, default=1234, help="Seed for the synthetic catalog generator.")
+    parser.add_argument('--output', help="Write the JSON report here instead of stdout.")
+    asyncio.run(main(parser.parse_args()))
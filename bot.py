@@ -1,26 +1,44 @@
+import time
+PROCESS_STARTED = time.perf_counter()
+
 import discord
 from discord import app_commands
 from discord.ext import tasks
 import aiohttp
 import json
+import hashlib
+import socket
 import asyncio
 import re
 import string
-import io
 from difflib import get_close_matches
-from datetime import datetime, timedelta
-import statistics
+from datetime import datetime, timedelta, timezone
+from typing import NamedTuple
 import os
 import random
 import uuid
-import compare_midi
-import subprocess
-import mido
-import requests
+import midi_chunks
+from chopt_pool import ChoptPool, ChoptQueueFull, ChoptTimeout, PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE
+from path_cache import PathCache
+from chart_store import ChartStore, StoredChart
+from workspace import SessionWorkspace, sweep_orphaned_workspaces
+from preview_clips import PreviewClipService
+from catalog_store import CatalogStore, track_fingerprint
+from track_record import Track
+from track_stream import CHUNK_SIZE as TRACK_STREAM_CHUNK_SIZE, TrackStreamError, iter_track_entries
+from poller import AdaptivePoller, PollOutcome
+from broadcast import BroadcastQueue, OutboundItem
+from metrics import MetricsRegistry, start_metrics_server
+from loop_watchdog import LoopLagMonitor
+from profiling import MODES as PROFILE_MODES, Profiler
+from cluster import ClusterCoordinator, ClusterStore
+from bot_stats import BotStats
+from chart_analytics import ChartAnalyticsIndex, analyze_chart
+from track_diff import Change, IgnoreTrie, changes_to_dict, diff_tracks
+import glob
 import enum
-import hashlib
+import heapq
 import logging
-from pydub import AudioSegment
 import urllib.parse 
 
 logging.basicConfig(
@@ -38,9 +56,19 @@ TRACK_HISTORY_FILE = "track_history.json"
 SUGGESTIONS_FILE = "suggestions.json"
 CHANGELOG_FILE = "changelog.json"
 MIDI_CHANGES_FILE = "midichanges.json"
+COMMAND_SYNC_FILE = "command_sync.json"
+CLUSTER_DATABASE_FILE = "cluster.db"
+BOT_STATS_FILE = "bot_stats.json"
+CHART_ANALYTICS_FILE = "chart_analytics.json"
 
 LOCAL_MIDI_FOLDER = "midi_files/"
 TEMP_FOLDER = "out/"
+PATH_CACHE_FOLDER = "path_cache/"
+PREVIEW_CACHE_FOLDER = "preview_cache/"
+PROFILE_FOLDER = "profiles/"
+REWRITTEN_MIDI_FOLDER = os.path.join(LOCAL_MIDI_FOLDER, "rewritten")
+CHOPT_EXECUTABLE = "chopt.exe"
+WORKSPACE_ORPHAN_AGE = 3600
 
 KEY_NAME_MAP = {
     "album": "Album",
@@ -111,12 +139,9 @@ KEY_NAME_MAP = {
 }
 
 
-intents = discord.Intents.default()
-client = discord.Client(intents=intents)
-tree = app_commands.CommandTree(client)
-
 if not os.path.exists(LOCAL_MIDI_FOLDER): os.makedirs(LOCAL_MIDI_FOLDER)
 if not os.path.exists(TEMP_FOLDER): os.makedirs(TEMP_FOLDER)
+if not os.path.exists(REWRITTEN_MIDI_FOLDER): os.makedirs(REWRITTEN_MIDI_FOLDER)
 
 
 def load_json_file(filename: str, default_data: dict | list = None):
@@ -138,6 +163,60 @@ def save_json_file(filename: str, data: dict | list):
 
 config = load_json_file(CONFIG_FILE)
 
+# Shard processes get their shard ids from the environment; the rest of the cluster setup lives in config.
+shard_ids = [int(shard) for shard in os.environ.get('ENCORE_SHARD_IDS', '').split(',') if shard.strip()]
+shard_count = int(os.environ.get('ENCORE_SHARD_COUNT') or config.get('shard_count') or 0)
+
+intents = discord.Intents.default()
+if shard_count:
+    client = discord.AutoShardedClient(intents=intents, shard_ids=shard_ids or None, shard_count=shard_count)
+else:
+    client = discord.Client(intents=intents)
+tree = app_commands.CommandTree(client)
+
+chopt_pool = ChoptPool(
+    workers=config.get('chopt_workers'),
+    max_queue=config.get('chopt_queue_size', 50),
+    timeout=config.get('chopt_timeout', 120.0)
+)
+path_cache = PathCache(PATH_CACHE_FOLDER, max_bytes=config.get('path_cache_mb', 512) * 1024 * 1024)
+
+def remove_rewritten_charts(chart_hash: str):
+    for rewritten_file in glob.glob(os.path.join(REWRITTEN_MIDI_FOLDER, f"{chart_hash}_*.mid")):
+        os.remove(rewritten_file)
+
+preview_clips = PreviewClipService(PREVIEW_CACHE_FOLDER, workers=config.get('preview_workers', 2), max_bytes=config.get('preview_cache_mb', 256) * 1024 * 1024)
+catalog = CatalogStore(TRACK_CACHE_FILE)
+catalog.load()
+bot_stats = BotStats(BOT_STATS_FILE)
+bot_stats.load(TRACK_HISTORY_FILE)
+bot_stats.apply_catalog_changes(catalog.by_id, catalog.by_id.keys())
+catalog.subscribe(lambda changed_ids: bot_stats.apply_catalog_changes(catalog.by_id, changed_ids))
+chart_store = ChartStore(LOCAL_MIDI_FOLDER, max_bytes=config.get('chart_store_mb', 1024) * 1024 * 1024, on_blob_removed=remove_rewritten_charts)
+chart_analytics = ChartAnalyticsIndex(CHART_ANALYTICS_FILE)
+broadcast_queue = BroadcastQueue(client, max_attempts=config.get('broadcast_max_attempts', 5))
+
+metrics = MetricsRegistry(prefix='encore_')
+metrics.gauge('chopt_queue_depth', lambda: chopt_pool.queue_depth, priority='interactive')
+metrics.gauge('chopt_queue_depth', lambda: chopt_pool.background_depth, priority='background')
+metrics.gauge('chopt_running_jobs', lambda: chopt_pool.running)
+metrics.gauge('broadcast_queue_depth', lambda: broadcast_queue.stats()['queued'])
+metrics.counter_callback('path_cache_hits_total', lambda: path_cache.stats()['hits'])
+metrics.counter_callback('path_cache_misses_total', lambda: path_cache.stats()['misses'])
+metrics.counter_callback('preview_cache_hits_total', lambda: preview_clips.stats()['hits'])
+metrics.counter_callback('preview_cache_misses_total', lambda: preview_clips.stats()['misses'])
+metrics.gauge('catalog_tracks', lambda: len(catalog.tracks))
+metrics.gauge('chart_analytics_entries', lambda: len(chart_analytics.charts))
+metrics_runner = None
+startup_timings = {}
+for stage in ('imports', 'ready', 'first_trackinfo'):
+    metrics.gauge('startup_seconds', lambda stage=stage: startup_timings.get(stage, float('nan')), stage=stage)
+loop_monitor = LoopLagMonitor(threshold=config.get('loop_lag_threshold', 0.25),
+                              on_lag=lambda lag: metrics.observe('loop_lag_seconds', lag))
+metrics.expect_rate('loop_lag_seconds', 1 / loop_monitor.interval)
+profiler = Profiler(PROFILE_FOLDER, retention=config.get('profile_retention', 20))
+PROFILE_TARGETS = ['fuzzy_search_tracks', 'detect_track_changes', 'run_comparison', 'modify_midi_file']
+
 class Instrument:
     def __init__(self, english: str = "Vocals", lb_code: str = "Solo_Vocals", plastic: bool = False, chopt: str = "vocals", midi: str = "PART VOCALS", replace: str = None, lb_enabled: bool = True, path_enabled: bool = True) -> None:
         self.english = english
@@ -176,61 +255,52 @@ class MidiArchiveTools:
     def __init__(self) -> None:
         pass
     
-    def save_chart(self, chart_url:str, filename: str) -> str | None:
-        local_path = os.path.join(LOCAL_MIDI_FOLDER, filename)
-        if os.path.exists(local_path):
+    def save_chart(self, chart_url:str, filename: str) -> StoredChart | None:
+        if (stored_chart := chart_store.path_for(filename)):
             logging.info(f"Chart '{filename}' already exists in cache, using local copy.")
-            return local_path
+            return stored_chart
         
+        import requests
+
         logging.info(f"Downloading chart '{filename}' from {chart_url}")
         try:
             response = requests.get(chart_url)
             response.raise_for_status()
 
-            with open(local_path, 'wb') as f:
-                f.write(response.content)
-            logging.info(f"Successfully saved chart '{filename}' to {local_path}")
-            return local_path
+            stored_chart = chart_store.put(filename, response.content)
+            logging.info(f"Successfully saved chart '{filename}' to {stored_chart.path}")
+            return stored_chart
         except requests.exceptions.RequestException as e:
             logging.error(f"Failed to download chart from {chart_url}: {e}")
             return None
         
-    def modify_midi_file(self, midi_file: str, instrument: Instrument, session_hash: str, shortname: str) -> str:
-        mid = mido.MidiFile(midi_file)
-        track_names_to_delete = []
-        track_names_to_rename = {}
-
-        if instrument.replace:
-            track_names_to_delete.append(instrument.replace)
-        track_names_to_rename[instrument.midi] = instrument.replace
-
-        new_tracks = []
-        for track in mid.tracks:
-            if track.name in track_names_to_delete:
-                continue
-            
-            modified_track = mido.MidiTrack()
-            for msg in track:
-                if msg.type == 'track_name' and msg.name in track_names_to_rename:
-                    msg.name = track_names_to_rename[msg.name]
-                modified_track.append(msg)
-            new_tracks.append(modified_track)
-
-        mid.tracks = new_tracks
-        
-        modified_midi_file_name = f"{shortname}_{session_hash}.mid"
-        modified_midi_file = os.path.join(TEMP_FOLDER, modified_midi_file_name)
-
-        mid.save(modified_midi_file)
+    @profiler.profiled('modify_midi_file')
+    def modify_midi_file(self, midi_file: str, instrument: Instrument, chart_hash: str) -> str:
+        modified_midi_file = os.path.join(REWRITTEN_MIDI_FOLDER, f"{chart_hash}_{instrument.midi.replace(' ', '_').lower()}.mid")
+        if os.path.exists(modified_midi_file):
+            return modified_midi_file
+
+        with open(midi_file, 'rb') as f:
+            data = f.read()
+
+        track_names_to_delete = {instrument.replace} if instrument.replace else set()
+        track_names_to_rename = {instrument.midi: instrument.replace}
+        modified_data = midi_chunks.rewrite_tracks(data, drop=track_names_to_delete, rename=track_names_to_rename)
+
+        temp_file = f"{modified_midi_file}.{uuid.uuid4().hex}.tmp"
+        with open(temp_file, 'wb') as f:
+            f.write(modified_data)
+        os.replace(temp_file, modified_midi_file)
+        logging.info(f"Rewrote chart {chart_hash[:12]} for {instrument.english} to {modified_midi_file}")
         return modified_midi_file
 
-def run_chopt(midi_file: str, command_instrument: str, output_image: str, squeeze_percent: int = 20, instrument: Instrument = None, difficulty: str = 'expert', extra_args: list = []):
+async def run_chopt(midi_file: str, command_instrument: str, output_path: str, squeeze_percent: int = 20, instrument: Instrument = None, difficulty: str = 'expert', extra_args: list = [], user_id: int = None, on_queue_position=None, priority: int = PRIORITY_INTERACTIVE, reserved: bool = False):
     engine = 'fnf'
     if instrument.midi == 'PLASTIC DRUMS':
         engine = 'ch' 
 
     chopt_command = [
-        'chopt.exe', 
+        CHOPT_EXECUTABLE, 
         '-f', midi_file, 
         '--engine', engine, 
         '--squeeze', str(squeeze_percent),
@@ -241,15 +311,16 @@ def run_chopt(midi_file: str, command_instrument: str, output_image: str, squeez
     if instrument.midi != 'PLASTIC DRUMS':
         chopt_command.append('--no-pro-drums')
 
-    chopt_command.extend(['-i', command_instrument, '-o', os.path.join(TEMP_FOLDER, output_image)])
+    chopt_command.extend(['-i', command_instrument, '-o', output_path])
     chopt_command.extend(extra_args)
 
-    result = subprocess.run(chopt_command, text=True, capture_output=True)
+    with metrics.time('chopt_job_seconds', priority='background' if priority == PRIORITY_BACKGROUND else 'interactive'):
+        returncode, stdout, stderr = await chopt_pool.run(chopt_command, user_id=user_id, on_position=on_queue_position, priority=priority, reserved=reserved)
 
-    if result.returncode != 0:
-        raise Exception(result.stderr)
+    if returncode != 0:
+        raise Exception(stderr)
 
-    return result.stdout.strip()
+    return stdout.strip()
 
 def process_acts(arr):
     sum_phrases, sum_overlaps = 0, 0
@@ -266,22 +337,91 @@ def process_acts(arr):
             pass
     return sum_phrases, sum_overlaps
 
-def generate_session_hash(user_id, song_name):
-    hash_int = int(hashlib.md5(f"{user_id}_{song_name}".encode()).hexdigest(), 16)
-    return str(hash_int % 10**8).zfill(8)
+async def fetch_chart(chart_filename: str) -> StoredChart | None:
+    chart_url = f"{ASSET_BASE_URL}/assets/midis/{chart_filename}"
+    return await asyncio.to_thread(MidiArchiveTools().save_chart, chart_url, chart_filename)
 
-def delete_session_files(session_hash):
-    try:
-        for file_name in os.listdir(TEMP_FOLDER):
-            if session_hash in file_name:
-                file_path = os.path.join(TEMP_FOLDER, file_name)
-                os.remove(file_path)
-                logging.info(f"Deleted file: {file_path}")
-    except Exception as e:
-        logging.error(f"Error while cleaning up files for session {session_hash}", exc_info=e)
+def format_chart_shifts(shifts: list, limit: int = 10) -> str:
+    if not shifts: return ""
+    import compare_midi
+
+    lines = [f"• {compare_midi.describe_shift(shift)}" for shift in shifts[:limit]]
+    if len(shifts) > limit:
+        lines.append(f"• ...and {len(shifts) - limit} more sections")
+    return "\n\n**Timing shifts:**\n" + "\n".join(lines)
+
+def current_chart_names(tracks: list) -> set:
+    return {f"{t.id}-v{t.get('currentversion', 1)}.mid" for t in tracks}
+
+ANALYTICS_SORTS = {'densest': 'avg_nps', 'most_notes': 'notes', 'peak_density': 'peak_nps'}
+chart_analytics_task = None
+chart_analytics_rerun = False
+
+def analytics_lanes() -> dict:
+    return {inst.value.midi: {diff.name: tuple(diff.value.pitch_ranges) for diff in Difficulties}
+            for inst in Instruments if inst.value.path_enabled}
+
+def chart_stats_for(track, instrument: Instruments, difficulty: Difficulties) -> dict | None:
+    if (entry := chart_store.lookup(f"{track.id}-v{track.get('currentversion', 1)}.mid")) is None: return None
+    if (stats := chart_analytics.get(entry['sha256'])) is None: return None
+    return stats.get(instrument.value.midi, {}).get(difficulty.name)
+
+def sort_tracks_by_chart_stats(tracks: list, sort_by: str, instrument: Instruments, difficulty: Difficulties, limit: int = 25) -> list:
+    field = ANALYTICS_SORTS[sort_by]
+    rated = [(stats[field], track) for track in tracks
+             if (stats := chart_stats_for(track, instrument, difficulty)) and stats['notes']]
+    return [track for _, track in heapq.nlargest(limit, rated, key=lambda rated_track: rated_track[0])]
+
+async def index_chart_analytics():
+    """Analyzes every current chart version that is not in the analytics index yet.
+
+    Missing charts are downloaded unless `chart_analytics_download` is off. Charts are
+    keyed by their hash, so only new or changed charts are parsed.
+    """
+    global chart_analytics_rerun
+    download_missing = config.get('chart_analytics_download', True)
+    lanes = analytics_lanes()
+    while True:
+        chart_analytics_rerun = False
+        current, analyzed = set(), 0
+        for name in sorted(current_chart_names(get_cached_track_data())):
+            if not (stored_chart := chart_store.path_for(name) or (download_missing and await fetch_chart(name))): continue
+            current.add(stored_chart.sha256)
+            if chart_analytics.get(stored_chart.sha256) is not None: continue
+            try:
+                with metrics.time('chart_analytics_seconds'):
+                    chart_analytics.put(stored_chart.sha256, await asyncio.to_thread(analyze_chart, stored_chart.path, lanes))
+                analyzed += 1
+            except Exception as e:
+                logging.warning(f"Chart analytics failed for {name}: {e}")
+
+        pruned = chart_analytics.prune(current)
+        if analyzed or pruned:
+            await asyncio.to_thread(chart_analytics.save)
+            if cluster:
+                await cluster.publish('chart_analytics_updated', {})
+        logging.info(f"Chart analytics indexed {analyzed} new charts, pruned {pruned}; {len(chart_analytics.charts)} charts indexed.")
+        if not chart_analytics_rerun: break
+
+def schedule_chart_analytics():
+    global chart_analytics_task, chart_analytics_rerun
+    if cluster and not cluster.is_leader: return
+    if chart_analytics_task is None or chart_analytics_task.done():
+        chart_analytics_task = start_background_task(index_chart_analytics())
+    else:
+        chart_analytics_rerun = True
+
+background_tasks = set()
+
+def start_background_task(coro) -> asyncio.Task:
+    task = asyncio.create_task(coro)
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+    return task
 
 async def log_error_to_channel(error_message: str):
     logging.error(error_message)
+    metrics.inc('errors_logged_total')
     config = load_json_file(CONFIG_FILE)
     error_channel_id = config.get('error_log_channels', {}).get('default')
     if error_channel_id:
@@ -310,34 +450,57 @@ async def update_bot_status():
     except Exception as e:
         await log_error_to_channel(f"Error updating bot status: {str(e)}")
 
-async def get_live_track_data() -> list | None:
+class LiveDataError(Exception):
+    def __init__(self, message: str, status: int = None, retry_after: float = None) -> None:
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+    @property
+    def rate_limited(self) -> bool:
+        return self.status == 429 or self.retry_after is not None
+
+class LiveCatalog(NamedTuple):
+    tracks: list
+    fingerprints: dict
+
+async def fetch_live_track_data() -> LiveCatalog:
+    """Fetches the live catalog, raising LiveDataError with the HTTP status and Retry-After on failure.
+
+    The body is parsed as it streams in; each track is fingerprinted and converted to a
+    Track record as soon as it is complete, so the raw payload is never held whole.
+    """
     logging.info("Attempting to fetch live track data from source...")
+    tracks_by_id, fingerprints = {}, {}
     try:
         async with aiohttp.ClientSession() as session:
             async with session.get(JSON_DATA_URL, timeout=10) as response:
-                if response.status == 200:
-                    data = await response.json(content_type=None)
-                    tracks_list = []
-                    if isinstance(data, dict):
-                        for track_id, track_info in data.items():
-                            track_info['id'] = track_id
-                            tracks_list.append(track_info)
-                    else:
-                        await log_error_to_channel(f"Error: JSON data is not in the expected format (dictionary of tracks). Got type: {type(data)}")
-                        return None
-                    
-                    logging.info(f"Successfully fetched {len(tracks_list)} live tracks.")
-                    return tracks_list
-                else:
-                    await log_error_to_channel(f"Failed to fetch live data. Status code: {response.status}")
-                    return None
-    except (aiohttp.ClientError, json.JSONDecodeError, asyncio.TimeoutError) as e:
-        await log_error_to_channel(f"Error during live data fetching or parsing: {str(e)}")
+                if response.status != 200:
+                    retry_after = response.headers.get('Retry-After')
+                    raise LiveDataError(f"Failed to fetch live data. Status code: {response.status}", response.status,
+                                        float(retry_after) if retry_after and retry_after.isdigit() else None)
+                async for track_id, track_info in iter_track_entries(response.content.iter_chunked(TRACK_STREAM_CHUNK_SIZE)):
+                    track_info['id'] = track_id
+                    fingerprints[track_id] = track_fingerprint(track_info)
+                    tracks_by_id[track_id] = Track(track_info)
+    except TrackStreamError as e:
+        raise LiveDataError(f"Error: JSON data is not in the expected format (dictionary of tracks). {e}")
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        raise LiveDataError(f"Error during live data fetching or parsing: {str(e)}")
+
+    logging.info(f"Successfully fetched {len(tracks_by_id)} live tracks.")
+    return LiveCatalog(list(tracks_by_id.values()), fingerprints)
+
+async def get_live_track_data() -> LiveCatalog | None:
+    try:
+        return await fetch_live_track_data()
+    except LiveDataError as e:
+        await log_error_to_channel(str(e))
         return None
 
 def get_cached_track_data() -> list:
     try:
-        return load_json_file(TRACK_CACHE_FILE, {"tracks": []}).get("tracks", [])
+        return catalog.tracks
     except Exception as e:
         asyncio.create_task(log_error_to_channel(f"Error reading track cache: {str(e)}"))
         return []
@@ -377,10 +540,11 @@ def calculate_average_difficulty(track: dict) -> float:
         valid_diffs = [d + 1 for d in difficulties.values() if isinstance(d, int) and d != -1]
         if not valid_diffs:
             return 0.0
-        return statistics.mean(valid_diffs)
+        return sum(valid_diffs) / len(valid_diffs)
     except Exception:
         return 0.0
 
+@profiler.profiled('fuzzy_search_tracks')
 def fuzzy_search_tracks(tracks: list, query: str, sort_method: str = None) -> list:
     try:
         sort_map = {
@@ -394,18 +558,19 @@ def fuzzy_search_tracks(tracks: list, query: str, sort_method: str = None) -> li
         if sort_method and sort_method.lower() in sort_map:
             key, reverse, limit = sort_map[sort_method.lower()]
             
+            # Every sort field is a Track slot, and only tracks with a non-empty value are sorted.
             if key == 'duration':
-                sort_key_func = lambda t: parse_duration_to_seconds(t.get(key, '0s'))
+                sort_key_func = lambda t: parse_duration_to_seconds(t.duration)
             elif key == 'createdAt':
-                sort_key_func = lambda t: datetime.fromisoformat(t.get(key, '1970-01-01T00:00:00Z').replace('Z', '+00:00')).timestamp()
+                sort_key_func = lambda t: datetime.fromisoformat(t.createdAt.replace('Z', '+00:00')).timestamp()
             elif key == 'charter':
-                sort_key_func = lambda t: t.get(key, '').lower() 
+                sort_key_func = lambda t: t.charter.lower() 
             elif key == 'avg_difficulty':
                 sort_key_func = calculate_average_difficulty
             else: 
-                sort_key_func = lambda t: t.get(key, 0) if isinstance(t.get(key, 0), (int, float)) else 0
+                sort_key_func = lambda t: value if isinstance(value := getattr(t, key), (int, float)) else 0
 
-            sortable_tracks = [t for t in tracks if t.get(key) is not None and t.get(key) != ''] if key != 'avg_difficulty' else tracks
+            sortable_tracks = [t for t in tracks if (value := getattr(t, key)) is not None and value != ''] if key != 'avg_difficulty' else tracks
             
             sorted_tracks = sorted(sortable_tracks, key=sort_key_func, reverse=reverse)
             return sorted_tracks[:limit]
@@ -417,9 +582,9 @@ def fuzzy_search_tracks(tracks: list, query: str, sort_method: str = None) -> li
         
         exact_matches, fuzzy_matches = [], []
         for track in tracks:
-            title = remove_punctuation(track.get('title', '').lower())
-            artist = remove_punctuation(track.get('artist', '').lower())
-            track_id = track.get('id', '').lower()
+            title = remove_punctuation((track.title or '').lower())
+            artist = remove_punctuation((track.artist or '').lower())
+            track_id = (track.id or '').lower()
 
             if search_term == track_id or search_term in title or search_term in artist:
                 exact_matches.append(track)
@@ -428,7 +593,7 @@ def fuzzy_search_tracks(tracks: list, query: str, sort_method: str = None) -> li
         
         filtered_tracks, seen_ids = [], set()
         for track in exact_matches + fuzzy_matches:
-            if (track_id := track.get('id')) not in seen_ids:
+            if (track_id := track.id) not in seen_ids:
                 filtered_tracks.append(track)
                 seen_ids.add(track_id)
         
@@ -452,144 +617,162 @@ def format_key(key_str: str) -> str:
         asyncio.create_task(log_error_to_channel(f"Error formatting key: {str(e)}"))
         return "N/A"
 
+track_embed_cache = {}
+
+def invalidate_track_embeds(track_ids: set):
+    for track_id in track_ids:
+        track_embed_cache.pop(track_id, None)
+
+catalog.subscribe(invalidate_track_embeds)
+
 def create_track_embed_and_view(track: dict, author_id: int, is_log: bool = False):
     try:
-        embed_title = "Track Added" if is_log else None
-        
-        if is_log:
-            color = discord.Color.green()
+        cache_key = (catalog.fingerprint_of(track), is_log)
+        if (cached := track_embed_cache.get(track.get('id'), {}).get(cache_key)) is None:
+            embed = build_track_embed(track, is_log)
+            cached = (embed.to_dict(), TrackInfoView.build_layout(track))
+            track_embed_cache.setdefault(track.get('id'), {})[cache_key] = cached
         else:
-            default_colors = track.get('modalShadowColors', {}).get('default', {})
-            color_key = track.get('embedColor')
-            hex_color = default_colors.get(color_key)
-            if not hex_color:
-                hex_color = default_colors.get('color1')
-            if hex_color and isinstance(hex_color, str) and hex_color.startswith('#'):
-                try: 
-                    color = discord.Color.from_str(hex_color)
-                except ValueError: 
-                    color = discord.Color.from_str("#FFFFFF")
-            else:
+            embed_data = cached[0]
+            embed = discord.Embed.from_dict({**embed_data, 'fields': [dict(f) for f in embed_data.get('fields', [])]})
+        return embed, TrackInfoView(track=track, author_id=author_id, layout=cached[1])
+    except Exception as e:
+        asyncio.create_task(log_error_to_channel(f"Error creating track embed: {str(e)}"))
+        return discord.Embed(title="Error", description="Could not create track embed.", color=discord.Color.red()), None
+
+def build_track_embed(track: dict, is_log: bool = False) -> discord.Embed:
+    embed_title = "Track Added" if is_log else None
+    
+    if is_log:
+        color = discord.Color.green()
+    else:
+        default_colors = track.get('modalShadowColors', {}).get('default', {})
+        color_key = track.get('embedColor')
+        hex_color = default_colors.get(color_key)
+        if not hex_color:
+            hex_color = default_colors.get('color1')
+        if hex_color and isinstance(hex_color, str) and hex_color.startswith('#'):
+            try: 
+                color = discord.Color.from_str(hex_color)
+            except ValueError: 
                 color = discord.Color.from_str("#FFFFFF")
+        else:
+            color = discord.Color.from_str("#FFFFFF")
 
-        description = f"## {track.get('title', 'N/A')} - {track.get('artist', 'N/A')}"
-        
-        embed = discord.Embed(title=embed_title, description=description, color=color)
-        if track.get('cover'):
-            embed.set_thumbnail(url=f"{ASSET_BASE_URL}/assets/covers/{track.get('cover')}")
+    description = f"## {track.get('title', 'N/A')} - {track.get('artist', 'N/A')}"
+    
+    embed = discord.Embed(title=embed_title, description=description, color=color)
+    if track.get('cover'):
+        embed.set_thumbnail(url=f"{ASSET_BASE_URL}/assets/covers/{track.get('cover')}")
 
-        avg_difficulty = calculate_average_difficulty(track)
-        
-        embed.add_field(name="Release Year", value=str(track.get('releaseYear', 'N/A')))
-        embed.add_field(name="Album", value=track.get('album', 'N/A'))
-        embed.add_field(name="Genre", value=track.get('genre', 'N/A'))
-        embed.add_field(name="Duration", value=track.get('duration', 'N/A'))
-        embed.add_field(name="BPM", value=str(track.get('bpm', 'N/A')))
-        embed.add_field(name="Key", value=format_key(track.get('key', 'N/A')))
-        
-        progress_value = track.get('complete', '0% Complete').replace(' Complete', '')
-        embed.add_field(name="Progress", value=progress_value)
-        
-        embed.add_field(name="Rating", value=track.get('rating', 'N/A'))
-        embed.add_field(name="Avg. Difficulty", value=f"`{create_difficulty_bar(round(avg_difficulty))}`")
-        embed.add_field(name="Shortname", value=f"`{track.get('id', 'N/A')}`")
-        
-        if (loading_phrase := track.get('loading_phrase')):
-            embed.add_field(name="Loading Phrase", value=f"\"{loading_phrase}\"", inline=True)
-        
-        inst_map = {'vocals': 'Vocals', 'guitar': 'Lead', 'bass': 'Bass', 'drums': 'Drums',
-                    'plastic-bass': 'Pro Bass', 'plastic-drums': 'Pro Drums',
-                    'plastic-guitar': 'Pro Lead', 'plastic-keys': 'Pro Keys'}
-        diff_text = "\n".join(
-            f"{name:<12}: {create_difficulty_bar(lvl + 1)}"
-            for inst, name in inst_map.items()
-            if (lvl := track.get('difficulties', {}).get(inst)) is not None and lvl != -1)
-        if diff_text:
-            embed.add_field(name="Instrument Difficulties", value=f"```\n{diff_text}```", inline=False)
-
-        if (created_at := track.get('createdAt')):
-            try:
-                ts = int(datetime.fromisoformat(created_at.replace('Z', '+00:00')).timestamp())
-                embed.add_field(name="Date Added", value=f"<t:{ts}:F>", inline=True)
-            except (ValueError, TypeError): pass
-                
-        if (last_featured_str := track.get('lastFeatured')) and last_featured_str != "TBA":
-            try:
-                dt_obj = datetime.strptime(last_featured_str, '%m/%d/%Y, %I:%M:%S %p')
-                ts = int(dt_obj.timestamp())
-                embed.add_field(name="Last Updated", value=f"<t:{ts}:F>", inline=True)
-            except (ValueError, TypeError): pass
-        
-        if is_log and (chart_url := track.get('charturl')):
-            embed.add_field(name="Chart URL", value=chart_url, inline=False)
+    avg_difficulty = calculate_average_difficulty(track)
+    
+    embed.add_field(name="Release Year", value=str(track.get('releaseYear', 'N/A')))
+    embed.add_field(name="Album", value=track.get('album', 'N/A'))
+    embed.add_field(name="Genre", value=track.get('genre', 'N/A'))
+    embed.add_field(name="Duration", value=track.get('duration', 'N/A'))
+    embed.add_field(name="BPM", value=str(track.get('bpm', 'N/A')))
+    embed.add_field(name="Key", value=format_key(track.get('key', 'N/A')))
+    
+    progress_value = track.get('complete', '0% Complete').replace(' Complete', '')
+    embed.add_field(name="Progress", value=progress_value)
+    
+    embed.add_field(name="Rating", value=track.get('rating', 'N/A'))
+    embed.add_field(name="Avg. Difficulty", value=f"`{create_difficulty_bar(round(avg_difficulty))}`")
+    embed.add_field(name="Shortname", value=f"`{track.get('id', 'N/A')}`")
+    
+    if (loading_phrase := track.get('loading_phrase')):
+        embed.add_field(name="Loading Phrase", value=f"\"{loading_phrase}\"", inline=True)
+    
+    inst_map = {'vocals': 'Vocals', 'guitar': 'Lead', 'bass': 'Bass', 'drums': 'Drums',
+                'plastic-bass': 'Pro Bass', 'plastic-drums': 'Pro Drums',
+                'plastic-guitar': 'Pro Lead', 'plastic-keys': 'Pro Keys'}
+    diff_text = "\n".join(
+        f"{name:<12}: {create_difficulty_bar(lvl + 1)}"
+        for inst, name in inst_map.items()
+        if (lvl := track.get('difficulties', {}).get(inst)) is not None and lvl != -1)
+    if diff_text:
+        embed.add_field(name="Instrument Difficulties", value=f"```\n{diff_text}```", inline=False)
+
+    if (created_at := track.get('createdAt')):
+        try:
+            ts = int(datetime.fromisoformat(created_at.replace('Z', '+00:00')).timestamp())
+            embed.add_field(name="Date Added", value=f"<t:{ts}:F>", inline=True)
+        except (ValueError, TypeError): pass
+            
+    if (last_featured_str := track.get('lastFeatured')) and last_featured_str != "TBA":
+        try:
+            dt_obj = datetime.strptime(last_featured_str, '%m/%d/%Y, %I:%M:%S %p')
+            ts = int(dt_obj.timestamp())
+            embed.add_field(name="Last Updated", value=f"<t:{ts}:F>", inline=True)
+        except (ValueError, TypeError): pass
+    
+    if is_log and (chart_url := track.get('charturl')):
+        embed.add_field(name="Chart URL", value=chart_url, inline=False)
 
-        return embed, TrackInfoView(track=track, author_id=author_id)
-    except Exception as e:
-        asyncio.create_task(log_error_to_channel(f"Error creating track embed: {str(e)}"))
-        return discord.Embed(title="Error", description="Could not create track embed.", color=discord.Color.red()), None
+    return embed
+
+UPDATE_LOG_IGNORED_KEYS = IgnoreTrie(['id', 'rotated'])
 
-def create_update_log_embed(old_track: dict, new_track: dict) -> tuple[discord.Embed | None, dict]:
+def create_update_log_embed(old_track: dict, new_track: dict, changes: list[Change] = None) -> tuple[discord.Embed | None, dict]:
     try:
+        if changes is None:
+            changes = diff_tracks(old_track, new_track, UPDATE_LOG_IGNORED_KEYS)
+        if not changes: return None, {}
+
         embed = discord.Embed(title="Track Modified", description=f"## {new_track.get('title', 'N/A')} - {new_track.get('artist', 'N/A')}",
                               color=discord.Color.orange(), timestamp=datetime.now())
         if new_track.get('cover'):
             embed.set_thumbnail(url=f"{ASSET_BASE_URL}/assets/covers/{new_track.get('cover')}")
 
-        changes_dict = {}
-
-        def flatten(d, parent_key='', sep='.'):
-            items = {}
-            for k, v in d.items():
-                new_key = f"{parent_key}{sep}{k}" if parent_key else k
-                if isinstance(v, dict): items.update(flatten(v, new_key))
-                else: items[new_key] = v
-            return items
-
-        flat_old, flat_new = flatten(old_track), flatten(new_track)
-        all_keys = sorted(list(set(flat_old.keys()) | set(flat_new.keys())))
-        ignored_keys = ['id', 'rotated']
-
         change_strings = []
-        for key in all_keys:
-            if any(key.startswith(ignored) for ignored in ignored_keys): continue
-            
-            old_val, new_val = flat_old.get(key), flat_new.get(key)
-            if old_val != new_val:
-                key_title = KEY_NAME_MAP.get(key) or KEY_NAME_MAP.get(key.lower(), key.replace('.', ' ').title())
-                changes_dict[key] = {'old': old_val, 'new': new_val}
-                change_strings.append(f"**{key_title}**\n```\nOld: {old_val or 'N/A'}\nNew: {new_val or 'N/A'}\n```")
-        
-        if not change_strings: return None, {}
+        for change in changes:
+            key_title = KEY_NAME_MAP.get(change.path) or KEY_NAME_MAP.get(change.path.lower(), change.path.replace('.', ' ').title())
+            change_strings.append(f"**{key_title}**\n```\nOld: {change.old or 'N/A'}\nNew: {change.new or 'N/A'}\n```")
         
         embed.description += "\n\n" + "\n\n".join(change_strings)
         if len(embed.description) > 4096:
             embed.description = embed.description[:4093] + "..."
             
-        return embed, changes_dict
+        return embed, changes_to_dict(changes)
     except Exception as e:
         asyncio.create_task(log_error_to_channel(f"Error creating update log embed: {str(e)}"))
         return None, {}
 
 class TrackInfoView(discord.ui.View):
-    def __init__(self, track: dict, author_id: int):
+    def __init__(self, track: dict, author_id: int, layout: list = None):
         super().__init__(timeout=300.0)
         self.track = track
         self.author_id = author_id
 
-        if track.get('previewUrl'): self.add_item(self.PreviewAudioButton(track=track))
-        if track.get('videoUrl'): self.add_item(self.PreviewVideoButton(track=track))
+        for kind, *args in (layout if layout is not None else self.build_layout(track)):
+            if kind == 'audio': self.add_item(self.PreviewAudioButton(track=track))
+            elif kind == 'video': self.add_item(self.PreviewVideoButton(track=track))
+            elif kind == 'link':
+                label, url, emoji = args
+                self.add_item(discord.ui.Button(label=label, url=url, row=1, emoji=emoji))
+            elif kind == 'instrument':
+                name, link = args
+                self.add_item(self.InstrumentVideoButton(part_name=name, link=link))
+
+    @staticmethod
+    def build_layout(track: dict) -> list:
+        layout = []
+        if track.get('previewUrl'): layout.append(('audio',))
+        if track.get('videoUrl'): layout.append(('video',))
         
         if spotify_id := track.get('spotify'):
-            self.add_item(discord.ui.Button(label="Stream Song", url=f"https://song.link/s/{spotify_id}", row=1, emoji='🎧'))
+            layout.append(('link', "Stream Song", f"https://song.link/s/{spotify_id}", '🎧'))
         if track.get('download'):
-            self.add_item(discord.ui.Button(label="Download Chart", url=track.get('download'), row=1, emoji='📥'))
+            layout.append(('link', "Download Chart", track.get('download'), '📥'))
 
         youtube_links = track.get('youtubeLinks', {})
         inst_video_map = {'vocals': 'Vocals', 'lead': 'Lead', 'drums': 'Drums', 'bass': 'Bass'}
         for part, name in inst_video_map.items():
             link = youtube_links.get(part) or (youtube_links.get('guitar') if part == 'lead' else None)
             if link:
-                self.add_item(self.InstrumentVideoButton(part_name=name, link=link))
+                layout.append(('instrument', name, link))
+        return layout
 
     async def interaction_check(self, interaction: discord.Interaction) -> bool: return True
 
@@ -615,39 +798,22 @@ class TrackInfoView(discord.ui.View):
                     file_name = preview_url.split('/')[-1]
                     preview_urls.append(urllib.parse.urljoin(ASSET_BASE_URL, f"assets/audio/{file_name}"))
 
-                async with aiohttp.ClientSession() as session:
-                    for url in preview_urls:
-                        logging.info(f"Attempting to fetch audio from: {url}")
-                        try:
-                            async with session.get(url) as response:
-                                if response.status != 200:
-                                    logging.warning(f"Failed to fetch {url}. Status: {response.status}")
-                                    continue
-                                audio_data = await response.read()
-                                audio = AudioSegment.from_file(io.BytesIO(audio_data), format="mp3")
-                                start_time = self.track.get('preview_time') or self.track.get('previewTime')
-                                end_time = self.track.get('preview_end_time') or self.track.get('previewEndTime')
-                                if start_time is not None and end_time is not None:
-                                    try:
-                                        start_ms = int(float(start_time)) 
-                                        end_ms = int(float(end_time))
-                                        if start_ms < end_ms and start_ms >= 0 and end_ms <= len(audio):
-                                            audio = audio[start_ms:end_ms]
-                                            logging.info(f"Trimmed audio from {start_ms}ms to {end_ms}ms")
-                                        else:
-                                            logging.warning(f"Invalid trim parameters: start={start_ms}, end={end_ms}, audio_length={len(audio)}")
-                                    except (ValueError, TypeError) as e:
-                                        logging.error(f"Error parsing preview times: {e}")
-                                        await log_error_to_channel(f"Error parsing preview times for track {track_id}: {e}")
-                                buffer = io.BytesIO()
-                                audio.export(buffer, format="mp3")
-                                buffer.seek(0)
-                                
-                                await interaction.followup.send(file=discord.File(buffer, f"preview.mp3"), ephemeral=True)
-                                return
-                        except Exception as e:
-                            logging.warning(f"Failed to process {url}: {e}")
-                            continue
+                start_ms = end_ms = None
+                start_time = self.track.get('preview_time') or self.track.get('previewTime')
+                end_time = self.track.get('preview_end_time') or self.track.get('previewEndTime')
+                if start_time is not None and end_time is not None:
+                    try:
+                        start_ms = int(float(start_time)) 
+                        end_ms = int(float(end_time))
+                    except (ValueError, TypeError) as e:
+                        logging.error(f"Error parsing preview times: {e}")
+                        await log_error_to_channel(f"Error parsing preview times for track {track_id}: {e}")
+
+                with metrics.time('preview_clip_seconds'):
+                    clip_path = await preview_clips.get_clip(preview_urls, start_ms, end_ms)
+                if clip_path:
+                    await interaction.followup.send(file=discord.File(clip_path, "preview.mp3"), ephemeral=True)
+                    return
                 
                 await interaction.followup.send(f"Could not download audio preview from any available URLs for track {track_id}.", ephemeral=True)
             except Exception as e:
@@ -698,6 +864,8 @@ class TrackSelectDropdown(discord.ui.Select):
                 desc += f" | Added: {date_str}"
             elif sort_lower in ['charter', 'charter_za']: desc += f" | Charter: {t.get('charter', 'N/A')}"
             elif sort_lower in ['hardest', 'easiest']: desc += f" | Avg. Diff: {round(calculate_average_difficulty(t))}/8"
+            elif sort_lower in ANALYTICS_SORTS and (stats := chart_stats_for(t, self.command_args['instrument'], self.command_args['difficulty'])):
+                desc += f" | {stats['notes']} notes, {stats['avg_nps']:.1f} avg / {stats['peak_nps']:.0f} peak NPS"
             options.append(discord.SelectOption(label=t['title'], value=t['id'], description=desc))
 
         placeholder = f"Select from {len(self.tracks_map)} sorted results..." if sort else f"Select from {len(tracks)} results..."
@@ -709,7 +877,7 @@ class TrackSelectDropdown(discord.ui.Select):
             track = self.tracks_map.get(self.values[0])
             if not track: return
             
-            if self.command_type == 'path':
+            if self.command_type in ('path', 'pathbatch'):
                 await interaction.response.defer()
 
             self.view.stop()
@@ -723,9 +891,18 @@ class TrackSelectDropdown(discord.ui.Select):
                 content, embed, attachments, error = await generate_path_response(
                     user_id=interaction.user.id,
                     song_data=track,
+                    on_queue_position=queue_position_reporter(interaction),
                     **self.command_args
                 )
                 await interaction.edit_original_response(content=content, embed=embed, attachments=attachments or [], view=None)
+            elif self.command_type == 'pathbatch':
+                content, embed, attachment_chunks, error = await generate_path_batch_response(
+                    user_id=interaction.user.id,
+                    song_data=track,
+                    on_queue_position=queue_position_reporter(interaction),
+                    **self.command_args
+                )
+                await send_path_batch_response(interaction, content, embed, attachment_chunks)
 
         except Exception as e:
             await log_error_to_channel(f"Error in track select dropdown: {str(e)}")
@@ -817,279 +994,596 @@ class HistoryPaginatorView(discord.ui.View):
     async def next_button(self, i: discord.Interaction, b: discord.ui.Button):
         if self.current_page < self.total_pages - 1: self.current_page += 1; await self.update_message(i)
 
-@tasks.loop(seconds=10)
+class TrackChanges(NamedTuple):
+    new_tracks_by_id: dict
+    new_fingerprints: dict
+    added_ids: set
+    removed_ids: set
+    modified_tracks: list
+
+@profiler.profiled('detect_track_changes')
+def detect_track_changes(old_tracks_by_id: dict, old_fingerprints: dict, live_tracks: list, live_fingerprints: dict = None) -> TrackChanges:
+    new_tracks_by_id = {t.id: t for t in live_tracks}
+    new_fingerprints = live_fingerprints or {t_id: track_fingerprint(t) for t_id, t in new_tracks_by_id.items()}
+    
+    added_ids = new_tracks_by_id.keys() - old_tracks_by_id.keys()
+    removed_ids = old_tracks_by_id.keys() - new_tracks_by_id.keys()
+    modified_tracks = [{'old': old_tracks_by_id[t_id], 'new': new_tracks_by_id[t_id],
+                        'changes': diff_tracks(old_tracks_by_id[t_id], new_tracks_by_id[t_id], UPDATE_LOG_IGNORED_KEYS)} 
+                       for t_id in new_tracks_by_id.keys() & old_tracks_by_id.keys() 
+                       if old_fingerprints[t_id] != new_fingerprints[t_id]]
+    return TrackChanges(new_tracks_by_id, new_fingerprints, added_ids, removed_ids, modified_tracks)
+
 async def check_for_updates():
     try:
+        if cluster and not cluster.is_leader: return PollOutcome.IDLE
         config = load_json_file(CONFIG_FILE)
-        if not (log_channels := config.get('update_log_channels', {})): return
+        if not (log_channels := config.get('update_log_channels', {})): return PollOutcome.IDLE
 
         logging.info("Checking for track updates...")
-        live_tracks = await get_live_track_data()
-        if live_tracks is None:
-            logging.warning("Update check failed: Could not fetch live data."); return
-
-        cached_tracks = get_cached_track_data()
-        
-        old_tracks_by_id = {t['id']: t for t in cached_tracks}
-        new_tracks_by_id = {t['id']: t for t in live_tracks}
-        
-        added_ids = new_tracks_by_id.keys() - old_tracks_by_id.keys()
-        removed_ids = old_tracks_by_id.keys() - new_tracks_by_id.keys()
-        modified_tracks = [{'old': old_tracks_by_id[t_id], 'new': new_tracks_by_id[t_id]} 
-                           for t_id in new_tracks_by_id.keys() & old_tracks_by_id.keys() 
-                           if old_tracks_by_id[t_id] != new_tracks_by_id[t_id]]
+        try:
+            live_tracks, live_fingerprints = await fetch_live_track_data()
+        except LiveDataError as e:
+            logging.warning(f"Update check failed: {e}")
+            if e.rate_limited:
+                return PollOutcome.RATE_LIMITED, e.retry_after
+            await log_error_to_channel(str(e))
+            return PollOutcome.ERROR
+
+        old_tracks_by_id = catalog.by_id
+        new_tracks_by_id, new_fingerprints, added_ids, removed_ids, modified_tracks = \
+            detect_track_changes(old_tracks_by_id, catalog.fingerprints, live_tracks, live_fingerprints)
 
         if not (added_ids or removed_ids or modified_tracks):
-            logging.info("No track updates found."); return
+            logging.info("No track updates found."); return PollOutcome.IDLE
 
         logging.info(f"Changes detected! Added: {len(added_ids)}, Removed: {len(removed_ids)}, Modified: {len(modified_tracks)}. Processing...")
+        for mod_info in modified_tracks:
+            if mod_info['new'].get('currentversion', 1) > mod_info['old'].get('currentversion', 1):
+                start_background_task(prefetch_default_paths(mod_info['new']))
+
         history_data = load_json_file(TRACK_HISTORY_FILE, {})
         midi_changes_data = load_json_file(MIDI_CHANGES_FILE, {})
-        
-        for cid in log_channels.values():
-            if not (channel := client.get_channel(int(cid))): continue
-            
-            for tid in added_ids:
-                embed, _ = create_track_embed_and_view(new_tracks_by_id[tid], client.user.id, is_log=True)
-                if embed: await channel.send(embed=embed)
+        outbound, workspaces, recorded_updates = [], [], []
 
-            if removed_ids:
-                embed = discord.Embed(title="Tracks Removed", color=discord.Color.red(), 
-                                      description="\n".join(f"• **{old_tracks_by_id[tid]['title']}**" for tid in removed_ids))
-                await channel.send(embed=embed)
-            
-            for mod_info in modified_tracks:
-                current_update_timestamp = datetime.now().isoformat()
-                embed, changes = create_update_log_embed(mod_info['old'], mod_info['new'])
-                if embed:
-                    logging.info(f"Logging modification for track: {mod_info['new']['id']}")
-                    await channel.send(embed=embed)
-                    history_data.setdefault(mod_info['new']['id'], []).insert(0, {'timestamp': current_update_timestamp, 'changes': changes})
-
-                old_version = mod_info['old'].get('currentversion', 1)
-                new_version = mod_info['new'].get('currentversion', 1)
-
-                if new_version > old_version:
-                    shortname = mod_info['new']['id']
-                    logging.info(f"Chart version changed for {shortname} from v{old_version} to v{new_version}. Comparing MIDI files.")
-                    
-                    old_url = f"{ASSET_BASE_URL}assets/midis/{shortname}-v{old_version}.mid"
-                    new_url = f"{ASSET_BASE_URL}assets/midis/{shortname}-v{new_version}.mid"
-                    
-                    session_id = str(uuid.uuid4())
-                    temp_dir = 'temp_midi'
-                    os.makedirs(temp_dir, exist_ok=True)
-                    old_path = os.path.join(temp_dir, f'old_{session_id}.mid')
-                    new_path = os.path.join(temp_dir, f'new_{session_id}.mid')
-                    
-                    try:
-                        async with aiohttp.ClientSession() as session:
-                            async with session.get(old_url) as r1, session.get(new_url) as r2:
-                                if r1.status == 200 and r2.status == 200:
-                                    with open(old_path, 'wb') as f1, open(new_path, 'wb') as f2:
-                                        f1.write(await r1.read())
-                                        f2.write(await r2.read())
-                                    
-                                    chart_format = mod_info['new'].get('format', 'json')
-                                    comparison_results = compare_midi.run_comparison(
-                                        old_path, new_path, session_id, 
-                                        output_folder=temp_dir, 
-                                        format=chart_format
-                                    )
-                                    midi_change_log_entry = []
-                                    for comp_track_name, image_path in comparison_results:
-                                        
-                                        previous_chart_change_ts = mod_info['new'].get('createdAt')
-                                        if mod_info['new']['id'] in history_data:
-                                            for past_change in history_data[mod_info['new']['id']][1:]: # Skip the current change
-                                                if 'currentversion' in past_change['changes']:
-                                                    previous_chart_change_ts = past_change['timestamp']
-                                                    break
-                                        
-                                        try:
-                                            old_dt = datetime.fromisoformat(previous_chart_change_ts.replace('Z', '+00:00'))
-                                            old_ts_str = f"<t:{int(old_dt.timestamp())}:D>"
-                                        except:
-                                            old_ts_str = "an earlier version"
-
-                                        new_ts_str = f"<t:{int(datetime.now().timestamp())}:D>"
-
-                                        vis_embed = discord.Embed(
-                                            title=f"Chart Changes for {mod_info['new']['title']}",
-                                            description=f"Instrument: **{comp_track_name}**\n\nDetected changes between:\n{old_ts_str} and {new_ts_str}",
-                                            color=discord.Color.orange(),
-                                        )
-                                        if cover := mod_info['new'].get('cover'):
-                                            vis_embed.set_thumbnail(url=f"{ASSET_BASE_URL}/assets/covers/{cover}")
-                                        
-                                        image_filename = os.path.basename(image_path)
-                                        file = discord.File(image_path, filename=image_filename)
-                                        vis_embed.set_image(url=f"attachment://{image_filename}")
-                                        
-                                        await channel.send(embed=vis_embed, file=file)
-                                        
-                                        midi_change_log_entry.append({"instrument": comp_track_name, "image_file": image_filename})
+        for tid in added_ids:
+            embed, _ = create_track_embed_and_view(new_tracks_by_id[tid], client.user.id, is_log=True)
+            if embed: outbound.append(OutboundItem(embed))
+
+        if removed_ids:
+            embed = discord.Embed(title="Tracks Removed", color=discord.Color.red(), 
+                                  description="\n".join(f"• **{old_tracks_by_id[tid]['title']}**" for tid in removed_ids))
+            outbound.append(OutboundItem(embed))
+        
+        for mod_info in modified_tracks:
+            current_update_timestamp = datetime.now().isoformat()
+            embed, changes = create_update_log_embed(mod_info['old'], mod_info['new'], mod_info['changes'])
+            if embed:
+                logging.info(f"Logging modification for track: {mod_info['new']['id']}")
+                outbound.append(OutboundItem(embed))
+                history_data.setdefault(mod_info['new']['id'], []).insert(0, {'timestamp': current_update_timestamp, 'changes': changes})
+                recorded_updates.append(current_update_timestamp)
+
+            old_version = mod_info['old'].get('currentversion', 1)
+            new_version = mod_info['new'].get('currentversion', 1)
+
+            if new_version > old_version:
+                shortname = mod_info['new']['id']
+                path_cache.invalidate_track(shortname, keep_version=new_version)
+                logging.info(f"Chart version changed for {shortname} from v{old_version} to v{new_version}. Comparing MIDI files.")
+                old_name, new_name = f"{shortname}-v{old_version}.mid", f"{shortname}-v{new_version}.mid"
+                workspace = SessionWorkspace(TEMP_FOLDER, prefix=f"compare_{shortname}")
+                workspaces.append(workspace)
+                
+                try:
+                    old_chart, new_chart = await asyncio.gather(fetch_chart(old_name), fetch_chart(new_name))
+                    if not (old_chart and new_chart):
+                        logging.error(f"Failed to download MIDI for comparison. Old chart: {old_chart.path if old_chart else 'missing'}, New chart: {new_chart.path if new_chart else 'missing'}")
+                    elif old_chart.sha256 == new_chart.sha256:
+                        logging.info(f"{old_name} and {new_name} are byte-identical, skipping MIDI comparison.")
+                    else:
+                        import compare_midi
+
+                        chart_format = mod_info['new'].get('format', 'json')
+                        with metrics.time('midi_comparison_seconds'):
+                            comparison_results = await asyncio.to_thread(
+                                profiler.profiled('run_comparison')(compare_midi.run_comparison),
+                                old_chart.path, new_chart.path, shortname,
+                                output_folder=workspace.path,
+                                format=chart_format
+                            )
+
+                        previous_chart_change_ts = mod_info['new'].get('createdAt')
+                        for past_change in history_data.get(mod_info['new']['id'], [])[1:]: # Skip the current change
+                            if 'currentversion' in past_change['changes']:
+                                previous_chart_change_ts = past_change['timestamp']
+                                break
+                        try:
+                            old_dt = datetime.fromisoformat(previous_chart_change_ts.replace('Z', '+00:00'))
+                            old_ts_str = f"<t:{int(old_dt.timestamp())}:D>"
+                        except:
+                            old_ts_str = "an earlier version"
+                        new_ts_str = f"<t:{int(datetime.now().timestamp())}:D>"
+
+                        midi_change_log_entry = []
+                        for comp_track_name, image_path, shifts in comparison_results:
+                            vis_embed = discord.Embed(
+                                title=f"Chart Changes for {mod_info['new']['title']}",
+                                description=f"Instrument: **{comp_track_name}**\n\nDetected changes between:\n{old_ts_str} and {new_ts_str}"
+                                            f"{format_chart_shifts(shifts)}",
+                                color=discord.Color.orange(),
+                            )
+                            if cover := mod_info['new'].get('cover'):
+                                vis_embed.set_thumbnail(url=f"{ASSET_BASE_URL}/assets/covers/{cover}")
                                     
-                                    if midi_change_log_entry:
-                                        midi_changes_data[current_update_timestamp] = midi_change_log_entry
-                                else:
-                                    logging.error(f"Failed to download MIDI for comparison. Old URL status: {r1.status}, New URL status: {r2.status}")
-                    except Exception as e:
-                        await log_error_to_channel(f"MIDI comparison failed for {shortname}: {e}")
-                    finally:
-                        if os.path.exists(old_path): os.remove(old_path)
-                        if os.path.exists(new_path): os.remove(new_path)
+                            image_filename = os.path.basename(image_path)
+                            vis_embed.set_image(url=f"attachment://{image_filename}")
+                            outbound.append(OutboundItem(vis_embed, ((image_path, image_filename),)))
+                            midi_change_log_entry.append({"instrument": comp_track_name, "image_file": image_filename,
+                                                          "shifts": [compare_midi.describe_shift(shift) for shift in shifts]})
+                                
+                        if midi_change_log_entry:
+                            midi_changes_data[current_update_timestamp] = midi_change_log_entry
+                except Exception as e:
+                    await log_error_to_channel(f"MIDI comparison failed for {shortname}: {e}")
+
+        # Comparison images are read from the workspaces until every channel has been sent its copy.
+        # Other shard processes read them too, so in cluster mode they are left for the orphan sweep.
+        broadcast_queue.broadcast(local_log_channels(log_channels), outbound,
+                                  on_complete=lambda: [workspace.detach() if cluster else workspace.cleanup() for workspace in workspaces])
 
         save_json_file(TRACK_HISTORY_FILE, history_data)
+        bot_stats.record_saved_updates(TRACK_HISTORY_FILE, recorded_updates)
         save_json_file(MIDI_CHANGES_FILE, midi_changes_data)
-        save_json_file(TRACK_CACHE_FILE, {"tracks": live_tracks})
+        catalog.swap(live_tracks, fingerprints=new_fingerprints)
+        bot_stats.save()
+        schedule_chart_analytics()
+        chart_store.pin(current_chart_names(live_tracks))
+        if cluster:
+            await cluster.publish('catalog_updated', {'outbound': [
+                {'embed': item.embed.to_dict(), 'files': [[os.path.abspath(path), filename] for path, filename in item.files]}
+                for item in outbound]})
         await update_bot_status()
+        return PollOutcome.CHANGED
     except Exception as e:
         await log_error_to_channel(f"Error in check_for_updates task: {str(e)}")
+        return PollOutcome.ERROR
+
+update_poller = AdaptivePoller(
+    check_for_updates,
+    min_interval=config.get('poll_min_interval', 10),
+    max_interval=config.get('poll_max_interval', 300),
+    error_interval=config.get('poll_error_interval', 60),
+    on_cycle=lambda outcome, duration: metrics.observe('update_cycle_seconds', duration, outcome=outcome.value),
+)
+
+def local_log_channels(log_channels: dict) -> list:
+    """Returns the log channels this process can see; with sharding, other processes cover the rest."""
+    return [int(cid) for cid in log_channels.values() if client.get_channel(int(cid))]
+
+async def take_over_polling():
+    # A new leader's on-disk catalog can be stale; refresh it first so the first poll
+    # doesn't rebroadcast changes made while no process was polling.
+    await refresh_catalog_and_start_polling()
+    if cluster.is_leader:
+        await cluster.publish('catalog_updated', {})
+
+async def on_cluster_leadership(is_leader: bool):
+    if is_leader:
+        # Runs in the background so the coordinator keeps renewing the lease meanwhile.
+        start_background_task(take_over_polling())
+    else:
+        update_poller.stop()
+
+async def on_catalog_updated(payload: dict):
+    catalog.load()
+    bot_stats.load(TRACK_HISTORY_FILE)
+    chart_store.pin(current_chart_names(get_cached_track_data()))
+    await update_bot_status()
+    outbound = [OutboundItem(discord.Embed.from_dict(item['embed']), tuple((path, filename) for path, filename in item['files']))
+                for item in payload.get('outbound', [])]
+    if outbound:
+        log_channels = load_json_file(CONFIG_FILE).get('update_log_channels', {})
+        broadcast_queue.broadcast(local_log_channels(log_channels), outbound)
+
+async def on_chart_analytics_updated(payload: dict):
+    await asyncio.to_thread(chart_analytics.load)
+
+cluster = None
+if (cluster_config := config.get('cluster', {})).get('enabled'):
+    cluster = ClusterCoordinator(ClusterStore(cluster_config.get('database', CLUSTER_DATABASE_FILE)), f"{socket.gethostname()}-{os.getpid()}",
+                                 lease_ttl=cluster_config.get('lease_ttl', 30), on_leadership=on_cluster_leadership)
+    cluster.on('catalog_updated', on_catalog_updated)
+    cluster.on('chart_analytics_updated', on_chart_analytics_updated)
+    metrics.gauge('cluster_leader', lambda: int(cluster.is_leader))
+
+@tasks.loop(minutes=30)
+async def clean_orphaned_workspaces():
+    try:
+        await asyncio.to_thread(sweep_orphaned_workspaces, TEMP_FOLDER, WORKSPACE_ORPHAN_AGE)
+    except Exception as e:
+        await log_error_to_channel(f"Error cleaning orphaned workspaces: {str(e)}")
+
+async def refresh_catalog_and_start_polling():
+    live = await get_live_track_data()
+    logging.info(f"Live tracks fetched: {len(live.tracks) if live else 0}")
+    if live is not None:
+        catalog.swap(live.tracks, fingerprints=live.fingerprints)
+    chart_store.pin(current_chart_names(get_cached_track_data()))
+    schedule_chart_analytics()
+    await update_bot_status()
+    # The poller diffs against the refreshed catalog, so it only starts once the refresh is in.
+    if not cluster or cluster.is_leader:
+        update_poller.start()
+
+def command_signature_hash() -> str:
+    payloads = []
+    for command in tree.get_commands():
+        try:
+            payloads.append(command.to_dict(tree))
+        except TypeError:
+            payloads.append(command.to_dict())
+    return hashlib.sha256(json.dumps(payloads, sort_keys=True, default=str).encode()).hexdigest()
+
+async def sync_commands_if_changed():
+    signature_hash = command_signature_hash()
+    sync_state = load_json_file(COMMAND_SYNC_FILE, {})
+    if sync_state.get('hash') == signature_hash and sync_state.get('application_id') == client.application_id:
+        logging.info("Command signatures unchanged since the last sync, skipping tree.sync().")
+        return
+
+    logging.info("Attempting to sync commands globally...")
+    try:
+        await tree.sync()
+        save_json_file(COMMAND_SYNC_FILE, {'hash': signature_hash, 'application_id': client.application_id})
+        logging.info("Global command sync successful.")
+    except Exception as e:
+        await log_error_to_channel(f"Global command sync failed: {str(e)}")
+
+startup_started = False
 
 @client.event
 async def on_ready():
+    global startup_started
     try:
         logging.info("Starting on_ready event...")
-        live_tracks = await get_live_track_data()
-        logging.info(f"Live tracks fetched: {len(live_tracks or [])}")
-        save_json_file(TRACK_CACHE_FILE, {"tracks": live_tracks if live_tracks is not None else []})
-        
         logging.info(f"Bot logged in as {client.user} (ID: {client.user.id})")
         logging.info(f"Found {len(client.guilds)} guilds: {[guild.name + ' (' + str(guild.id) + ')' for guild in client.guilds]}")
-        
-        logging.info("Attempting to sync commands globally...")
-        try:
-            await tree.sync()
-            logging.info("Global command sync successful.")
-        except Exception as e:
-            await log_error_to_channel(f"Global command sync failed: {str(e)}")
 
-        await update_bot_status()
-        check_for_updates.start()
-        logging.info("Bot is ready.")
+        if not startup_started:
+            startup_started = True
+            if cluster:
+                # Only the lease holder polls; the other shard processes reload when it publishes changes.
+                logging.info(f"Serving {len(get_cached_track_data())} cached tracks as cluster node {cluster.node_id}.")
+                cluster.start()
+            else:
+                logging.info(f"Serving {len(get_cached_track_data())} cached tracks while the live catalog refreshes.")
+                start_background_task(refresh_catalog_and_start_polling())
+            await sync_commands_if_changed()
+
+        await start_metrics()
+        loop_monitor.start()
+        if not clean_orphaned_workspaces.is_running():
+            clean_orphaned_workspaces.start()
+        startup_timings.setdefault('ready', time.perf_counter() - PROCESS_STARTED)
+        logging.info(f"Bot is ready ({startup_timings['ready']:.2f}s after process start).")
     except Exception as e:
         await log_error_to_channel(f"Error in on_ready event: {str(e)}")
         raise
 
+def process_metrics_port() -> int | None:
+    """ENCORE_METRICS_PORT if set, else `metrics_port` plus this process's first shard id.
+
+    Shard ids are disjoint across processes, so every shard process gets its own port.
+    """
+    if port := os.environ.get('ENCORE_METRICS_PORT'):
+        return int(port)
+    if not (base_port := config.get('metrics_port', 9108)):
+        return None
+    return base_port + min(shard_ids) if shard_ids else base_port
+
+async def start_metrics():
+    global metrics_runner
+    if metrics_runner is not None or not (metrics_port := process_metrics_port()): return
+    try:
+        metrics_runner = await start_metrics_server(metrics, config.get('metrics_host', '127.0.0.1'), metrics_port)
+    except OSError as e:
+        await log_error_to_channel(f"Could not start the metrics endpoint on port {metrics_port}: {e}")
+
+@client.event
+async def on_app_command_completion(interaction: discord.Interaction, command: app_commands.Command | app_commands.ContextMenu):
+    latency = (datetime.now(timezone.utc) - interaction.created_at).total_seconds()
+    metrics.observe('command_seconds', latency, command=command.qualified_name)
+
 # --- AUTOCOMPLETE ---
+@metrics.timed('autocomplete_seconds')
 async def track_autocomplete(interaction: discord.Interaction, current: str) -> list[app_commands.Choice[str]]:
     try:
         choices = []
         for track in get_cached_track_data():
-            if current.lower() in track.get('title', '').lower():
-                if track['title'] not in [c.name for c in choices]:
-                    choices.append(app_commands.Choice(name=track['title'], value=track['title']))
+            if current.lower() in (track.title or '').lower():
+                if track.title not in [c.name for c in choices]:
+                    choices.append(app_commands.Choice(name=track.title, value=track.title))
         return choices[:25]
     except Exception as e:
         await log_error_to_channel(f"Error in track_autocomplete: {str(e)}")
         return []
 
-async def generate_path_response(user_id: int, song_data: dict, instrument: Instruments, difficulty: Difficulties, squeeze_percent: int, lefty_flip: bool, activation_opacity: int, no_bpms: bool, no_solos: bool, no_time_signatures: bool) -> tuple:
+class PathRenderError(Exception):
+    def __init__(self, message: str, reason: str = None) -> None:
+        super().__init__(message)
+        self.reason = reason or message
+
+def parse_path_output(filtered_output: str) -> dict:
+    lines = filtered_output.split('\n')
+    acts = lines[0].replace('Path: ', '').split('-')
+    phrases, overlaps = process_acts(acts)
+    return {
+        'phrases': phrases,
+        'activations': len(acts),
+        'overlaps': overlaps,
+        'no_sp_score': lines[1].split(' ').pop() if len(lines) > 1 else 'N/A',
+        'total_score': lines[2].split(' ').pop() if len(lines) > 2 else 'N/A'
+    }
+
+def build_path_embed(song_data: dict, chosen_instrument: Instrument, chosen_diff: Difficulty, squeeze_percent: int, field_argument_descriptors: list, filtered_output: str, output_image: str) -> discord.Embed:
+    description = (
+        f"**Instrument:** {chosen_instrument.english}\n"
+        f"**Difficulty:** {chosen_diff.english}\n"
+        f"**Squeeze:** {squeeze_percent}%\n"
+    )
+    description += '\n'.join(field_argument_descriptors)
+
+    embed = discord.Embed(
+        title=f"Overdrive Path for **{song_data['title']}** - *{song_data['artist']}*",
+        description=description,
+        color=discord.Color.purple()
+    )
+    embed.add_field(name="Overdrive Path", value=f"```\n{filtered_output}\n```", inline=False)
+
+    summary = parse_path_output(filtered_output)
+    embed.add_field(name="Phrases", value=summary['phrases'])
+    embed.add_field(name="Activations", value=summary['activations'])
+    embed.add_field(name="Overlaps", value=summary['overlaps'])
+    embed.add_field(name="No OD Score", value=summary['no_sp_score'])
+    embed.add_field(name="Total Score", value=summary['total_score'])
+    embed.set_footer(text="Encore Bot")
+
+    embed.set_image(url=f"attachment://{output_image}")
+    if cover_url := song_data.get('cover'):
+        embed.set_thumbnail(url=f"{ASSET_BASE_URL}/assets/covers/{cover_url}")
+    return embed
+
+def queue_position_reporter(interaction: discord.Interaction):
+    async def report(position: int):
+        await interaction.edit_original_response(content=f"⏳ Waiting for a free path generator... You are **#{position}** in the queue.", view=None)
+    return report
+
+async def generate_path_response(user_id: int, song_data: dict, instrument: Instruments, difficulty: Difficulties, squeeze_percent: int, lefty_flip: bool, activation_opacity: int, no_bpms: bool, no_solos: bool, no_time_signatures: bool, on_queue_position=None) -> tuple:
     """
     Generates the path image and response data.
+    `on_queue_position` is awaited with the request's place in the CHOpt queue while it waits.
     Returns a tuple of: (content, embed, attachments, error_string)
     """
     chosen_instrument = instrument.value
     chosen_diff = difficulty.value
-    midi_tool = MidiArchiveTools()
 
     if not chosen_instrument.path_enabled:
         error_msg = f"Paths are not supported for {chosen_instrument.english}."
         return (error_msg, None, None, error_msg)
 
-    extra_arguments = []
     field_argument_descriptors = []
     if lefty_flip:
-        extra_arguments.append('--lefty-flip')
         field_argument_descriptors.append('**Lefty Flip:** Yes')
     if activation_opacity is not None:
-        extra_arguments.extend(['--act-opacity', str(activation_opacity / 100)])
         field_argument_descriptors.append(f'**Activation Opacity:** {activation_opacity}%')
     if no_bpms:
-        extra_arguments.append('--no-bpms')
         field_argument_descriptors.append('**No BPMs:** Yes')
     if no_solos:
-        extra_arguments.append('--no-solos')
         field_argument_descriptors.append('**No Solos:** Yes')
     if no_time_signatures:
-        extra_arguments.append('--no-time-sigs')
         field_argument_descriptors.append('**No Time Signatures:** Yes')
 
-    session_hash = generate_session_hash(user_id, song_data['id'])
-    
+    options = {'lefty_flip': lefty_flip, 'activation_opacity': activation_opacity, 'no_bpms': no_bpms,
+               'no_solos': no_solos, 'no_time_signatures': no_time_signatures}
+
+    try:
+        with metrics.time('path_render_seconds'):
+            rendered = await render_path(song_data, instrument, difficulty, squeeze_percent, options,
+                                         user_id=user_id, on_queue_position=on_queue_position)
+        output_image = os.path.basename(rendered['filename'])
+        embed = build_path_embed(song_data, chosen_instrument, chosen_diff, squeeze_percent, field_argument_descriptors, rendered['output'], output_image)
+        file = discord.File(rendered['image'], filename=output_image)
+        return (None, embed, [file], None)
+
+    except PathRenderError as e:
+        metrics.inc('path_errors_total', reason='render')
+        return (str(e), None, None, e.reason)
+    except ChoptQueueFull:
+        metrics.inc('path_errors_total', reason='queue_full')
+        error_msg = "The path generator is busy right now. Please try again in a few minutes."
+        return (error_msg, None, None, error_msg)
+    except ChoptTimeout as e:
+        metrics.inc('path_errors_total', reason='timeout')
+        error_msg = f"Path generation took too long and was cancelled. {e}"
+        await log_error_to_channel(f"CHOpt timed out for {song_data['id']} ({chosen_instrument.english}, {chosen_diff.english}): {e}")
+        return (error_msg, None, None, error_msg)
+    except FileNotFoundError:
+        metrics.inc('path_errors_total', reason='missing_chopt')
+        error_msg = "Error: `chopt.exe` not found. Please ensure the executable is in the bot's root directory or in your system's PATH."
+        await log_error_to_channel(error_msg)
+        return (error_msg, None, None, error_msg)
+    except Exception as e:
+        metrics.inc('path_errors_total', reason='error')
+        error_msg = f"An error occurred: {e}"
+        await log_error_to_channel(f"Error in path command: {e}")
+        return (error_msg, None, None, error_msg)
+
+def chopt_arguments(lefty_flip: bool = False, activation_opacity: int = None, no_bpms: bool = False, no_solos: bool = False, no_time_signatures: bool = False) -> list:
+    extra_arguments = []
+    if lefty_flip:
+        extra_arguments.append('--lefty-flip')
+    if activation_opacity is not None:
+        extra_arguments.extend(['--act-opacity', str(activation_opacity / 100)])
+    if no_bpms:
+        extra_arguments.append('--no-bpms')
+    if no_solos:
+        extra_arguments.append('--no-solos')
+    if no_time_signatures:
+        extra_arguments.append('--no-time-sigs')
+    return extra_arguments
+
+async def render_path(song_data: dict, instrument: Instruments, difficulty: Difficulties, squeeze_percent: int, options: dict, user_id: int = None, on_queue_position=None, priority: int = PRIORITY_INTERACTIVE,
+                      chart: StoredChart = None, workspace: SessionWorkspace = None, reserved: bool = False) -> dict:
+    """
+    Returns the cached render for these settings, running CHOpt first if needed.
+    The result is a dict with the cached `image` path, CHOpt `output` and a suggested attachment `filename`.
+    Batches pass an already downloaded `chart` so the chart is only fetched once, a shared `workspace`,
+    and `reserved=True` while they hold a CHOpt queue reservation.
+    """
+    chosen_instrument = instrument.value
+    chosen_diff = difficulty.value
+    midi_tool = MidiArchiveTools()
+
     shortname = song_data['id']
     version = song_data.get('currentversion', 1)
     chart_filename = f"{shortname}-v{version}.mid"
     chart_url = f"{ASSET_BASE_URL}/assets/midis/{chart_filename}"
+    output_image = f"{shortname}_{instrument.name.lower()}_{chosen_diff.chopt}_path.png"
+    job_workspace = workspace or SessionWorkspace(TEMP_FOLDER, prefix=shortname)
 
     try:
-        midi_file = midi_tool.save_chart(chart_url, chart_filename)
-        if not midi_file:
-            return (f"Could not download the chart file. Please check that version `{version}` exists for this track.", None, None, "Chart download failed")
+        chart = chart or await asyncio.to_thread(midi_tool.save_chart, chart_url, chart_filename)
+        if not chart:
+            raise PathRenderError(f"Could not download the chart file. Please check that version `{version}` exists for this track.", "Chart download failed")
+
+        midi_file, chart_hash = chart
+        cache_key = PathCache.make_key(chart_hash, instrument.name, chosen_diff.chopt, squeeze_percent, **options)
+        if (cached_path := path_cache.get(cache_key)) is not None:
+            return {**cached_path, 'filename': output_image}
 
         if chosen_instrument.replace:
-            modified_midi_file = midi_tool.modify_midi_file(midi_file, chosen_instrument, session_hash, song_data['id'])
+            modified_midi_file = midi_tool.modify_midi_file(midi_file, chosen_instrument, chart_hash)
             if not modified_midi_file:
-                error_msg = f"Failed to modify MIDI for '{instrument.name}'."
-                return (error_msg, None, None, error_msg)
+                raise PathRenderError(f"Failed to modify MIDI for '{instrument.name}'.")
             midi_file = modified_midi_file
 
-        output_image = f"{song_data['id']}_{chosen_instrument.chopt.lower()}_path_{session_hash}.png"
-        chopt_output = run_chopt(midi_file, chosen_instrument.chopt, output_image, squeeze_percent, instrument=chosen_instrument, difficulty=chosen_diff.chopt, extra_args=extra_arguments)
+        output_path = job_workspace.file(output_image)
+        chopt_output = await run_chopt(midi_file, chosen_instrument.chopt, output_path, squeeze_percent, instrument=chosen_instrument, difficulty=chosen_diff.chopt,
+                                       extra_args=chopt_arguments(**options), user_id=user_id, on_queue_position=on_queue_position, priority=priority,
+                                       reserved=reserved)
 
         filtered_output = '\n'.join([line for line in chopt_output.splitlines() if "Optimising, please wait..." not in line])
 
-        description = (
-            f"**Instrument:** {chosen_instrument.english}\n"
-            f"**Difficulty:** {chosen_diff.english}\n"
-            f"**Squeeze:** {squeeze_percent}%\n"
-        )
-        description += '\n'.join(field_argument_descriptors)
-
-        output_path = os.path.join(TEMP_FOLDER, output_image)
-        if os.path.exists(output_path):
-            file = discord.File(output_path, filename=output_image)
-            embed = discord.Embed(
-                title=f"Overdrive Path for **{song_data['title']}** - *{song_data['artist']}*",
-                description=description,
-                color=discord.Color.purple()
-            )
-            embed.add_field(name="Overdrive Path", value=f"```\n{filtered_output}\n```", inline=False)
-
-            acts = filtered_output.split('\n')[0].replace('Path: ', '').split('-')
-            total_acts = len(acts)
-            phrases, overlaps = process_acts(acts)
-
-            no_sp_score = filtered_output.split('\n')[1].split(' ').pop()
-            total_score = filtered_output.split('\n')[2].split(' ').pop()
-
-            embed.add_field(name="Phrases", value=phrases)
-            embed.add_field(name="Activations", value=total_acts)
-            embed.add_field(name="Overlaps", value=overlaps)
-            embed.add_field(name="No OD Score", value=no_sp_score)
-            embed.add_field(name="Total Score", value=total_score)
-            embed.set_footer(text="Encore Bot")
-
-            embed.set_image(url=f"attachment://{output_image}")
-            if cover_url := song_data.get('cover'):
-                embed.set_thumbnail(url=f"{ASSET_BASE_URL}/assets/covers/{cover_url}")
-
-            return (None, embed, [file], None)
-        else:
-            error_msg = f"Failed to generate the path image for '{song_data['title']}'."
-            return (error_msg, None, None, error_msg)
+        if not os.path.exists(output_path):
+            raise PathRenderError(f"Failed to generate the path image for '{song_data['title']}'.")
+        cached_path = path_cache.put(cache_key, output_path, filtered_output, shortname, version)
+        return {**cached_path, 'filename': output_image}
+    finally:
+        if workspace is None:
+            job_workspace.cleanup()
 
-    except FileNotFoundError:
-        error_msg = "Error: `chopt.exe` not found. Please ensure the executable is in the bot's root directory or in your system's PATH."
-        await log_error_to_channel(error_msg)
+async def generate_path_batch_response(user_id: int, song_data: dict, instruments: list, difficulties: list, squeeze_percent: int, lefty_flip: bool, activation_opacity: int, no_bpms: bool, no_solos: bool, no_time_signatures: bool, on_queue_position=None) -> tuple:
+    """
+    Renders every instrument/difficulty combination from one downloaded chart as parallel CHOpt jobs.
+    The batch takes a single CHOpt queue admission, so it is either rejected up front or runs every
+    combination, at most `pathbatch_concurrency` of them at a time.
+    Returns a tuple of: (content, embed, attachment_chunks, error_string), with at most 10 files per chunk.
+    """
+    combinations = [(inst, diff) for inst in instruments if inst.value.path_enabled for diff in difficulties]
+    if not combinations:
+        error_msg = "None of the selected instruments support paths."
+        return (error_msg, None, None, error_msg)
+
+    workspace = SessionWorkspace(TEMP_FOLDER, prefix=song_data['id'])
+    options = {'lefty_flip': lefty_flip, 'activation_opacity': activation_opacity, 'no_bpms': no_bpms,
+               'no_solos': no_solos, 'no_time_signatures': no_time_signatures}
+    version = song_data.get('currentversion', 1)
+    chart_filename = f"{song_data['id']}-v{version}.mid"
+    chart_url = f"{ASSET_BASE_URL}/assets/midis/{chart_filename}"
+
+    concurrency = asyncio.Semaphore(max(1, config.get('pathbatch_concurrency', 2)))
+
+    async def render(index: int, inst: Instruments, diff: Difficulties) -> dict:
+        async with concurrency:
+            return await render_path(song_data, inst, diff, squeeze_percent, options, user_id=user_id,
+                                     on_queue_position=on_queue_position if index == 0 else None,
+                                     chart=chart, workspace=workspace, reserved=True)
+
+    try:
+        with chopt_pool.reserve():
+            chart = await asyncio.to_thread(MidiArchiveTools().save_chart, chart_url, chart_filename)
+            if not chart:
+                return (f"Could not download the chart file. Please check that version `{version}` exists for this track.", None, None, "Chart download failed")
+
+            results = await asyncio.gather(*(render(index, inst, diff) for index, (inst, diff) in enumerate(combinations)),
+                                           return_exceptions=True)
+
+        embed = discord.Embed(
+            title=f"Overdrive Paths for **{song_data['title']}** - *{song_data['artist']}*",
+            description=f"**Squeeze:** {squeeze_percent}%",
+            color=discord.Color.purple()
+        )
+        files, rows_by_instrument = [], {}
+        for (inst, diff), result in zip(combinations, results):
+            rows = rows_by_instrument.setdefault(inst, [])
+            if isinstance(result, Exception):
+                logging.warning(f"Batch path failed for {song_data['id']} ({inst.name}, {diff.name}): {result}")
+                rows.append(f"{diff.value.english:<7} failed")
+                continue
+            summary = parse_path_output(result['output'])
+            rows.append(f"{diff.value.english:<7} {summary['phrases']:>3} {summary['activations']:>3} {summary['overlaps']:>3} {summary['total_score']:>9}")
+            files.append(discord.File(result['image'], filename=result['filename']))
+
+        for inst, rows in rows_by_instrument.items():
+            table = f"{'':<7} {'Phr':>3} {'Act':>3} {'Ovl':>3} {'Score':>9}\n" + "\n".join(rows)
+            embed.add_field(name=inst.value.english, value=f"```\n{table}\n```", inline=False)
+        embed.set_footer(text="Encore Bot")
+        if cover_url := song_data.get('cover'):
+            embed.set_thumbnail(url=f"{ASSET_BASE_URL}/assets/covers/{cover_url}")
+
+        if not files:
+            error_msg = f"Failed to generate any paths for '{song_data['title']}'."
+            return (error_msg, embed, None, error_msg)
+        return (None, embed, [files[i:i + 10] for i in range(0, len(files), 10)], None)
+
+    except ChoptQueueFull:
+        metrics.inc('path_errors_total', reason='queue_full')
+        error_msg = f"The path generator is busy right now ({chopt_pool.queue_depth} renders waiting). Please try again in a few minutes."
         return (error_msg, None, None, error_msg)
     except Exception as e:
         error_msg = f"An error occurred: {e}"
-        await log_error_to_channel(f"Error in path command: {e}")
+        await log_error_to_channel(f"Error in path batch command: {e}")
         return (error_msg, None, None, error_msg)
     finally:
-        delete_session_files(session_hash)
+        workspace.cleanup()
+
+async def send_path_batch_response(interaction: discord.Interaction, content: str, embed: discord.Embed, attachment_chunks: list):
+    chunks = attachment_chunks or [[]]
+    await interaction.edit_original_response(content=content, embed=embed, attachments=chunks[0], view=None)
+    for chunk in chunks[1:]:
+        await interaction.followup.send(files=chunk)
+
+async def prefetch_default_paths(track: dict):
+    prefetch_config = load_json_file(CONFIG_FILE).get('prefetch', {})
+    if not prefetch_config.get('enabled'): return
+
+    instruments = [Instruments[name] for name in prefetch_config.get('instruments', []) if name in Instruments.__members__] \
+        or [inst for inst in Instruments if inst.value.path_enabled]
+    difficulties = [Difficulties[name] for name in prefetch_config.get('difficulties', []) if name in Difficulties.__members__] \
+        or [Difficulties.Expert]
+    squeeze_percent = prefetch_config.get('squeeze_percent', 20)
+    options = {'lefty_flip': False, 'activation_opacity': None, 'no_bpms': False, 'no_solos': False, 'no_time_signatures': False}
+
+    async def prefetch(instrument: Instruments, difficulty: Difficulties):
+        try:
+            await render_path(track, instrument, difficulty, squeeze_percent, options, priority=PRIORITY_BACKGROUND)
+        except Exception as e:
+            logging.warning(f"Prefetch failed for {track['id']} ({instrument.name}, {difficulty.name}): {e}")
+
+    combinations = [(inst, diff) for inst in instruments if inst.value.path_enabled for diff in difficulties]
+    logging.info(f"Prefetching {len(combinations)} default paths for {track['id']} v{track.get('currentversion', 1)}.")
+    await asyncio.gather(*(prefetch(inst, diff) for inst, diff in combinations))
 
 @tree.command(name="trackinfo", description="Get detailed information about a specific track.")
 @app_commands.autocomplete(track_name=track_autocomplete)
@@ -1106,6 +1600,9 @@ async def trackinfo(interaction: discord.Interaction, track_name: str):
         if len(matched_tracks) == 1:
             embed, view = create_track_embed_and_view(matched_tracks[0], interaction.user.id)
             if embed: await interaction.followup.send(embed=embed, view=view)
+            if 'first_trackinfo' not in startup_timings:
+                startup_timings['first_trackinfo'] = time.perf_counter() - PROCESS_STARTED
+                logging.info(f"First /trackinfo answered {startup_timings['first_trackinfo']:.2f}s after process start.")
         else:
             view = TrackSelectionView(matched_tracks, interaction.user.id, 'info')
             view.message = await interaction.followup.send(f"Found {len(matched_tracks)} results. Please select one:", view=view, ephemeral=True)
@@ -1114,25 +1611,39 @@ async def trackinfo(interaction: discord.Interaction, track_name: str):
         await interaction.followup.send("An error occurred while processing your request.", ephemeral=True)
 
 @tree.command(name="tracksort", description="Sorts all tracks by a specific criterion.")
-@app_commands.describe(sort_by="The criterion to sort tracks by.")
+@app_commands.describe(sort_by="The criterion to sort tracks by.", instrument="Instrument for note-based sorts (defaults to Lead).",
+                       difficulty="Difficulty for note-based sorts (defaults to Expert).")
 @app_commands.choices(sort_by=[
     app_commands.Choice(name="Charter (A-Z)", value="charter"), app_commands.Choice(name="Charter (Z-A)", value="charter_za"),
     app_commands.Choice(name="Hardest (Avg. Difficulty)", value="hardest"), app_commands.Choice(name="Easiest (Avg. Difficulty)", value="easiest"),
     app_commands.Choice(name="Fastest (Highest BPM)", value="fastest"), app_commands.Choice(name="Slowest (Lowest BPM)", value="slowest"),
     app_commands.Choice(name="Newest (Recent Release Year)", value="newest"), app_commands.Choice(name="Oldest (Oldest Release Year)", value="oldest"),
     app_commands.Choice(name="Shortest (Shortest Length)", value="shortest"), app_commands.Choice(name="Longest (Longest Length)", value="longest"),
-    app_commands.Choice(name="Latest (Recent Creation Date)", value="latest"), app_commands.Choice(name="Earliest (Oldest Creation Date)", value="earliest")])
-async def tracksort(interaction: discord.Interaction, sort_by: str):
+    app_commands.Choice(name="Latest (Recent Creation Date)", value="latest"), app_commands.Choice(name="Earliest (Oldest Creation Date)", value="earliest"),
+    app_commands.Choice(name="Densest (Avg. Notes per Second)", value="densest"), app_commands.Choice(name="Most Notes", value="most_notes"),
+    app_commands.Choice(name="Peak Density (Busiest Second)", value="peak_density")])
+async def tracksort(interaction: discord.Interaction, sort_by: str, instrument: Instruments = None, difficulty: Difficulties = Difficulties.Expert):
     try:
         await interaction.response.defer()
-        sorted_tracks = fuzzy_search_tracks(get_cached_track_data(), query="", sort_method=sort_by)
+        label, command_args = sort_by.replace('_', '-').title(), None
+        if sort_by in ANALYTICS_SORTS:
+            instrument = instrument or Instruments.Lead
+            if not instrument.value.path_enabled:
+                await interaction.followup.send(f"Note-based sorts are not available for {instrument.value.english}.", ephemeral=True)
+                return
+            sorted_tracks = sort_tracks_by_chart_stats(get_cached_track_data(), sort_by, instrument, difficulty)
+            label += f"** on **{difficulty.value.english} {instrument.value.english}"
+            command_args = {'instrument': instrument, 'difficulty': difficulty}
+        else:
+            sorted_tracks = fuzzy_search_tracks(get_cached_track_data(), query="", sort_method=sort_by)
         
         if not sorted_tracks:
-            await interaction.followup.send("Could not find any tracks to sort.", ephemeral=True)
+            message = "No chart statistics have been indexed yet, please try again later." if sort_by in ANALYTICS_SORTS else "Could not find any tracks to sort."
+            await interaction.followup.send(message, ephemeral=True)
             return
         
-        view = TrackSelectionView(sorted_tracks, interaction.user.id, 'info', sort=sort_by)
-        view.message = await interaction.followup.send(f"Showing top results for tracks sorted by **{sort_by.replace('_', '-').title()}**:", view=view)
+        view = TrackSelectionView(sorted_tracks, interaction.user.id, 'info', sort=sort_by, command_args=command_args)
+        view.message = await interaction.followup.send(f"Showing top results for tracks sorted by **{label}**:", view=view)
     except Exception as e:
         await log_error_to_channel(f"Error in tracksort command: {str(e)}")
         await interaction.followup.send("An error occurred while processing your request.", ephemeral=True)
@@ -1201,13 +1712,63 @@ async def path(interaction: discord.Interaction,
         content, embed, attachments, error = await generate_path_response(
             user_id=interaction.user.id,
             song_data=matched_tracks[0],
+            on_queue_position=queue_position_reporter(interaction),
             **command_args
         )
-        await interaction.followup.send(content=content, embed=embed, files=attachments or [])
+        await interaction.edit_original_response(content=content, embed=embed, attachments=attachments or [])
     else:
         view = TrackSelectionView(matched_tracks, interaction.user.id, 'path', command_args=command_args)
         view.message = await interaction.followup.send(f"Found {len(matched_tracks)} results. Please select one:", view=view)
 
+@tree.command(name="pathbatch", description="Generates path images for several instruments and difficulties of a song at once.")
+@app_commands.autocomplete(song_name=track_autocomplete)
+@app_commands.describe(
+    song_name="The name of the song.",
+    instrument="Only generate paths for this instrument (default: every instrument).",
+    difficulty="Only generate paths for this difficulty (default: every difficulty).",
+    squeeze_percent="The percentage to squeeze the chart image horizontally.",
+    lefty_flip="Flip the chart for left-handed players.",
+    activation_opacity="Set the opacity of activation lanes (0-100).",
+    no_bpms="Hide BPM markers on the chart.",
+    no_solos="Hide solo markers on the chart.",
+    no_time_signatures="Hide time signature markers on the chart."
+)
+async def pathbatch(interaction: discord.Interaction, 
+                    song_name: str, 
+                    instrument: Instruments = None, 
+                    difficulty: Difficulties = None,
+                    squeeze_percent: app_commands.Range[int, 0, 100] = 20,
+                    lefty_flip: bool = False,
+                    activation_opacity: app_commands.Range[int, 0, 100] = None,
+                    no_bpms: bool = False,
+                    no_solos: bool = False,
+                    no_time_signatures: bool = False):
+    await interaction.response.defer()
+
+    matched_tracks = fuzzy_search_tracks(get_cached_track_data(), song_name)
+    if not matched_tracks:
+        await interaction.followup.send(f"Sorry, no tracks were found matching your query: '{song_name}'")
+        return
+
+    command_args = {
+        "instruments": [instrument] if instrument else list(Instruments),
+        "difficulties": [difficulty] if difficulty else list(Difficulties),
+        "squeeze_percent": squeeze_percent, "lefty_flip": lefty_flip, "activation_opacity": activation_opacity,
+        "no_bpms": no_bpms, "no_solos": no_solos, "no_time_signatures": no_time_signatures
+    }
+
+    if len(matched_tracks) == 1:
+        content, embed, attachment_chunks, error = await generate_path_batch_response(
+            user_id=interaction.user.id,
+            song_data=matched_tracks[0],
+            on_queue_position=queue_position_reporter(interaction),
+            **command_args
+        )
+        await send_path_batch_response(interaction, content, embed, attachment_chunks)
+    else:
+        view = TrackSelectionView(matched_tracks, interaction.user.id, 'pathbatch', command_args=command_args)
+        view.message = await interaction.followup.send(f"Found {len(matched_tracks)} results. Please select one:", view=view)
+
 
 class SuggestionModal(discord.ui.Modal, title="Suggest a Feature"):
     suggestion_input = discord.ui.TextInput(label="Your Suggestion", style=discord.TextStyle.long, 
@@ -1270,14 +1831,11 @@ async def bot_info(interaction: discord.Interaction):
         await interaction.response.defer()
         version = load_json_file(CHANGELOG_FILE, {}).get("version", "N/A")
         
-        tracks = get_cached_track_data()
-        playable = sum(1 for t in tracks if t.get('new'))
-        wip = sum(1 for t in tracks if t.get('rotated'))
-        finished = sum(1 for t in tracks if t.get('finish'))
-
-        history = load_json_file(TRACK_HISTORY_FILE, {})
-        updates = sum(len(v) for v in history.values())
-        latest_update_ts = max((datetime.fromisoformat(u['timestamp']) for v in history.values() for u in v), default=None)
+        playable = bot_stats.flag_counts['new']
+        wip = bot_stats.flag_counts['rotated']
+        finished = bot_stats.flag_counts['finish']
+        updates = bot_stats.updates
+        latest_update_ts = datetime.fromisoformat(bot_stats.latest_update) if bot_stats.latest_update else None
 
         embed = discord.Embed(title="Bot Information", description="Jaydenz Customs For Encore", color=discord.Color.purple())
         
@@ -1285,14 +1843,31 @@ async def bot_info(interaction: discord.Interaction):
             f"**Playable Tracks:** {playable}\n"
             f"**WIP Tracks:** {wip}\n"
             f"**Finished Tracks:** {finished}\n"
-            f"**Total Tracks:** {len(tracks)}"
+            f"**Total Tracks:** {bot_stats.total_tracks}"
         ), inline=True)
 
         embed.add_field(name="🔄 Track Update History", value=(
             f"**Total Updates:** {updates}\n"
             f"**Last Update:** {f'<t:{int(latest_update_ts.timestamp())}:R>' if latest_update_ts else 'N/A'}"
         ), inline=True)
-        
+
+        cache_stats = path_cache.stats()
+        embed.add_field(name="🗂️ Path Cache", value=(
+            f"**Hits:** {cache_stats['hits']}\n"
+            f"**Misses:** {cache_stats['misses']}\n"
+            f"**Cached Paths:** {cache_stats['entries']} ({cache_stats['bytes'] / (1024 * 1024):.1f} MB)"
+        ), inline=True)
+
+        poll_stats = update_poller.stats()
+        last_cycle = "N/A" if poll_stats['last_cycle_duration'] is None \
+            else f"{poll_stats['last_cycle_duration']:.2f}s ({poll_stats['last_outcome']})"
+        last_change = "N/A" if poll_stats['last_change_age'] is None else f"{poll_stats['last_change_age']:.0f}s ago"
+        embed.add_field(name="⏱️ Update Polling", value=(
+            f"**Interval:** {poll_stats['interval']:.0f}s\n"
+            f"**Last Cycle:** {last_cycle}\n"
+            f"**Last Change:** {last_change}"
+        ), inline=True)
+
         embed.set_footer(text=f"Version {version}")
         
         await interaction.followup.send(embed=embed, view=BotInfoView())
@@ -1311,6 +1886,61 @@ async def setlogchannel(interaction: discord.Interaction):
     save_json_file(CONFIG_FILE, config)
     await interaction.response.send_message(f"✅ Update log channel set to {interaction.channel.mention}.", ephemeral=True)
 
+@tree.command(name="stats", description="Shows latency percentiles, counters and queue depths.")
+@app_commands.default_permissions(administrator=True)
+@app_commands.describe(window_minutes="How many recent minutes the percentiles cover.")
+async def stats(interaction: discord.Interaction, window_minutes: app_commands.Range[int, 1, 15] = 15):
+    try:
+        summary = metrics.summary(window=window_minutes * 60)
+        label_text = lambda labels: f"[{','.join(str(v) for v in labels.values())}]" if labels else ""
+
+        window_text = lambda covered: f" (last {covered / 60:.1f}m only)" if covered < window_minutes * 60 - 1 else ""
+
+        latency_rows = [f"{name.removesuffix('_seconds')}{label_text(labels)}: n={count} "
+                        f"p50={p50 * 1000:.0f} p95={p95 * 1000:.0f} p99={p99 * 1000:.0f}{window_text(covered)}"
+                        for name, labels, count, p50, p95, p99, covered in summary['histograms']]
+        counter_rows = [f"{name}{label_text(labels)}: {value:g}" for name, labels, value in summary['counters']]
+        gauge_rows = [f"{name}{label_text(labels)}: {value:g}" for name, labels, value in summary['gauges']]
+
+        embed = discord.Embed(title="Bot Stats", description=f"Latency percentiles over the last {window_minutes} minutes, in ms.", color=discord.Color.purple())
+        blocking_rows = [f"{offender.site}: {offender.count}x, worst {offender.worst:.2f}s, total {offender.total:.1f}s"
+                         for offender in loop_monitor.worst_offenders(5)]
+        for title, rows in (("Latency", latency_rows), ("Counters", counter_rows), ("Gauges", gauge_rows), ("Blocking Calls", blocking_rows)):
+            text = "\n".join(rows) or "No data yet."
+            embed.add_field(name=title, value=f"```\n{text[:1000]}\n```", inline=False)
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+    except Exception as e:
+        await log_error_to_channel(f"Error in stats command: {str(e)}")
+        await interaction.response.send_message("An error occurred while collecting stats.", ephemeral=True)
+
+@tree.command(name="profile", description="Profiles the next calls of a slow code path and writes the dumps to disk.")
+@app_commands.default_permissions(administrator=True)
+@app_commands.describe(
+    target="The code path to profile. Leave empty to show what is currently armed.",
+    calls="How many calls to profile (0 disarms the target).",
+    sample_percent="Only profile this percentage of calls.",
+    mode="cpu (cProfile), memory (tracemalloc) or both."
+)
+@app_commands.choices(
+    target=[app_commands.Choice(name=name, value=name) for name in PROFILE_TARGETS],
+    mode=[app_commands.Choice(name=mode, value=mode) for mode in PROFILE_MODES]
+)
+async def profile(interaction: discord.Interaction, target: str = None, calls: app_commands.Range[int, 0, 100] = None,
+                  sample_percent: app_commands.Range[int, 1, 100] = None, mode: str = 'cpu'):
+    if target is not None:
+        if calls == 0:
+            profiler.disarm(target)
+        else:
+            profiler.arm(target, calls=calls, sample_percent=sample_percent, mode=mode)
+
+    armed = [f"{name}: {'∞' if t.remaining is None else t.remaining} calls, {t.sample_percent or 100}% sampled, {t.mode}"
+             for name, t in profiler.targets.items()]
+    embed = discord.Embed(title="Profiling", color=discord.Color.purple())
+    embed.add_field(name="Armed", value=f"```\n{chr(10).join(armed) or 'Nothing armed.'}\n```", inline=False)
+    embed.add_field(name="Recent Dumps", value=f"```\n{chr(10).join(profiler.recent_dumps()) or 'None yet.'}\n```", inline=False)
+    embed.set_footer(text=f"Dumps are written to {PROFILE_FOLDER}")
+    await interaction.response.send_message(embed=embed, ephemeral=True)
+
 @tree.command(name="testchartvisualization", description="Tests the MIDI chart visualization.")
 @app_commands.default_permissions(administrator=True)
 @app_commands.autocomplete(track_name=track_autocomplete)
@@ -1333,12 +1963,9 @@ async def testchartvisualization(interaction: discord.Interaction, track_name: s
         return
     track_info = matched_tracks[0]
 
-    session_id = str(uuid.uuid4())
-    temp_dir = 'temp_midi'
-    os.makedirs(temp_dir, exist_ok=True)
-    old_path = os.path.join(temp_dir, f'old_{session_id}.mid')
-    new_path = os.path.join(temp_dir, f'new_{session_id}.mid')
-    image_paths_to_clean = []
+    workspace = SessionWorkspace(TEMP_FOLDER, prefix="testchart")
+    old_path = workspace.file('old.mid')
+    new_path = workspace.file('new.mid')
 
     try:
         async with aiohttp.ClientSession() as session:
@@ -1354,23 +1981,26 @@ async def testchartvisualization(interaction: discord.Interaction, track_name: s
                     f1.write(await r1.read())
                     f2.write(await r2.read())
                 
+                import compare_midi
+
                 test_format = format.value if format else 'json'
-                comparison_results = compare_midi.run_comparison(
-                    old_path, new_path, session_id, 
-                    output_folder=temp_dir, 
+                comparison_results = await asyncio.to_thread(
+                    profiler.profiled('run_comparison')(compare_midi.run_comparison),
+                    old_path, new_path, track_info['id'],
+                    output_folder=workspace.path,
                     format=test_format
                 )
 
                 if comparison_results:
                     await interaction.followup.send(f"MIDI comparison results (Format: **{test_format.upper()}**):")
-                    for comp_track_name, image_path in comparison_results:
-                        image_paths_to_clean.append(image_path)
+                    for comp_track_name, image_path, shifts in comparison_results:
                         
                         now_ts = f"<t:{int(datetime.now().timestamp())}:D>"
                         
                         vis_embed = discord.Embed(
                             title=f"Test Chart Changes for {track_info['title']}",
-                            description=f"Instrument: **{comp_track_name}**\n\nDetected changes between:\nAn older version and the version from {now_ts}",
+                            description=f"Instrument: **{comp_track_name}**\n\nDetected changes between:\nAn older version and the version from {now_ts}"
+                                        f"{format_chart_shifts(shifts)}",
                             color=discord.Color.orange(),
                         )
                         if cover := track_info.get('cover'):
@@ -1387,10 +2017,10 @@ async def testchartvisualization(interaction: discord.Interaction, track_name: s
         await log_error_to_channel(f"Error during MIDI test command: {e}")
         await interaction.followup.send(f"An error occurred: {e}")
     finally:
-        if os.path.exists(old_path): os.remove(old_path)
-        if os.path.exists(new_path): os.remove(new_path)
-        for p in image_paths_to_clean:
-            if os.path.exists(p): os.remove(p)
+        workspace.cleanup()
+
+startup_timings['imports'] = time.perf_counter() - PROCESS_STARTED
+logging.info(f"Loaded bot module in {startup_timings['imports']:.2f}s.")
 
 if __name__ == "__main__":
     try:
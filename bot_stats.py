@@ -0,0 +1,95 @@
+import json
+import logging
+import os
+from datetime import datetime
+
+TRACK_FLAGS = ('new', 'rotated', 'finish')
+
+
+class BotStats:
+    """Running totals behind /bot-info.
+
+    Track counts are adjusted per changed track id when the catalog swaps, and the
+    history totals are bumped once new entries are saved, so reading them never scans
+    the catalog or the history file. Everything is persisted to `stats_file` together
+    with the size and mtime of the history file the totals describe; the history file
+    is only scanned again when that checkpoint no longer matches, e.g. after a crash
+    between saving the history and saving the stats.
+    """
+
+    def __init__(self, stats_file: str) -> None:
+        self.stats_file = stats_file
+        self.flag_counts = dict.fromkeys(TRACK_FLAGS, 0)
+        self.total_tracks = 0
+        self.updates = 0
+        self.latest_update = None
+        self.history_checkpoint = None
+        self._track_flags = {}
+
+    @staticmethod
+    def _checkpoint(history_file: str) -> list | None:
+        try:
+            stat = os.stat(history_file)
+        except FileNotFoundError:
+            return None
+        return [stat.st_size, stat.st_mtime_ns]
+
+    def load(self, history_file: str):
+        try:
+            with open(self.stats_file, 'r') as f:
+                history_stats = json.load(f).get('history', {})
+        except (FileNotFoundError, json.JSONDecodeError):
+            history_stats = {}
+        if 'updates' in history_stats and history_stats.get('checkpoint') == self._checkpoint(history_file):
+            self.updates = history_stats['updates']
+            self.latest_update = history_stats.get('latest_update')
+            self.history_checkpoint = history_stats['checkpoint']
+        else:
+            self.rebuild_history(history_file)
+            self.save()
+
+    def rebuild_history(self, history_file: str):
+        # Taken before reading, so a write that lands in between leaves a stale checkpoint and another rebuild.
+        self.history_checkpoint = self._checkpoint(history_file)
+        try:
+            with open(history_file, 'r') as f:
+                history = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            history = {}
+        self.updates, self.latest_update = 0, None
+        for entries in history.values():
+            for entry in entries:
+                self.record_update(entry['timestamp'])
+        logging.info(f"Rebuilt history stats from {history_file}: {self.updates} updates.")
+
+    def apply_catalog_changes(self, tracks_by_id: dict, changed_ids):
+        for track_id in changed_ids:
+            for flag in self._track_flags.pop(track_id, ()):
+                self.flag_counts[flag] -= 1
+            if (track := tracks_by_id.get(track_id)) is not None:
+                flags = tuple(flag for flag in TRACK_FLAGS if track.get(flag))
+                for flag in flags:
+                    self.flag_counts[flag] += 1
+                self._track_flags[track_id] = flags
+        self.total_tracks = len(tracks_by_id)
+
+    def record_update(self, timestamp: str):
+        self.updates += 1
+        if self.latest_update is None or datetime.fromisoformat(timestamp) > datetime.fromisoformat(self.latest_update):
+            self.latest_update = timestamp
+
+    def record_saved_updates(self, history_file: str, timestamps: list[str]):
+        """Counts history entries once `history_file` has been saved with them."""
+        for timestamp in timestamps:
+            self.record_update(timestamp)
+        self.history_checkpoint = self._checkpoint(history_file)
+
+    def save(self):
+        temp_file = f"{self.stats_file}.tmp"
+        with open(temp_file, 'w') as f:
+            json.dump({
+                'tracks': {'total': self.total_tracks, **self.flag_counts},
+                'history': {'updates': self.updates, 'latest_update': self.latest_update,
+                            'checkpoint': self.history_checkpoint},
+            }, f, indent=4)
+        os.replace(temp_file, self.stats_file)
@@ -0,0 +1,198 @@
+import asyncio
+import logging
+import os
+import random
+import time
+from collections import deque
+from typing import NamedTuple
+
+import discord
+
+MAX_EMBEDS_PER_MESSAGE = 10
+MAX_EMBED_CHARS_PER_MESSAGE = 6000
+MAX_FILES_PER_MESSAGE = 10
+MAX_FILE_BYTES_PER_MESSAGE = 8 * 1024 * 1024
+
+
+class OutboundItem(NamedTuple):
+    embed: discord.Embed
+    files: tuple = ()  # (path, filename) pairs, opened fresh for every send attempt
+
+
+def pack_items(items: list[OutboundItem]) -> list[list[OutboundItem]]:
+    """Groups items, in order, into batches that fit into a single Discord message."""
+    batches, current, chars, files, file_bytes = [], [], 0, 0, 0
+    for item in items:
+        item_chars = len(item.embed)
+        item_bytes = sum(os.path.getsize(path) for path, _ in item.files if os.path.exists(path))
+        if current and (len(current) >= MAX_EMBEDS_PER_MESSAGE
+                        or chars + item_chars > MAX_EMBED_CHARS_PER_MESSAGE
+                        or files + len(item.files) > MAX_FILES_PER_MESSAGE
+                        or file_bytes + item_bytes > MAX_FILE_BYTES_PER_MESSAGE):
+            batches.append(current)
+            current, chars, files, file_bytes = [], 0, 0, 0
+        current.append(item)
+        chars += item_chars
+        files += len(item.files)
+        file_bytes += item_bytes
+    if current:
+        batches.append(current)
+    return batches
+
+
+class TokenBucket:
+    def __init__(self, capacity: int, period: float) -> None:
+        self.capacity = capacity
+        self.rate = capacity / period
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    async def acquire(self):
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if now < self.blocked_until:
+                await asyncio.sleep(self.blocked_until - now)
+            elif self.tokens >= 1:
+                self.tokens -= 1
+                return
+            else:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def block_for(self, seconds: float):
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+
+class Broadcast:
+    """Tracks one set of items sent to many channels; runs `on_complete` once every send has finished."""
+
+    def __init__(self, pending: int, on_complete=None) -> None:
+        self.pending = pending
+        self.delivered = 0
+        self.failed = 0
+        self.on_complete = on_complete
+        if pending == 0:
+            self._complete()
+
+    def _finish_one(self, ok: bool):
+        self.pending -= 1
+        if ok:
+            self.delivered += 1
+        else:
+            self.failed += 1
+        if self.pending == 0:
+            self._complete()
+
+    def _complete(self):
+        if self.on_complete:
+            try:
+                self.on_complete()
+            except Exception as e:
+                logging.error(f"Broadcast completion callback failed: {e}")
+
+
+class BroadcastQueue:
+    """Outbound queue for update log messages.
+
+    Items are packed into as few messages as Discord allows, each channel gets its own
+    worker so channels are served concurrently while message order within a channel is
+    kept, and every send draws from a per-channel and a global token bucket. Failed
+    sends are retried with backoff in the background.
+    """
+
+    def __init__(self, client: discord.Client, route_capacity: int = 5, route_period: float = 5.0,
+                 global_capacity: int = 40, global_period: float = 1.0, max_attempts: int = 5) -> None:
+        self.client = client
+        self.route_capacity = route_capacity
+        self.route_period = route_period
+        self.global_bucket = TokenBucket(global_capacity, global_period)
+        self.max_attempts = max_attempts
+        self.sent = 0
+        self.retried = 0
+        self.dropped = 0
+        self._routes = {}
+        self._queues = {}
+        self._workers = {}
+
+    def broadcast(self, channel_ids: list, items: list[OutboundItem], on_complete=None) -> Broadcast:
+        batches = pack_items(items)
+        tracker = Broadcast(len(batches) * len(channel_ids), on_complete)
+        for channel_id in channel_ids:
+            queue = self._queues.setdefault(channel_id, deque())
+            queue.extend((batch, tracker) for batch in batches)
+            if channel_id not in self._workers:
+                self._workers[channel_id] = asyncio.create_task(self._channel_worker(channel_id))
+        return tracker
+
+    def _route(self, channel_id) -> TokenBucket:
+        if (bucket := self._routes.get(channel_id)) is None:
+            bucket = self._routes[channel_id] = TokenBucket(self.route_capacity, self.route_period)
+        return bucket
+
+    async def _channel_worker(self, channel_id):
+        queue = self._queues[channel_id]
+        try:
+            while queue:
+                batch, tracker = queue.popleft()
+                ok = False
+                try:
+                    ok = await self._send(channel_id, batch)
+                except Exception as e:
+                    logging.error(f"Unexpected error sending to channel {channel_id}: {e}")
+                finally:
+                    tracker._finish_one(ok)
+        finally:
+            self._workers.pop(channel_id, None)
+            self._queues.pop(channel_id, None)
+
+    async def _send(self, channel_id, batch: list[OutboundItem]) -> bool:
+        if not (channel := self.client.get_channel(int(channel_id))):
+            logging.warning(f"Dropping update log message: channel {channel_id} not found.")
+            self.dropped += 1
+            return False
+
+        route = self._route(channel_id)
+        for attempt in range(1, self.max_attempts + 1):
+            await route.acquire()
+            await self.global_bucket.acquire()
+            try:
+                files = [discord.File(path, filename=filename) for item in batch for path, filename in item.files]
+                await channel.send(embeds=[item.embed for item in batch], files=files)
+                self.sent += 1
+                return True
+            except discord.RateLimited as e:
+                delay = e.retry_after
+                route.block_for(delay)
+            except discord.HTTPException as e:
+                if e.status < 500 and e.status != 429:
+                    logging.error(f"Update log send to channel {channel_id} rejected ({e.status}): {e.text}")
+                    self.dropped += 1
+                    return False
+                delay = min(60, 2 ** attempt) + random.uniform(0, 1)
+            except FileNotFoundError as e:
+                logging.error(f"Update log attachment missing for channel {channel_id}: {e}")
+                self.dropped += 1
+                return False
+            except (OSError, asyncio.TimeoutError) as e:
+                logging.warning(f"Update log send to channel {channel_id} failed: {e}")
+                delay = min(60, 2 ** attempt) + random.uniform(0, 1)
+
+            if attempt < self.max_attempts:
+                self.retried += 1
+                logging.info(f"Retrying update log send to channel {channel_id} in {delay:.1f}s (attempt {attempt + 1}).")
+                await asyncio.sleep(delay)
+
+        logging.error(f"Giving up on update log send to channel {channel_id} after {self.max_attempts} attempts.")
+        self.dropped += 1
+        return False
+
+    def stats(self) -> dict:
+        return {
+            'sent': self.sent,
+            'retried': self.retried,
+            'dropped': self.dropped,
+            'queued': sum(len(queue) for queue in self._queues.values()),
+            'channels': len(self._workers),
+        }
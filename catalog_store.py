@@ -0,0 +1,69 @@
+import hashlib
+import json
+import logging
+import os
+
+from track_record import Track
+
+
+def track_fingerprint(track) -> str:
+    if type(track) is Track:
+        track = track.to_dict()
+    return hashlib.sha1(json.dumps(track, sort_keys=True, separators=(',', ':')).encode()).hexdigest()
+
+
+class CatalogStore:
+    """In-memory copy of the track catalog, persisted to the track cache file.
+
+    Readers get the current `tracks` list without touching disk. `swap` replaces the
+    catalog in one step and tells subscribers which track ids changed. Tracks are
+    held as compact `Track` records; dicts passed to `swap` are converted there.
+    """
+
+    def __init__(self, cache_file: str) -> None:
+        self.cache_file = cache_file
+        self.tracks = []
+        self.by_id = {}
+        self.fingerprints = {}
+        self._listeners = []
+
+    def load(self):
+        try:
+            with open(self.cache_file, 'r') as f:
+                tracks = json.load(f).get('tracks', [])
+        except (FileNotFoundError, json.JSONDecodeError):
+            tracks = []
+        self.swap(tracks, persist=False)
+        logging.info(f"Loaded {len(tracks)} tracks from {self.cache_file}.")
+
+    def subscribe(self, listener):
+        self._listeners.append(listener)
+
+    def fingerprint_of(self, track: dict) -> str:
+        if self.by_id.get(track.get('id')) is track:
+            return self.fingerprints[track['id']]
+        return track_fingerprint(track)
+
+    def swap(self, tracks: list, fingerprints: dict = None, persist: bool = True) -> set:
+        """Replaces the catalog and returns the ids that were added, removed or modified."""
+        tracks = [Track.coerce(t) for t in tracks]
+        fingerprints = fingerprints or {t.id: track_fingerprint(t) for t in tracks}
+        old_fingerprints = self.fingerprints
+        changed_ids = {t_id for t_id in fingerprints.keys() | old_fingerprints.keys()
+                       if fingerprints.get(t_id) != old_fingerprints.get(t_id)}
+
+        self.tracks = tracks
+        self.by_id = {t.id: t for t in tracks}
+        self.fingerprints = fingerprints
+        if persist:
+            temp_file = f"{self.cache_file}.tmp"
+            with open(temp_file, 'w') as f:
+                json.dump({"tracks": [t.to_dict() for t in tracks]}, f, indent=4)
+            os.replace(temp_file, self.cache_file)
+
+        for listener in self._listeners:
+            try:
+                listener(changed_ids)
+            except Exception as e:
+                logging.error(f"Catalog listener failed: {e}")
+        return changed_ids
@@ -0,0 +1,130 @@
+import json
+import logging
+import os
+
+# Bump when the computed fields change so existing index entries are recomputed.
+ANALYTICS_VERSION = 1
+SUSTAIN_MIN_BEATS = 0.25
+PEAK_WINDOW_SECONDS = 1.0
+DEFAULT_TEMPO = 500000
+
+
+def _tempo_map(midi, np):
+    """Returns (start ticks, start seconds, seconds per tick) for each tempo segment of the chart."""
+    changes = {0: DEFAULT_TEMPO}
+    for track in midi.tracks:
+        tick = 0
+        for msg in track:
+            tick += msg.time
+            if msg.type == 'set_tempo':
+                changes[tick] = msg.tempo
+    ticks = np.array(sorted(changes), dtype=np.int64)
+    seconds_per_tick = np.array([changes[t] for t in ticks], dtype=np.float64) / 1e6 / midi.ticks_per_beat
+    seconds = np.concatenate(([0.0], np.cumsum(np.diff(ticks) * seconds_per_tick[:-1])))
+    return ticks, seconds, seconds_per_tick
+
+
+def _ticks_to_seconds(ticks, tempo_map, np):
+    tempo_ticks, tempo_seconds, seconds_per_tick = tempo_map
+    segment = np.searchsorted(tempo_ticks, ticks, side='right') - 1
+    return tempo_seconds[segment] + (ticks - tempo_ticks[segment]) * seconds_per_tick[segment]
+
+
+def _notes(track, np):
+    """Returns (start ticks, end ticks, pitches) for every note in a track, paired with their note-offs."""
+    ticks, pitches, is_on = [], [], []
+    tick = 0
+    for msg in track:
+        tick += msg.time
+        if msg.type == 'note_on' or msg.type == 'note_off':
+            ticks.append(tick)
+            pitches.append(msg.note)
+            is_on.append(msg.type == 'note_on' and msg.velocity > 0)
+    ticks, pitches, is_on = np.array(ticks, dtype=np.int64), np.array(pitches, dtype=np.int16), np.array(is_on, dtype=bool)
+
+    # Per pitch in time order, with a note-off sorting before a note-on on the same tick,
+    # each note-on is closed by the event right after it when that is a note-off.
+    order = np.lexsort((is_on, ticks, pitches))
+    ticks, pitches, is_on = ticks[order], pitches[order], is_on[order]
+    closed = np.zeros(len(ticks), dtype=bool)
+    closed[:-1] = (pitches[1:] == pitches[:-1]) & ~is_on[1:]
+    ends = np.where(closed, np.roll(ticks, -1), ticks)
+    return ticks[is_on], ends[is_on], pitches[is_on]
+
+
+def analyze_chart(path: str, lanes: dict) -> dict:
+    """Computes note statistics for a chart file.
+
+    `lanes` maps each MIDI track name to `{difficulty: (low pitch, high pitch)}`. The
+    result has the same shape, with notes, average and peak notes per second (over a
+    sliding `PEAK_WINDOW_SECONDS` window) and the share of notes held for at least
+    `SUSTAIN_MIN_BEATS` for every difficulty of every track present in the chart.
+    """
+    import mido
+    import numpy as np
+
+    midi = mido.MidiFile(path)
+    tempo_map = _tempo_map(midi, np)
+    sustain_ticks = midi.ticks_per_beat * SUSTAIN_MIN_BEATS
+    results = {}
+    for track in midi.tracks:
+        if track.name not in lanes or track.name in results:
+            continue
+        starts, ends, pitches = _notes(track, np)
+        start_seconds = _ticks_to_seconds(starts, tempo_map, np)
+        stats = results[track.name] = {}
+        for difficulty, (low, high) in lanes[track.name].items():
+            in_lanes = (pitches >= low) & (pitches <= high)
+            times = np.sort(start_seconds[in_lanes])
+            notes = len(times)
+            span = float(times[-1] - times[0]) if notes > 1 else 0.0
+            window_counts = np.searchsorted(times, times + PEAK_WINDOW_SECONDS, side='left') - np.arange(notes)
+            stats[difficulty] = {
+                'notes': notes,
+                'avg_nps': round(notes / span, 3) if span else 0.0,
+                'peak_nps': round(float(window_counts.max()) / PEAK_WINDOW_SECONDS, 3) if notes else 0.0,
+                'sustain_ratio': round(float(np.mean(ends[in_lanes] - starts[in_lanes] >= sustain_ticks)), 4) if notes else 0.0,
+            }
+    return results
+
+
+class ChartAnalyticsIndex:
+    """Chart statistics keyed by the chart's SHA-256, persisted to `index_file`.
+
+    Entries are only ever computed for a hash that is not in the index yet, so a chart
+    is analyzed once no matter how many track versions share its bytes.
+    """
+
+    def __init__(self, index_file: str) -> None:
+        self.index_file = index_file
+        self.charts = {}
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.index_file, 'r') as f:
+                data = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            data = {}
+        if data.get('version') != ANALYTICS_VERSION:
+            data = {}
+        self.charts = data.get('charts', {})
+        logging.info(f"Loaded chart analytics for {len(self.charts)} charts from {self.index_file}.")
+
+    def get(self, sha256: str) -> dict | None:
+        return self.charts.get(sha256)
+
+    def put(self, sha256: str, stats: dict):
+        self.charts[sha256] = stats
+
+    def prune(self, keep: set) -> int:
+        stale = self.charts.keys() - keep
+        for sha256 in stale:
+            del self.charts[sha256]
+        return len(stale)
+
+    def save(self):
+        temp_file = f"{self.index_file}.tmp"
+        with open(temp_file, 'w') as f:
+            json.dump({'version': ANALYTICS_VERSION, 'charts': self.charts}, f)
+        os.replace(temp_file, self.index_file)
@@ -0,0 +1,147 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from typing import NamedTuple
+
+FLUSH_INTERVAL = 60.0
+
+
+class StoredChart(NamedTuple):
+    path: str
+    sha256: str
+
+
+class ChartStore:
+    """Content-addressed store for downloaded charts.
+
+    The manifest maps versioned chart names (`song-v3.mid`) to the SHA-256 of their
+    bytes, and the bytes live once under `objects/<sha256>.mid`, so identical
+    versions share one file. The store is kept under `max_bytes` by evicting the
+    least recently used names, except for pinned (current) versions.
+    """
+
+    def __init__(self, folder: str, max_bytes: int = 1024 * 1024 * 1024, on_blob_removed=None) -> None:
+        self.folder = folder
+        self.objects_folder = os.path.join(folder, "objects")
+        self.manifest_file = os.path.join(folder, "manifest.json")
+        self.max_bytes = max_bytes
+        self.on_blob_removed = on_blob_removed
+        self.entries = {}
+        self.pinned = set()
+        self._lock = threading.RLock()
+        self._last_flush = time.time()
+        self._dirty = False
+        os.makedirs(self.objects_folder, exist_ok=True)
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.manifest_file, 'r') as f:
+                self.entries = json.load(f).get('charts', {})
+        except FileNotFoundError:
+            self._import_loose_files()
+        except json.JSONDecodeError:
+            logging.error(f"Chart manifest {self.manifest_file} is corrupt, rebuilding it.")
+            self._import_loose_files()
+
+    def _import_loose_files(self):
+        for file_name in os.listdir(self.folder):
+            file_path = os.path.join(self.folder, file_name)
+            if not file_name.endswith('.mid') or not os.path.isfile(file_path): continue
+            with open(file_path, 'rb') as f:
+                self.put(file_name, f.read(), save=False)
+            os.remove(file_path)
+        logging.info(f"Imported {len(self.entries)} charts into {self.manifest_file}.")
+        self._save()
+
+    def _save(self):
+        temp_file = f"{self.manifest_file}.tmp"
+        with open(temp_file, 'w') as f:
+            json.dump({'charts': self.entries}, f)
+        os.replace(temp_file, self.manifest_file)
+        self._dirty = False
+        self._last_flush = time.time()
+
+    def object_path(self, sha256: str) -> str:
+        return os.path.join(self.objects_folder, f"{sha256}.mid")
+
+    def lookup(self, name: str) -> dict | None:
+        return self.entries.get(name)
+
+    def path_for(self, name: str) -> StoredChart | None:
+        """Returns the stored file and hash for `name`, or None when it has to be downloaded.
+
+        Another shard process sharing the folder may have evicted the blob, so a name
+        whose object file is gone is dropped from this manifest instead of returned.
+        Callers should use the returned hash rather than a later `lookup`, which can
+        race with evictions.
+        """
+        with self._lock:
+            if (entry := self.entries.get(name)) is None:
+                return None
+            if not os.path.exists(object_path := self.object_path(entry['sha256'])):
+                logging.info(f"Chart '{name}' was removed from the shared store, dropping it from the manifest.")
+                del self.entries[name]
+                self._dirty = True
+                return None
+            entry['last_access'] = time.time()
+            self._dirty = True
+            if time.time() - self._last_flush > FLUSH_INTERVAL:
+                self._save()
+            return StoredChart(object_path, entry['sha256'])
+
+    def put(self, name: str, data: bytes, save: bool = True) -> StoredChart:
+        sha256 = hashlib.sha256(data).hexdigest()
+        object_path = self.object_path(sha256)
+        with self._lock:
+            if not os.path.exists(object_path):
+                temp_file = f"{object_path}.{threading.get_ident()}.tmp"
+                with open(temp_file, 'wb') as f:
+                    f.write(data)
+                os.replace(temp_file, object_path)
+            previous = self.entries.get(name)
+            self.entries[name] = {'sha256': sha256, 'size': len(data), 'last_access': time.time()}
+            if previous and previous['sha256'] != sha256:
+                self._remove_blob_if_unused(previous['sha256'])
+            if save:
+                self._evict()
+                self._save()
+        return StoredChart(object_path, sha256)
+
+    def pin(self, names):
+        with self._lock:
+            self.pinned = set(names)
+
+    def total_bytes(self) -> int:
+        return sum({entry['sha256']: entry['size'] for entry in self.entries.values()}.values())
+
+    def _evict(self):
+        total = self.total_bytes()
+        if total <= self.max_bytes: return
+        pinned_blobs = {self.entries[name]['sha256'] for name in self.pinned if name in self.entries}
+        candidates = sorted((entry['last_access'], name) for name, entry in self.entries.items()
+                            if name not in self.pinned and entry['sha256'] not in pinned_blobs)
+        for _, name in candidates:
+            if total <= self.max_bytes: break
+            entry = self.entries.pop(name)
+            if self._remove_blob_if_unused(entry['sha256']):
+                total -= entry['size']
+            logging.info(f"Evicted chart '{name}' from the chart store.")
+
+    def _remove_blob_if_unused(self, sha256: str) -> bool:
+        if any(entry['sha256'] == sha256 for entry in self.entries.values()):
+            return False
+        try:
+            os.remove(self.object_path(sha256))
+        except FileNotFoundError:
+            pass
+        if self.on_blob_removed:
+            self.on_blob_removed(sha256)
+        return True
+
+    def stats(self) -> dict:
+        return {'charts': len(self.entries), 'objects': len({e['sha256'] for e in self.entries.values()}),
+                'bytes': self.total_bytes(), 'pinned': len(self.pinned)}
@@ -0,0 +1,227 @@
+import asyncio
+import logging
+import os
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 1
+
+
+class ChoptQueueFull(Exception):
+    pass
+
+
+class ChoptTimeout(Exception):
+    pass
+
+
+class _Preempted(Exception):
+    pass
+
+
+class ChoptJob:
+    def __init__(self, command: list, user_id, timeout: float, on_position=None, priority: int = PRIORITY_INTERACTIVE) -> None:
+        self.command = command
+        self.user_id = user_id
+        self.timeout = timeout
+        self.on_position = on_position
+        self.priority = priority
+        self.reserved = False
+        self.last_position = None
+        self.process = None
+        self.preempted = False
+        self.future = asyncio.get_running_loop().create_future()
+
+
+class ChoptPool:
+    """Runs CHOpt as asyncio subprocesses on a fixed number of workers.
+
+    Waiting jobs are kept per user and dispatched round-robin across users, so one
+    user queueing several renders can't starve everyone else. Background jobs only
+    start on idle workers and are killed and requeued when an interactive job would
+    otherwise have to wait for them.
+
+    `max_queue` bounds admissions rather than raw jobs: a `reserve()`d batch counts as
+    one admission however many of its jobs are waiting.
+    """
+
+    def __init__(self, workers: int = None, max_queue: int = 50, timeout: float = 120.0) -> None:
+        self.workers = max(1, workers or os.cpu_count() or 1)
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self._pending = OrderedDict()
+        self._background = deque()
+        self._running_background = []
+        self._queued = 0
+        self._admitted = 0
+        self._running = 0
+        self._available = None
+        self._worker_tasks = []
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queued
+
+    @property
+    def background_depth(self) -> int:
+        return len(self._background)
+
+    @property
+    def running(self) -> int:
+        return self._running
+
+    def _ensure_workers(self):
+        if self._worker_tasks and not all(t.done() for t in self._worker_tasks):
+            return
+        self._available = asyncio.Semaphore(0)
+        for _ in range(self._queued + len(self._background)):
+            self._available.release()
+        self._worker_tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+
+    @contextmanager
+    def reserve(self):
+        """Holds one queue admission for a batch of jobs, or raises ChoptQueueFull up front.
+
+        Jobs run with `reserved=True` inside the block are never rejected; callers bound
+        how many of them they have waiting at once.
+        """
+        if self._admitted >= self.max_queue:
+            raise ChoptQueueFull(f"CHOpt queue is full ({self.max_queue} jobs waiting).")
+        self._admitted += 1
+        try:
+            yield
+        finally:
+            self._admitted -= 1
+
+    async def run(self, command: list, user_id=None, timeout: float = None, on_position=None, priority: int = PRIORITY_INTERACTIVE, reserved: bool = False) -> tuple[int, str, str]:
+        """Queues `command` and returns (returncode, stdout, stderr) once it has run.
+
+        `on_position` is an optional coroutine function called with the job's 1-based
+        place in the queue whenever it changes while the job is waiting. `reserved` jobs
+        belong to a batch holding a `reserve()` admission.
+        """
+        self._ensure_workers()
+        job = ChoptJob(command, user_id, timeout or self.timeout, on_position, priority)
+        if priority == PRIORITY_BACKGROUND:
+            self._background.append(job)
+        else:
+            if not reserved:
+                if self._admitted >= self.max_queue:
+                    raise ChoptQueueFull(f"CHOpt queue is full ({self.max_queue} jobs waiting).")
+                self._admitted += 1
+            job.reserved = reserved
+            self._pending.setdefault(user_id, deque()).append(job)
+            self._queued += 1
+            self._notify_positions()
+            self._preempt_background()
+        self._available.release()
+        return await job.future
+
+    def _preempt_background(self):
+        if self._running < self.workers or not self._running_background: return
+        job = self._running_background.pop()
+        job.preempted = True
+        if job.process and job.process.returncode is None:
+            job.process.kill()
+
+    def _next_job(self) -> ChoptJob | None:
+        job = self._next_interactive_job()
+        if job is not None:
+            return job
+        while self._background:
+            job = self._background.popleft()
+            if not job.future.done():
+                return job
+        return None
+
+    def _next_interactive_job(self) -> ChoptJob | None:
+        while self._pending:
+            user_id, jobs = self._pending.popitem(last=False)
+            job = jobs.popleft()
+            if jobs:
+                self._pending[user_id] = jobs
+            self._queued -= 1
+            if not job.reserved:
+                self._admitted -= 1
+            if not job.future.done():
+                return job
+        return None
+
+    def position_of(self, job: ChoptJob) -> int | None:
+        users = list(self._pending.items())
+        for rank, (user_id, jobs) in enumerate(users):
+            if user_id != job.user_id: continue
+            try:
+                index = jobs.index(job)
+            except ValueError:
+                return None
+            ahead = sum(min(len(other), index + 1 if other_rank < rank else index)
+                        for other_rank, (_, other) in enumerate(users) if other_rank != rank)
+            return ahead + index + 1
+        return None
+
+    def _notify_positions(self):
+        # Jobs within reach of an idle worker (or one running preemptible background work)
+        # are about to start, so only the jobs behind them are told their place.
+        free_workers = self.workers - self._running + len(self._running_background)
+        for jobs in self._pending.values():
+            for job in jobs:
+                if not job.on_position or job.future.done(): continue
+                position = self.position_of(job)
+                if position is not None:
+                    position -= free_workers
+                if position is not None and position > 0 and position != job.last_position:
+                    job.last_position = position
+                    asyncio.create_task(self._report_position(job, position))
+
+    async def _report_position(self, job: ChoptJob, position: int):
+        try:
+            await job.on_position(position)
+        except Exception as e:
+            logging.warning(f"Failed to report CHOpt queue position: {e}")
+
+    async def _worker(self, worker_id: int):
+        while True:
+            await self._available.acquire()
+            job = self._next_job()
+            if job is None: continue
+
+            self._running += 1
+            if job.priority == PRIORITY_BACKGROUND:
+                self._running_background.append(job)
+            self._notify_positions()
+            try:
+                result = await self._execute(job)
+                if not job.future.done(): job.future.set_result(result)
+            except _Preempted:
+                logging.info("Requeued background CHOpt job to make room for an interactive request.")
+                job.preempted = False
+                self._background.appendleft(job)
+                self._available.release()
+            except Exception as e:
+                if not job.future.done(): job.future.set_exception(e)
+            finally:
+                self._running -= 1
+                if job in self._running_background:
+                    self._running_background.remove(job)
+
+    async def _execute(self, job: ChoptJob) -> tuple[int, str, str]:
+        process = job.process = await asyncio.create_subprocess_exec(
+            *job.command, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
+        if job.preempted:
+            process.kill()
+        try:
+            stdout, stderr = await asyncio.wait_for(process.communicate(), timeout=job.timeout)
+        except asyncio.TimeoutError:
+            process.kill()
+            await process.wait()
+            logging.warning(f"Killed CHOpt after {job.timeout}s: {' '.join(job.command)}")
+            raise ChoptTimeout(f"CHOpt did not finish within {job.timeout:.0f} seconds.")
+        except asyncio.CancelledError:
+            process.kill()
+            await process.wait()
+            raise
+        if job.preempted:
+            raise _Preempted()
+        return process.returncode, stdout.decode(errors='replace'), stderr.decode(errors='replace')
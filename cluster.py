@@ -0,0 +1,424 @@
+"""
+Coordination for running the bot as several shard processes on one machine.
+
+All processes share the working directory (catalog, history and caches) and a
+SQLite database that holds a lease table for leader election and an append-only
+event table used as a bus. Exactly one process holds the update-poller lease at a
+time; it publishes what it found and the others replay it for their own guilds.
+
+`python cluster.py simulate` runs the election and bus across real processes with a
+fake gateway instead of Discord. Each process imports bot.py with its own shard
+range, and the gateway routes /trackinfo, /tracksort and /bot-info to the process
+that owns the guild's shard, where the real command callbacks answer a fake
+Interaction. The leader stands in for the update poller by editing a marker track
+through the real catalog, so the report shows whether every shard answers the
+same way and how far behind the leader the followers' catalogs run.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import random
+import re
+import sqlite3
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from typing import NamedTuple
+
+UPDATE_POLLER_LEASE = "update-poller"
+
+
+class ClusterEvent(NamedTuple):
+    id: int
+    kind: str
+    payload: dict
+    origin: str
+
+
+class ClusterStore:
+    """Lease table and event log in a SQLite file shared by every shard process."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS leases (name TEXT PRIMARY KEY, holder TEXT NOT NULL, expires REAL NOT NULL)")
+            conn.execute("CREATE TABLE IF NOT EXISTS events (id INTEGER PRIMARY KEY AUTOINCREMENT, kind TEXT NOT NULL, "
+                         "payload TEXT NOT NULL, origin TEXT NOT NULL, created REAL NOT NULL)")
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def acquire_lease(self, name: str, holder: str, ttl: float) -> bool:
+        """Takes or renews the lease if it is free, expired or already ours. Returns whether we hold it."""
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT holder, expires FROM leases WHERE name = ?", (name,)).fetchone()
+            if row is not None and row[0] != holder and row[1] > now:
+                conn.execute("COMMIT")
+                return False
+            conn.execute("INSERT INTO leases (name, holder, expires) VALUES (?, ?, ?) "
+                         "ON CONFLICT(name) DO UPDATE SET holder = excluded.holder, expires = excluded.expires",
+                         (name, holder, now + ttl))
+            conn.execute("COMMIT")
+            return True
+
+    def release_lease(self, name: str, holder: str):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM leases WHERE name = ? AND holder = ?", (name, holder))
+
+    def lease_holder(self, name: str) -> str | None:
+        with self._connect() as conn:
+            row = conn.execute("SELECT holder FROM leases WHERE name = ? AND expires > ?", (name, time.time())).fetchone()
+        return row[0] if row else None
+
+    def publish(self, kind: str, payload: dict, origin: str) -> int:
+        with self._connect() as conn:
+            cursor = conn.execute("INSERT INTO events (kind, payload, origin, created) VALUES (?, ?, ?, ?)",
+                                  (kind, json.dumps(payload), origin, time.time()))
+            return cursor.lastrowid
+
+    def events_after(self, last_id: int, limit: int = 100) -> list[ClusterEvent]:
+        with self._connect() as conn:
+            rows = conn.execute("SELECT id, kind, payload, origin FROM events WHERE id > ? ORDER BY id LIMIT ?", (last_id, limit)).fetchall()
+        return [ClusterEvent(row[0], row[1], json.loads(row[2]), row[3]) for row in rows]
+
+    def last_event_id(self) -> int:
+        with self._connect() as conn:
+            return conn.execute("SELECT COALESCE(MAX(id), 0) FROM events").fetchone()[0]
+
+    def prune_events(self, max_age: float) -> int:
+        with self._connect() as conn:
+            return conn.execute("DELETE FROM events WHERE created < ?", (time.time() - max_age,)).rowcount
+
+
+class ClusterCoordinator:
+    """Keeps this process's lease renewed and delivers bus events from other processes.
+
+    `on_leadership(is_leader)` is awaited whenever this process gains or loses the
+    update-poller lease; handlers registered with `on(kind, handler)` are awaited with
+    each event payload published by another process.
+    """
+
+    def __init__(self, store: ClusterStore, node_id: str, lease_ttl: float = 30.0, tick: float = 2.0,
+                 on_leadership=None, event_max_age: float = 3600.0) -> None:
+        self.store = store
+        self.node_id = node_id
+        self.lease_ttl = lease_ttl
+        self.tick = tick
+        self.on_leadership = on_leadership
+        self.event_max_age = event_max_age
+        self.is_leader = False
+        self.handlers = {}
+        self._last_event_id = None
+        self._last_renewal = 0.0
+        self._task = None
+
+    def on(self, kind: str, handler):
+        self.handlers[kind] = handler
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+        if self.is_leader:
+            self.is_leader = False
+            await asyncio.to_thread(self.store.release_lease, UPDATE_POLLER_LEASE, self.node_id)
+
+    async def publish(self, kind: str, payload: dict) -> int:
+        return await asyncio.to_thread(self.store.publish, kind, payload, self.node_id)
+
+    async def _set_leader(self, is_leader: bool):
+        if is_leader == self.is_leader:
+            return
+        self.is_leader = is_leader
+        logging.info(f"Cluster node {self.node_id} {'acquired' if is_leader else 'lost'} the update poller lease.")
+        if self.on_leadership:
+            await self.on_leadership(is_leader)
+
+    async def _run(self):
+        if self._last_event_id is None:
+            self._last_event_id = await asyncio.to_thread(self.store.last_event_id)
+        while True:
+            try:
+                if time.monotonic() - self._last_renewal >= self.lease_ttl / 3:
+                    held = await asyncio.to_thread(self.store.acquire_lease, UPDATE_POLLER_LEASE, self.node_id, self.lease_ttl)
+                    self._last_renewal = time.monotonic()
+                    if held and not self.is_leader:
+                        await asyncio.to_thread(self.store.prune_events, self.event_max_age)
+                    await self._set_leader(held)
+
+                for event in await asyncio.to_thread(self.store.events_after, self._last_event_id):
+                    self._last_event_id = event.id
+                    if event.origin == self.node_id or (handler := self.handlers.get(event.kind)) is None:
+                        continue
+                    try:
+                        await handler(event.payload)
+                    except Exception as e:
+                        logging.error(f"Cluster event handler for {event.kind} failed: {e}")
+            except sqlite3.Error as e:
+                logging.error(f"Cluster store unavailable: {e}")
+                if time.monotonic() - self._last_renewal >= self.lease_ttl:
+                    await self._set_leader(False)
+            await asyncio.sleep(self.tick)
+
+
+def shard_for_guild(guild_id: int, shard_count: int) -> int:
+    """Discord's routing rule for which shard receives a guild's events."""
+    return (guild_id >> 22) % shard_count
+
+
+# --- Local simulation with a fake gateway ---
+
+SIMULATED_COMMANDS = (
+    ('trackinfo', {'track_name': 'Sim Marker'}),
+    ('tracksort', {'sort_by': 'fastest'}),
+    ('bot-info', {}),
+)
+MARKER_TRACK_ID = 'simmarker'
+MARKER_PATTERN = re.compile(r'Sim Marker (\d+)')
+# Fields that legitimately differ per process (poll timing only runs on the leader, caches are local).
+PROCESS_LOCAL_FIELDS = ('🗂️ Path Cache', '⏱️ Update Polling')
+
+
+class _FakeMessage:
+    async def edit(self, **kwargs):
+        pass
+
+
+class _FakeResponse:
+    def __init__(self, interaction: 'FakeInteraction') -> None:
+        self._interaction = interaction
+        self._done = False
+
+    def is_done(self) -> bool:
+        return self._done
+
+    async def defer(self, **kwargs):
+        self._done = True
+
+    async def send_message(self, content=None, **kwargs):
+        self._done = True
+        self._interaction.record(content, **kwargs)
+
+
+class _FakeFollowup:
+    def __init__(self, interaction: 'FakeInteraction') -> None:
+        self._interaction = interaction
+
+    async def send(self, content=None, **kwargs):
+        self._interaction.record(content, **kwargs)
+        return _FakeMessage()
+
+
+class FakeInteraction:
+    """The parts of discord.Interaction the simulated commands use; replies are recorded instead of sent."""
+
+    def __init__(self, guild_id: int, user_id: int) -> None:
+        self.guild_id = guild_id
+        self.guild = SimpleNamespace(id=guild_id)
+        self.user = SimpleNamespace(id=user_id)
+        self.channel = None
+        self.created_at = datetime.now(timezone.utc)
+        self.response = _FakeResponse(self)
+        self.followup = _FakeFollowup(self)
+        self.replies = []
+
+    def record(self, content=None, embed=None, view=None, **kwargs):
+        options = [option.label for item in getattr(view, 'children', []) for option in getattr(item, 'options', [])]
+        self.replies.append({'content': content, 'embed': embed.to_dict() if embed else None, 'options': options})
+
+    async def edit_original_response(self, content=None, embed=None, view=None, **kwargs):
+        self.record(content, embed, view)
+
+
+def _summarize_answer(command: str, replies: list) -> dict:
+    """Reduces a command's replies to what must match across shards (or, for /trackinfo, the marker version seen)."""
+    failed = not replies or any('error occurred' in (reply['content'] or '') for reply in replies)
+    if command == 'trackinfo':
+        versions = [int(match.group(1)) for reply in replies if (match := MARKER_PATTERN.search(json.dumps(reply['embed'])))]
+        return {'failed': failed or not versions, 'marker_version': versions[0] if versions else None}
+    for reply in replies:
+        if reply['embed']:
+            reply['embed'] = {'title': reply['embed'].get('title'),
+                              'fields': [field for field in reply['embed'].get('fields', []) if field['name'] not in PROCESS_LOCAL_FIELDS]}
+    return {'failed': failed, 'signature': json.dumps(replies, sort_keys=True)}
+
+
+def _simulated_node(workdir: str, database: str, shard_ids: list, shard_count: int, inbox, outbox, lease_ttl: float):
+    logging.basicConfig(level=logging.WARNING, format=f'%(asctime)s shards{shard_ids} %(message)s', datefmt='%H:%M:%S')
+    os.chdir(workdir)
+    os.environ['ENCORE_SHARD_IDS'] = ','.join(str(shard) for shard in shard_ids)
+    os.environ['ENCORE_SHARD_COUNT'] = str(shard_count)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import bot
+
+    node_id = f"sim-{os.getpid()}"
+
+    async def main():
+        async def change_presence(**kwargs):
+            pass
+        # The fake gateway has no connection for presence updates.
+        bot.client.change_presence = change_presence
+
+        async def poll_as_leader():
+            # Stands in for check_for_updates: edits the marker track through the real catalog and announces it.
+            while coordinator.is_leader:
+                tracks = [track.to_dict() for track in bot.catalog.tracks]
+                marker = next(track for track in tracks if track['id'] == MARKER_TRACK_ID)
+                version = int(MARKER_PATTERN.search(marker['title']).group(1)) + 1
+                marker['title'] = f"Sim Marker {version}"
+                bot.catalog.swap(tracks)
+                await coordinator.publish('catalog_updated', {})
+                outbox.put(('published', node_id, shard_ids, version))
+                await asyncio.sleep(1.5)
+
+        async def on_leadership(is_leader: bool):
+            outbox.put(('leader' if is_leader else 'follower', node_id, shard_ids, None))
+            if is_leader:
+                bot.catalog.load()
+                asyncio.create_task(poll_as_leader())
+
+        coordinator = ClusterCoordinator(ClusterStore(database), node_id, lease_ttl=lease_ttl, tick=0.25, on_leadership=on_leadership)
+        coordinator.on('catalog_updated', bot.on_catalog_updated)
+        bot.cluster = coordinator
+        coordinator.start()
+        outbox.put(('ready', node_id, shard_ids, None))
+        while True:
+            request = await asyncio.to_thread(inbox.get)
+            if request is None:
+                break
+            guild_id, command, arguments = request
+            interaction = FakeInteraction(guild_id, user_id=guild_id & 0xFFFF)
+            await bot.tree.get_command(command).callback(interaction, **arguments)
+            outbox.put(('answered', node_id, shard_ids, {
+                'command': command,
+                'owned': shard_for_guild(guild_id, shard_count) in shard_ids,
+                **_summarize_answer(command, interaction.replies),
+            }))
+        await coordinator.stop()
+
+    asyncio.run(main())
+
+
+def _seed_workdir(workdir: str, tracks: int = 200):
+    """Writes the shared files a fresh deployment would have: a catalog with the marker track, and an empty config."""
+    from bench import synthetic_track
+
+    rng = random.Random(1234)
+    catalog = [synthetic_track(rng, index) for index in range(tracks)]
+    catalog.append({**synthetic_track(rng, tracks), 'id': MARKER_TRACK_ID, 'title': "Sim Marker 0"})
+    with open(os.path.join(workdir, "tracks_cache.json"), 'w') as f:
+        json.dump({'tracks': catalog}, f)
+    with open(os.path.join(workdir, "config.json"), 'w') as f:
+        json.dump({'update_log_channels': {}}, f)
+
+
+def simulate(nodes: int, shards_per_node: int, duration: float, lease_ttl: float) -> dict:
+    """Runs `nodes` bot processes against a temp store, kills the first leader midway and returns the report."""
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s gateway %(message)s', datefmt='%H:%M:%S')
+    scratch = tempfile.mkdtemp(prefix="encore_cluster_")
+    database = os.path.join(scratch, "cluster.db")
+    _seed_workdir(scratch)
+    ClusterStore(database)
+
+    commands = {command: {'answered': 0, 'failed': 0, 'misrouted': 0, 'signatures': set()} for command, _ in SIMULATED_COMMANDS}
+    leaders, ready, state = [], set(), {'published': 0, 'marker_lag': 0}
+
+    def receive(message: tuple):
+        kind, node_id, shard_ids, detail = message
+        if kind == 'ready':
+            ready.add(node_id)
+        elif kind == 'leader':
+            leaders.append(node_id)
+            logging.info(f"{node_id} (shards {shard_ids}) is now the update poller.")
+        elif kind == 'published':
+            state['published'] = max(state['published'], detail)
+        elif kind == 'answered':
+            stats = commands[detail['command']]
+            stats['answered'] += 1
+            stats['failed'] += detail['failed']
+            stats['misrouted'] += not detail['owned']
+            if 'signature' in detail:
+                stats['signatures'].add(detail['signature'])
+            elif detail['marker_version'] is not None:
+                state['marker_lag'] = max(state['marker_lag'], state['published'] - detail['marker_version'])
+
+    ctx = multiprocessing.get_context('spawn')
+    outbox = ctx.Queue()
+    shard_count = nodes * shards_per_node
+    processes = {}
+    for index in range(nodes):
+        shard_ids = list(range(index * shards_per_node, (index + 1) * shards_per_node))
+        inbox = ctx.Queue()
+        process = ctx.Process(target=_simulated_node, args=(scratch, database, shard_ids, shard_count, inbox, outbox, lease_ttl), daemon=True)
+        process.start()
+        processes[index] = (process, inbox, shard_ids)
+        # Start one process at a time, like a rolling deploy, so first-run files are created once.
+        while len(ready) <= index:
+            receive(outbox.get(timeout=120))
+
+    killed = None
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        # The fake gateway routes each interaction to the process that owns its guild's shard.
+        guild_id = random.getrandbits(60)
+        owner = shard_for_guild(guild_id, shard_count) // shards_per_node
+        if processes[owner][0].is_alive():
+            processes[owner][1].put((guild_id, *random.choice(SIMULATED_COMMANDS)))
+
+        while not outbox.empty():
+            receive(outbox.get())
+
+        if killed is None and leaders and time.monotonic() > deadline - duration / 2:
+            victim = next(index for index, (process, _, _) in processes.items() if f"sim-{process.pid}" == leaders[-1])
+            logging.info(f"Killing leader {leaders[-1]}; a follower should take over within {lease_ttl:.0f}s.")
+            processes[victim][0].kill()
+            killed = leaders[-1]
+        time.sleep(0.1)
+
+    for process, inbox, _ in processes.values():
+        if process.is_alive():
+            inbox.put(None)
+    for process, _, _ in processes.values():
+        process.join(timeout=5)
+    while not outbox.empty():
+        receive(outbox.get())
+
+    return {
+        'leaders': leaders,
+        'killed': killed,
+        'failover': len(leaders) > 1 and killed is not None,
+        'catalog_versions_published': state['published'],
+        'max_marker_lag': state['marker_lag'],
+        'commands': {command: {'answered': stats['answered'], 'failed': stats['failed'], 'misrouted': stats['misrouted'],
+                               'distinct_answers': len(stats['signatures']) if command != 'trackinfo' else None}
+                     for command, stats in commands.items()},
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cluster coordination tools.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    simulate_parser = subparsers.add_parser('simulate', help="Run bot.py's commands across local shard processes with a fake gateway.")
+    simulate_parser.add_argument('--nodes', type=int, default=3)
+    simulate_parser.add_argument('--shards-per-node', type=int, default=2)
+    simulate_parser.add_argument('--duration', type=float, default=20.0)
+    simulate_parser.add_argument('--lease-ttl', type=float, default=3.0)
+    args = parser.parse_args()
+    print(json.dumps(simulate(args.nodes, args.shards_per_node, args.duration, args.lease_ttl), indent=2))
@@ -1,8 +1,11 @@
 import mido
 import os
 import re
-from collections import defaultdict
-import matplotlib.pyplot as plt
+from bisect import bisect_left, bisect_right
+from collections import defaultdict, deque
+from typing import NamedTuple
+from matplotlib.figure import Figure
+from matplotlib.patches import Patch
 import numpy as np
 import logging
 
@@ -18,8 +21,34 @@ note_name_maps = {
     'PART GUITAR': { 116: "Overdrive", 106: "EXPERT 5 Lift", 105: "EXPERT 4 Lift", 104: "EXPERT 3 Lift", 103: "EXPERT 2 Lift", 102: "EXPERT 1 Lift", 100: "EXPERT 5", 99: "EXPERT 4", 98: "EXPERT 3", 97: "EXPERT 2", 96: "EXPERT 1", 93: "HARD 4 Lift", 92: "HARD 3 Lift", 91: "HARD 2 Lift", 90: "HARD 1 Lift", 87: "HARD 4", 86: "HARD 3", 85: "HARD 2", 84: "HARD 1", 81: "MEDIUM 4 Lift", 80: "MEDIUM 3 Lift", 79: "MEDIUM 2 Lift", 78: "MEDIUM 1 Lift", 75: "MEDIUM 4", 74: "MEDIUM 3", 73: "MEDIUM 2", 72: "MEDIUM 1", 69: "EASY 4 Lift", 68: "EASY 3 Lift", 67: "EASY 2 Lift", 66: "EASY 1 Lift", 63: "EASY 4", 62: "EASY 3", 61: "EASY 2", 60: "EASY 1", 59: "Fret 12", 57: "Fret 11", 56: "Fret 10", 55: "Fret 9", 53: "Fret 8", 52: "Fret 7", 50: "Fret 6", 49: "Fret 5", 47: "Fret 4", 45: "Fret 3", 43: "Fret 2", 40: "Fret 1" },
 }
 
-TIME_WINDOW = 10
 TIME_THRESHOLD = 10
+MAX_OFFSET_TICKS = 480
+MIN_SHIFT_NOTES = 8
+MIN_SHIFT_MATCH = 0.6
+UNSECTIONED = ('Whole chart', 'Start of chart')
+SECTION_PATTERN = re.compile(r'^\[(?:section|prc)[ _](.+)\]$')
+
+class NoteInterval(NamedTuple):
+    start: int
+    end: int
+    pitch: int
+    velocity: int
+
+class IntervalChange(NamedTuple):
+    kind: str
+    old: NoteInterval | None
+    new: NoteInterval | None
+
+class SectionShift(NamedTuple):
+    section: str
+    start: int
+    end: int
+    offset: int
+
+class ComparisonResult(NamedTuple):
+    track_name: str
+    image_path: str
+    shifts: list
 
 def load_midi_tracks(file_path):
     try:
@@ -30,15 +59,81 @@ def load_midi_tracks(file_path):
     tracks = {track.name: track for track in mid.tracks if hasattr(track, 'name')}
     return tracks
 
-def extract_note_events(track, note_range):
-    note_events = defaultdict(list)
+def extract_note_intervals(track, note_range):
+    """Pairs each note-on with the next note-off of the same pitch into a NoteInterval.
+
+    Overlapping note-ons of one pitch are closed first-in, first-out; a note that is
+    never closed ends where it starts.
+    """
+    open_notes = defaultdict(deque)
+    intervals = []
     current_time = 0
     for msg in track:
         current_time += msg.time
         if msg.type in {'note_on', 'note_off'} and msg.note in note_range:
-            note_type = 'note_off' if msg.type == 'note_off' or msg.velocity == 0 else 'note_on'
-            note_events[current_time].append((msg.note, note_type, msg.velocity))
-    return note_events
+            if msg.type == 'note_on' and msg.velocity > 0:
+                open_notes[msg.note].append((current_time, msg.velocity))
+            elif open_notes[msg.note]:
+                start, velocity = open_notes[msg.note].popleft()
+                intervals.append(NoteInterval(start, current_time, msg.note, velocity))
+    for pitch, pending in open_notes.items():
+        intervals.extend(NoteInterval(start, start, pitch, velocity) for start, velocity in pending)
+    intervals.sort()
+    return intervals
+
+class IntervalIndex:
+    """Intervals sorted by start, answering start-range queries with bisect."""
+
+    def __init__(self, intervals) -> None:
+        self.intervals = sorted(intervals)
+        self.starts = [interval.start for interval in self.intervals]
+
+    def __len__(self):
+        return len(self.intervals)
+
+    def starting_between(self, low: int, high: int) -> range:
+        """Positions of the intervals whose start lies in `[low, high]`."""
+        return range(bisect_left(self.starts, low), bisect_right(self.starts, high))
+
+def diff_intervals(old_intervals, new_intervals, tolerance):
+    """Diffs two charts' notes as intervals, returning IntervalChanges sorted by time.
+
+    Notes of the same pitch and velocity whose starts are within `tolerance` ticks are
+    the same note; if their ends differ by more than `tolerance` it was resized (a
+    lengthened sustain or a moved phrase end), otherwise it is unchanged. Unmatched
+    notes are added or removed. Identical notes are matched by a hash lookup and the
+    rest through a per-key IntervalIndex, keeping the diff O(n log n).
+    """
+    unmatched_old, unmatched_new = defaultdict(list), defaultdict(list)
+    exact = defaultdict(int)
+    for interval in new_intervals:
+        exact[interval] += 1
+    for interval in old_intervals:
+        if exact[interval]:
+            exact[interval] -= 1
+        else:
+            unmatched_old[(interval.pitch, interval.velocity)].append(interval)
+    for interval, count in exact.items():
+        unmatched_new[(interval.pitch, interval.velocity)].extend([interval] * count)
+
+    changes = []
+    for key in unmatched_old.keys() | unmatched_new.keys():
+        index = IntervalIndex(unmatched_new.get(key, []))
+        taken = [False] * len(index)
+        for old in sorted(unmatched_old.get(key, [])):
+            candidates = [i for i in index.starting_between(old.start - tolerance, old.start + tolerance) if not taken[i]]
+            if not candidates:
+                changes.append(IntervalChange('removed', old, None))
+                continue
+            match = min(candidates, key=lambda i: abs(index.starts[i] - old.start))
+            taken[match] = True
+            new = index.intervals[match]
+            if abs(new.end - old.end) > tolerance:
+                changes.append(IntervalChange('resized', old, new))
+        changes.extend(IntervalChange('added', None, new) for i, new in enumerate(index.intervals) if not taken[i])
+
+    changes.sort(key=lambda change: ((change.old or change.new).start, (change.old or change.new).pitch))
+    return changes
 
 def extract_text_events(track):
     text_events = []
@@ -49,48 +144,89 @@ def extract_text_events(track):
             text_events.append((current_time, msg.text))
     return text_events
 
-def group_events_by_time_window(events, time_window):
-    grouped_events = defaultdict(list)
-    sorted_times = sorted(events.keys())
-    
-    for time in sorted_times:
-        notes = events[time]
-        found_group = False
-        for group_time in grouped_events:
-            if abs(time - group_time) <= time_window:
-                grouped_events[group_time].extend(notes)
-                found_group = True
-                break
-        if not found_group:
-            grouped_events[time].extend(notes)
-    return grouped_events
-
-def compare_tracks(track1_events, track2_events, time_window, time_threshold):
-    differences = []
-    grouped1 = group_events_by_time_window(track1_events, time_window)
-    grouped2 = group_events_by_time_window(track2_events, time_window)
-    
-    all_times = sorted(set(grouped1.keys()) | set(grouped2.keys()))
-    
-    for time in all_times:
-        events1 = set(tuple(e) for e in grouped1.get(time, []))
-        events2 = set(tuple(e) for e in grouped2.get(time, []))
-        
-        if events1 != events2:
-            is_timing_shift = False
-            for other_time in all_times:
-                if abs(time - other_time) <= time_threshold and time != other_time:
-                    other_events1 = set(tuple(e) for e in grouped1.get(other_time, []))
-                    other_events2 = set(tuple(e) for e in grouped2.get(other_time, []))
-                    if events1 == other_events2 or events2 == other_events1:
-                        is_timing_shift = True
-                        break
-            if not is_timing_shift:
-                added = events2 - events1
-                removed = events1 - events2
-                if added or removed:
-                    differences.append((time, list(removed), list(added)))
-    return differences
+def extract_sections(track):
+    """Returns (tick, name) for each `[section X]` / `[prc_x]` marker in an EVENTS track."""
+    return [(time, match.group(1).replace('_', ' ')) for time, text in extract_text_events(track)
+            if (match := SECTION_PATTERN.match(text.strip()))]
+
+def estimate_offset(old_onsets, new_onsets, max_offset, preferred=0):
+    """Finds the tick offset that lines up the most new onsets with old ones.
+
+    Both onset sets become presence histograms and are cross-correlated with an FFT;
+    returns (offset, share of onsets matched at that offset). The `preferred` offset
+    wins ties, which keeps evenly spaced notes from aliasing to a whole-beat offset.
+    """
+    old_onsets, new_onsets = np.unique(old_onsets), np.unique(new_onsets)
+    if min(len(old_onsets), len(new_onsets)) < MIN_SHIFT_NOTES:
+        return 0, 0.0
+    origin = min(old_onsets[0], new_onsets[0])
+    length = int(max(old_onsets[-1], new_onsets[-1]) - origin) + 1
+    size = 1 << int(2 * length + max_offset).bit_length()
+    old_histogram = np.zeros(length); old_histogram[old_onsets - origin] = 1
+    new_histogram = np.zeros(length); new_histogram[new_onsets - origin] = 1
+    correlation = np.fft.irfft(np.fft.rfft(new_histogram, size) * np.conj(np.fft.rfft(old_histogram, size)), size)
+
+    # correlation[k] counts onsets at t in the old chart and t + k in the new one; negative lags wrap around.
+    lags = np.arange(-max_offset, max_offset + 1)
+    matches = np.rint(correlation[lags % size])
+    best = int(np.argmax(matches))
+    if abs(preferred) <= max_offset and matches[best] <= matches[preferred + max_offset]:
+        best = preferred + max_offset
+    return int(lags[best]), float(matches[best] / min(len(old_onsets), len(new_onsets)))
+
+def detect_section_shifts(old_intervals, new_intervals, sections, max_offset=MAX_OFFSET_TICKS):
+    """Estimates how far the whole new chart, and each of its sections, moved relative to the old one.
+
+    Sections come from the old chart's EVENTS markers (the whole chart when there are
+    none). Returns (chart shift, [SectionShift per section]). The chart-wide offset is
+    estimated first and wins ties in each section; a section with too few notes, or
+    whose best offset matches fewer than MIN_SHIFT_MATCH of its onsets, takes the
+    chart-wide offset. Returns (None, []) when either chart has no notes.
+    """
+    old_starts = np.array([interval.start for interval in old_intervals], dtype=np.int64)
+    new_starts = np.array([interval.start for interval in new_intervals], dtype=np.int64)
+    if not len(old_starts) or not len(new_starts):
+        return None, []
+    chart_end = int(max(old_starts.max(), new_starts.max())) + 1
+    chart_offset, matched = estimate_offset(old_starts, new_starts, max_offset)
+    chart_shift = SectionShift(UNSECTIONED[0], 0, chart_end, chart_offset if matched >= MIN_SHIFT_MATCH else 0)
+    if not sections or sections[0][0] > old_starts.min():
+        sections = [(0, UNSECTIONED[0] if not sections else UNSECTIONED[1])] + list(sections)
+
+    shifts = []
+    for (start, name), (end, _) in zip(sections, list(sections[1:]) + [(chart_end, None)]):
+        old_segment = old_starts[(old_starts >= start) & (old_starts < end)]
+        new_segment = new_starts[(new_starts >= start - max_offset) & (new_starts < end + max_offset)]
+        offset, matched = estimate_offset(old_segment, new_segment, max_offset, preferred=chart_shift.offset)
+        shifts.append(SectionShift(name, start, end, offset if matched >= MIN_SHIFT_MATCH else chart_shift.offset))
+    return chart_shift, shifts
+
+def reported_shifts(chart_shift, section_shifts):
+    """Collapses section shifts for reporting: one whole-chart entry, plus the sections that moved differently."""
+    if chart_shift is None:
+        return []
+    differing = [shift for shift in section_shifts if shift.offset != chart_shift.offset and shift.section != UNSECTIONED[0]]
+    return ([chart_shift] if chart_shift.offset else []) + differing
+
+def _section_offsets(times, shifts):
+    """Offset of the section each new-chart tick falls in, with section bounds moved by their own offsets."""
+    bounds = np.maximum.accumulate(np.array([shift.start + shift.offset for shift in shifts], dtype=np.int64))
+    offsets = np.array([0] + [shift.offset for shift in shifts], dtype=np.int64)
+    return offsets[np.searchsorted(bounds, np.asarray(times, dtype=np.int64), side='right')]
+
+def align_intervals(intervals, shifts):
+    """Moves new-chart intervals back by their section's offset, onto the old chart's timeline."""
+    offsets = _section_offsets([interval.start for interval in intervals], shifts)
+    return sorted(NoteInterval(interval.start - int(offset), interval.end - int(offset), interval.pitch, interval.velocity)
+                  for interval, offset in zip(intervals, offsets))
+
+def align_text_events(text_events, shifts):
+    offsets = _section_offsets([time for time, _ in text_events], shifts)
+    return [(time - int(offset), text) for (time, text), offset in zip(text_events, offsets)]
+
+def describe_shift(shift):
+    label = shift.section if shift.section in UNSECTIONED else f"Section {shift.section}"
+    return f"{label} shifted {shift.offset:+d} ticks" if shift.offset else f"{label} kept its original timing"
 
 def compare_text_events(text_events1, text_events2):
     diffs = []
@@ -105,48 +241,63 @@ def compare_text_events(text_events1, text_events2):
             diffs.append((time, text1, text2))
     return diffs
 
-def visualize_midi_changes(differences, text_differences, note_name_map, track_name, output_folder, session_id):
-    fig, ax = plt.subplots(figsize=(12, 8))
-    
-    y_labels = {}
-    y_pos_counter = 0
+def visualize_midi_changes(differences, text_differences, note_name_map, track_name, output_folder, session_id, shifts=()):
+    # A standalone Figure instead of pyplot's global state, so comparisons can run in worker threads.
+    fig = Figure(figsize=(12, 8))
+    ax = fig.subplots()
 
-    all_notes_in_diff = set()
-    for _, removed, added in differences:
-        all_notes_in_diff.update(note[0] for note in removed)
-        all_notes_in_diff.update(note[0] for note in added)
+    all_notes_in_diff = sorted({(change.old or change.new).pitch for change in differences})
+    y_labels = {note: y_pos for y_pos, note in enumerate(all_notes_in_diff)}
 
-    for note in sorted(list(all_notes_in_diff)):
-        y_labels[note] = y_pos_counter
-        y_pos_counter += 1
+    times = [t for change in differences for interval in (change.old, change.new) if interval for t in (interval.start, interval.end)]
+    times += [time for time, _, _ in text_differences]
+    # Notes without a sustain still get a visible sliver.
+    min_width = max(1, (max(times) - min(times)) / 400) if times else 1
 
-    for time, removed, added in differences:
-        for note_val, _, _ in removed:
-            ax.scatter(time, y_labels[note_val], c='red', marker='s', s=100, edgecolors='black', label='Removed' if 'Removed' not in plt.gca().get_legend_handles_labels()[1] else "")
-        for note_val, _, _ in added:
-            ax.scatter(time, y_labels[note_val], c='green', marker='s', s=100, edgecolors='black', label='Added' if 'Added' not in plt.gca().get_legend_handles_labels()[1] else "")
+    bars = defaultdict(list)
+    for change in differences:
+        if change.kind == 'resized':
+            bars[('resized_old', change.old.pitch)].append(change.old)
+            bars[('resized_new', change.new.pitch)].append(change.new)
+        else:
+            interval = change.old or change.new
+            bars[(change.kind, interval.pitch)].append(interval)
+
+    styles = {
+        'removed': (-0.35, 0.7, dict(facecolor='red', edgecolor='black'), 'Removed'),
+        'added': (-0.35, 0.7, dict(facecolor='green', edgecolor='black'), 'Added'),
+        'resized_old': (-0.35, 0.35, dict(facecolor='none', edgecolor='darkorange', hatch='//'), 'Resized (old length)'),
+        'resized_new': (0.0, 0.35, dict(facecolor='darkorange', edgecolor='black'), 'Resized (new length)'),
+    }
+    for (kind, pitch), intervals in bars.items():
+        offset, height, style, _ = styles[kind]
+        ax.broken_barh([(i.start, max(i.end - i.start, min_width)) for i in intervals], (y_labels[pitch] + offset, height), **style)
+    drawn_kinds = {kind for kind, _ in bars}
+    legend_handles = [Patch(label=label, **style) for kind, (_, _, style, label) in styles.items() if kind in drawn_kinds]
+
+    for shift in shifts:
+        ax.axvspan(shift.start, shift.end, color='gold', alpha=0.2, label='Shifted Section' if shift is shifts[0] else None)
+        ax.annotate(f"{shift.section}: {shift.offset:+d} ticks", xy=(shift.start, 1), xycoords=('data', 'axes fraction'),
+                    xytext=(3, -12), textcoords='offset points', fontsize=8)
 
     if text_differences:
-        if 'text' not in y_labels:
-            y_labels['text'] = y_pos_counter
-        for time, _, _ in text_differences:
-            ax.scatter(time, y_labels['text'], c='blue', marker='^', s=100, label='Text Change' if 'Text Change' not in plt.gca().get_legend_handles_labels()[1] else "")
+        y_labels['text'] = len(all_notes_in_diff)
+        ax.scatter([time for time, _, _ in text_differences], [y_labels['text']] * len(text_differences), c='blue', marker='^', s=100, label='Text Change')
 
     ax.set_xlabel('Time (MIDI Ticks)')
     ax.set_ylabel('Notes / Events')
-    ax.set_title(f'MIDI Changes for {track_name}')
+    ax.set_title(f'MIDI Changes for {track_name}' + (' (changes shown after aligning shifted sections)' if shifts else ''))
     ax.grid(True, which='both', linestyle='--', linewidth=0.5)
-    
+
     sorted_y_labels = sorted(y_labels.items(), key=lambda item: item[1])
     ax.set_yticks([pos for _, pos in sorted_y_labels])
     ax.set_yticklabels([note_name_map.get(note, f'Note {note}') if isinstance(note, int) else "Text Events" for note, _ in sorted_y_labels])
-    
-    ax.legend()
-    plt.tight_layout()
-    
+
+    ax.legend(handles=legend_handles + ax.get_legend_handles_labels()[0])
+    fig.tight_layout()
+
     image_path = os.path.join(output_folder, f"{track_name.replace(' ', '_')}_changes_{session_id}.png")
-    plt.savefig(image_path)
-    plt.close()
+    fig.savefig(image_path)
     return image_path
 
 def run_comparison(midi_file1_path, midi_file2_path, session_id, output_folder='out', format="json"):
@@ -172,6 +323,7 @@ def run_comparison(midi_file1_path, midi_file2_path, session_id, output_folder='
         ]
 
     all_present_track_names = sorted(list(set(tracks1.keys()) | set(tracks2.keys())))
+    sections = extract_sections(tracks1['EVENTS']) if 'EVENTS' in tracks1 else []
 
     tracks_to_actually_compare = [name for name in all_present_track_names if name in tracks_to_compare]
 
@@ -179,25 +331,35 @@ def run_comparison(midi_file1_path, midi_file2_path, session_id, output_folder='
         track1 = tracks1.get(track_name)
         track2 = tracks2.get(track_name)
         
-        note_events1 = extract_note_events(track1, range(128)) if track1 else {}
-        note_events2 = extract_note_events(track2, range(128)) if track2 else {}
+        note_intervals1 = extract_note_intervals(track1, range(128)) if track1 else []
+        note_intervals2 = extract_note_intervals(track2, range(128)) if track2 else []
         
         text_events1 = extract_text_events(track1) if track1 else []
         text_events2 = extract_text_events(track2) if track2 else []
 
-        note_diffs = compare_tracks(note_events1, note_events2, TIME_WINDOW, TIME_THRESHOLD)
+        # Whole-chart or per-section sync nudges are measured first and undone, so the
+        # fine diff only sees real edits instead of every note in a shifted section.
+        chart_shift, section_shifts = detect_section_shifts(note_intervals1, note_intervals2, sections)
+        shifts = reported_shifts(chart_shift, section_shifts)
+        if shifts:
+            note_intervals2 = align_intervals(note_intervals2, section_shifts)
+            text_events2 = align_text_events(text_events2, section_shifts)
+            for shift in shifts:
+                logging.info(f"'{track_name}': {describe_shift(shift)}.")
+
+        note_diffs = diff_intervals(note_intervals1, note_intervals2, TIME_THRESHOLD)
         text_diffs = compare_text_events(text_events1, text_events2)
 
-        if note_diffs or text_diffs:
+        if note_diffs or text_diffs or shifts:
             note_map_key = track_name
             if track_name.startswith("PAD"):
                 note_map_key = track_name.replace("PAD", "PART")
 
             note_map = note_name_maps.get(note_map_key, {})
-            image_path = visualize_midi_changes(note_diffs, text_diffs, note_map, track_name, output_folder, session_id)
+            image_path = visualize_midi_changes(note_diffs, text_diffs, note_map, track_name, output_folder, session_id, shifts)
             
             if image_path:
-                generated_results.append((track_name, image_path))
+                generated_results.append(ComparisonResult(track_name, image_path, shifts))
                 logging.info(f"Differences found in '{track_name}'. Image saved to {image_path}")
         else:
             logging.info(f"'{track_name}' has no significant changes.")
@@ -0,0 +1,117 @@
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+
+
+class BlockingSite:
+    __slots__ = ('site', 'count', 'total', 'worst', 'stack')
+
+    def __init__(self, site: str) -> None:
+        self.site = site
+        self.count = 0
+        self.total = 0.0
+        self.worst = 0.0
+        self.stack = []
+
+
+class LoopLagMonitor:
+    """Measures event loop lag and captures what the loop thread was doing when it stalled.
+
+    A heartbeat task sleeps for `interval` and measures how late it wakes up. A side
+    thread watches the heartbeat; once it is `threshold` seconds overdue it grabs the
+    loop thread's stack with sys._current_frames(). When the heartbeat finally runs,
+    the stall is attributed to the innermost frame inside `project_root`.
+    """
+
+    def __init__(self, threshold: float = 0.25, interval: float = 0.1, project_root: str = None, on_lag=None) -> None:
+        self.threshold = threshold
+        self.interval = interval
+        self.project_root = os.path.abspath(project_root or os.path.dirname(__file__))
+        self.on_lag = on_lag
+        self.stalls = 0
+        self.offenders = {}
+        self._lock = threading.Lock()
+        self._beat = time.monotonic()
+        self._beat_id = 0
+        self._captured = None
+        self._loop_thread_id = None
+        self._task = None
+        self._thread = None
+        self._stopped = threading.Event()
+
+    def start(self):
+        if self._task is not None and not self._task.done():
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._stopped.clear()
+        self._task = asyncio.get_running_loop().create_task(self._heartbeat())
+        self._thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._task is not None:
+            self._task.cancel()
+
+    async def _heartbeat(self):
+        while True:
+            with self._lock:
+                self._beat = time.monotonic()
+                self._beat_id += 1
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, time.monotonic() - self._beat - self.interval)
+            if self.on_lag:
+                self.on_lag(lag)
+            if lag >= self.threshold:
+                self._record_stall(lag)
+
+    def _watch(self):
+        while not self._stopped.wait(self.interval / 2):
+            with self._lock:
+                overdue = time.monotonic() - self._beat - self.interval
+                beat_id = self._beat_id
+                already_captured = self._captured is not None and self._captured[0] == beat_id
+            if overdue < self.threshold or already_captured:
+                continue
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            stack = traceback.extract_stack(frame)
+            del frame
+            with self._lock:
+                if self._beat_id == beat_id:
+                    self._captured = (beat_id, stack)
+
+    def _call_site(self, stack: traceback.StackSummary) -> str:
+        for frame in reversed(stack):
+            filename = os.path.abspath(frame.filename)
+            if filename.startswith(self.project_root) and filename != os.path.abspath(__file__):
+                return f"{os.path.relpath(filename, self.project_root)}:{frame.lineno} in {frame.name}"
+        frame = stack[-1]
+        return f"{frame.filename}:{frame.lineno} in {frame.name}"
+
+    def _record_stall(self, lag: float):
+        with self._lock:
+            captured, self._captured = self._captured, None
+        self.stalls += 1
+        if captured is None:
+            logging.warning(f"Event loop blocked for {lag:.3f}s (no stack captured).")
+            return
+
+        stack = captured[1]
+        site = self._call_site(stack)
+        if (offender := self.offenders.get(site)) is None:
+            offender = self.offenders[site] = BlockingSite(site)
+        offender.count += 1
+        offender.total += lag
+        if lag >= offender.worst:
+            offender.worst = lag
+            offender.stack = traceback.format_list(stack[-8:])
+        logging.warning(f"Event loop blocked for {lag:.3f}s at {site}:\n{''.join(traceback.format_list(stack[-8:]))}")
+
+    def worst_offenders(self, limit: int = 10) -> list[BlockingSite]:
+        return sorted(self.offenders.values(), key=lambda o: o.total, reverse=True)[:limit]
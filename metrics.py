@@ -0,0 +1,192 @@
+import asyncio
+import bisect
+import functools
+import logging
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from aiohttp import web
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+RECENT_WINDOW = 900.0
+RECENT_SAMPLES = 2048
+
+
+class Histogram:
+    """Cumulative Prometheus buckets plus a bounded ring of recent samples for percentiles."""
+
+    __slots__ = ('bucket_counts', 'count', 'sum', 'recent')
+
+    def __init__(self, samples: int = RECENT_SAMPLES) -> None:
+        self.bucket_counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.recent = deque(maxlen=samples)
+
+    def observe(self, value: float):
+        self.bucket_counts[bisect.bisect_left(LATENCY_BUCKETS, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.recent.append((time.monotonic(), value))
+
+    def coverage(self, window: float = RECENT_WINDOW) -> float:
+        """Returns how many of the last `window` seconds the ring still holds samples for."""
+        if len(self.recent) < self.recent.maxlen:
+            return window
+        return min(window, time.monotonic() - self.recent[0][0])
+
+    def percentiles(self, window: float = RECENT_WINDOW, quantiles=(0.5, 0.95, 0.99)) -> tuple[int, list]:
+        """Returns (sample count, [value at each quantile]) over the last `window` seconds."""
+        cutoff = time.monotonic() - window
+        values = sorted(value for stamp, value in self.recent if stamp >= cutoff)
+        if not values:
+            return 0, [None] * len(quantiles)
+        return len(values), [values[min(len(values) - 1, int(q * len(values)))] for q in quantiles]
+
+
+def _label_key(labels: dict) -> tuple:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _format_labels(key: tuple, extra: tuple = ()) -> str:
+    pairs = key + extra
+    if not pairs:
+        return ''
+    escaped = (value.replace('\\', '\\\\').replace('"', '\\"') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+class MetricsRegistry:
+    """Histograms, counters and callback gauges, keyed by metric name and label set.
+
+    Recording is a dict lookup plus a deque append, so timers can stay on in production.
+    Gauges, and counters kept by other objects (`counter_callback`), are callables
+    evaluated only when the metrics are read. Histograms keep
+    `RECENT_SAMPLES` recent samples unless `expect_rate` sized their ring for more.
+    """
+
+    def __init__(self, prefix: str = '') -> None:
+        self.prefix = prefix
+        self.histograms = {}
+        self.counters = {}
+        self.gauges = {}
+        self.counter_callbacks = {}
+        self.sample_limits = {}
+
+    def expect_rate(self, name: str, per_second: float, window: float = RECENT_WINDOW):
+        """Sizes the sample rings of histogram `name` to hold `window` seconds at `per_second` observations."""
+        self.sample_limits[name] = max(RECENT_SAMPLES, int(per_second * window) + 1)
+
+    def observe(self, name: str, value: float, **labels):
+        key = (name, _label_key(labels))
+        if (histogram := self.histograms.get(key)) is None:
+            histogram = self.histograms[key] = Histogram(self.sample_limits.get(name, RECENT_SAMPLES))
+        histogram.observe(value)
+
+    def inc(self, name: str, amount: float = 1, **labels):
+        key = (name, _label_key(labels))
+        self.counters[key] = self.counters.get(key, 0) + amount
+
+    def gauge(self, name: str, fn, **labels):
+        self.gauges[(name, _label_key(labels))] = fn
+
+    def counter_callback(self, name: str, fn, **labels):
+        """Exports a monotonically increasing count kept elsewhere (e.g. cache hits) as a counter."""
+        self.counter_callbacks[(name, _label_key(labels))] = fn
+
+    @contextmanager
+    def time(self, name: str, **labels):
+        """Records the duration of the block in `name`, counting exceptions in `{name}_errors_total`."""
+        started = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.inc(f"{name}_errors_total", **labels)
+            raise
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def timed(self, name: str, **labels):
+        def decorator(func):
+            if asyncio.iscoroutinefunction(func):
+                @functools.wraps(func)
+                async def async_wrapper(*args, **kwargs):
+                    with self.time(name, **labels):
+                        return await func(*args, **kwargs)
+                return async_wrapper
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.time(name, **labels):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def _callback_values(self, callbacks: dict) -> list:
+        values = []
+        for (name, key), fn in callbacks.items():
+            try:
+                values.append((name, key, float(fn())))
+            except Exception as e:
+                logging.warning(f"Metrics callback {name} failed: {e}")
+        return values
+
+    def _counter_values(self) -> list:
+        return sorted([(name, key, value) for (name, key), value in self.counters.items()]
+                      + self._callback_values(self.counter_callbacks))
+
+    def summary(self, window: float = RECENT_WINDOW) -> dict:
+        """Returns {'histograms': [(name, labels, count, p50, p95, p99, covered)], 'counters': [...], 'gauges': [...]}.
+
+        `covered` is how many seconds of `window` the percentiles actually span; it is
+        shorter than `window` when a busy histogram's ring has already dropped older samples.
+        """
+        histograms = []
+        for (name, key), histogram in sorted(self.histograms.items()):
+            count, (p50, p95, p99) = histogram.percentiles(window)
+            if count:
+                histograms.append((name, dict(key), count, p50, p95, p99, histogram.coverage(window)))
+        return {
+            'histograms': histograms,
+            'counters': [(name, dict(key), value) for name, key, value in self._counter_values()],
+            'gauges': [(name, dict(key), value) for name, key, value in sorted(self._callback_values(self.gauges))],
+        }
+
+    def render_prometheus(self) -> str:
+        lines, typed = [], set()
+
+        def declare(name: str, kind: str):
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {name} {kind}")
+
+        for (name, key), histogram in sorted(self.histograms.items()):
+            metric = f"{self.prefix}{name}"
+            declare(metric, 'histogram')
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS + (float('inf'),), histogram.bucket_counts):
+                cumulative += count
+                lines.append(f"{metric}_bucket{_format_labels(key, (('le', '+Inf' if bound == float('inf') else repr(bound)),))} {cumulative}")
+            lines.append(f"{metric}_sum{_format_labels(key)} {histogram.sum}")
+            lines.append(f"{metric}_count{_format_labels(key)} {histogram.count}")
+        for name, key, value in self._counter_values():
+            declare(f"{self.prefix}{name}", 'counter')
+            lines.append(f"{self.prefix}{name}{_format_labels(key)} {value}")
+        for name, key, value in sorted(self._callback_values(self.gauges)):
+            declare(f"{self.prefix}{name}", 'gauge')
+            lines.append(f"{self.prefix}{name}{_format_labels(key)} {value}")
+        return '\n'.join(lines) + '\n'
+
+
+async def start_metrics_server(registry: MetricsRegistry, host: str = '127.0.0.1', port: int = 9108) -> web.AppRunner:
+    async def handle_metrics(request: web.Request) -> web.Response:
+        return web.Response(text=registry.render_prometheus(), content_type='text/plain', charset='utf-8')
+
+    app = web.Application()
+    app.router.add_get('/metrics', handle_metrics)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logging.info(f"Serving metrics on http://{host}:{port}/metrics")
+    return runner
@@ -0,0 +1,95 @@
+import struct
+
+
+def read_vlq(data: bytes, pos: int) -> tuple[int, int]:
+    value = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value = (value << 7) | (byte & 0x7F)
+        if not byte & 0x80:
+            return value, pos
+
+
+def write_vlq(value: int) -> bytes:
+    out = [value & 0x7F]
+    value >>= 7
+    while value:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    return bytes(reversed(out))
+
+
+def split_chunks(data: bytes) -> tuple[bytes, list[tuple[bytes, bytes]]]:
+    """Splits a Standard MIDI File into its MThd body and a list of (type, body) chunks."""
+    if data[:4] != b'MThd':
+        raise ValueError("Not a Standard MIDI File.")
+    header_length = struct.unpack('>I', data[4:8])[0]
+    header = data[8:8 + header_length]
+    chunks, pos = [], 8 + header_length
+    while pos + 8 <= len(data):
+        chunk_type = data[pos:pos + 4]
+        length = struct.unpack('>I', data[pos + 4:pos + 8])[0]
+        chunks.append((chunk_type, data[pos + 8:pos + 8 + length]))
+        pos += 8 + length
+    return header, chunks
+
+
+def join_chunks(header: bytes, chunks: list[tuple[bytes, bytes]]) -> bytes:
+    track_count = sum(1 for chunk_type, _ in chunks if chunk_type == b'MTrk')
+    header = header[:2] + struct.pack('>H', track_count) + header[4:]
+    parts = [b'MThd', struct.pack('>I', len(header)), header]
+    for chunk_type, body in chunks:
+        parts += [chunk_type, struct.pack('>I', len(body)), body]
+    return b''.join(parts)
+
+
+def find_track_name(body: bytes) -> tuple[str, int, int] | None:
+    """Returns (name, start, end) of the first track_name meta event in an MTrk body.
+
+    Only the events before the name are walked; nothing is decoded past it.
+    """
+    pos, running_status = 0, None
+    while pos < len(body):
+        _, pos = read_vlq(body, pos)
+        status = body[pos]
+        if status == 0xFF:
+            meta_start = pos
+            meta_type = body[pos + 1]
+            length, data_start = read_vlq(body, pos + 2)
+            if meta_type == 0x03:
+                return body[data_start:data_start + length].decode('latin1'), meta_start, data_start + length
+            if meta_type == 0x2F:
+                return None
+            pos = data_start + length
+        elif status in (0xF0, 0xF7):
+            length, data_start = read_vlq(body, pos + 1)
+            pos = data_start + length
+        else:
+            if status & 0x80:
+                running_status = status
+                pos += 1
+            elif running_status is None:
+                raise ValueError("Running status without a preceding status byte.")
+            pos += 1 if running_status & 0xF0 in (0xC0, 0xD0) else 2
+    return None
+
+
+def rewrite_tracks(data: bytes, drop: set = frozenset(), rename: dict = None) -> bytes:
+    """Drops MTrk chunks whose name is in `drop` and renames tracks per `rename`.
+
+    Every other chunk is copied through byte-for-byte.
+    """
+    rename = rename or {}
+    header, chunks = split_chunks(data)
+    kept = []
+    for chunk_type, body in chunks:
+        if chunk_type == b'MTrk' and (found := find_track_name(body)):
+            name, start, end = found
+            if name in drop:
+                continue
+            if name in rename:
+                new_name = rename[name].encode('latin1')
+                body = body[:start] + b'\xff\x03' + write_vlq(len(new_name)) + new_name + body[end:]
+        kept.append((chunk_type, body))
+    return join_chunks(header, kept)
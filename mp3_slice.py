@@ -0,0 +1,142 @@
+import struct
+
+BITRATES = {
+    (1, 1): [0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448],
+    (1, 2): [0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384],
+    (1, 3): [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    (2, 1): [0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256],
+    (2, 2): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+    (2, 3): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+SAMPLE_RATES = {1: [44100, 48000, 32000], 2: [22050, 24000, 16000], 2.5: [11025, 12000, 8000]}
+XING_FRAMES, XING_BYTES, XING_TOC = 0x1, 0x2, 0x4
+
+
+class UnsupportedFormat(Exception):
+    pass
+
+
+class FrameHeader:
+    __slots__ = ('version', 'layer', 'sample_rate', 'samples', 'length', 'mono', 'signature')
+
+    def __init__(self, data: bytes, pos: int) -> None:
+        b1, b2, b3 = data[pos + 1], data[pos + 2], data[pos + 3]
+        if data[pos] != 0xFF or (b1 & 0xE0) != 0xE0:
+            raise UnsupportedFormat(f"No frame sync at byte {pos}.")
+        version = {0: 2.5, 2: 2, 3: 1}.get((b1 >> 3) & 0x3)
+        layer = {1: 3, 2: 2, 3: 1}.get((b1 >> 1) & 0x3)
+        bitrate_index, rate_index = b2 >> 4, (b2 >> 2) & 0x3
+        if version is None or layer is None or rate_index == 3 or bitrate_index == 15:
+            raise UnsupportedFormat(f"Invalid frame header at byte {pos}.")
+        if bitrate_index == 0:
+            raise UnsupportedFormat("Free-format MP3 streams are not supported.")
+
+        self.version = version
+        self.layer = layer
+        self.sample_rate = SAMPLE_RATES[version][rate_index]
+        bitrate = BITRATES[(1 if version == 1 else 2, layer)][bitrate_index] * 1000
+        padding = (b2 >> 1) & 0x1
+        if layer == 1:
+            self.samples = 384
+            self.length = (12 * bitrate // self.sample_rate + padding) * 4
+        else:
+            self.samples = 1152 if layer == 2 or version == 1 else 576
+            self.length = self.samples // 8 * bitrate // self.sample_rate + padding
+        self.mono = (b3 >> 6) == 0x3
+        self.signature = (b1 & 0xFE, b2 & 0x0C)
+
+    def xing_offset(self) -> int:
+        if self.version == 1:
+            return 4 + (17 if self.mono else 32)
+        return 4 + (9 if self.mono else 17)
+
+
+def skip_id3v2(data: bytes) -> int:
+    if data[:3] != b'ID3' or len(data) < 10:
+        return 0
+    size = (data[6] << 21) | (data[7] << 14) | (data[8] << 7) | data[9]
+    return 10 + size + (10 if data[5] & 0x10 else 0)
+
+
+def read_frames(data: bytes) -> tuple[list, FrameHeader, int | None]:
+    """Returns ([(offset, length), ...], first header, offset of the Xing/Info frame or None)."""
+    pos = skip_id3v2(data)
+    while pos + 4 <= len(data) and not (data[pos] == 0xFF and data[pos + 1] & 0xE0 == 0xE0):
+        pos += 1
+    if pos + 4 > len(data):
+        raise UnsupportedFormat("No MP3 frames found.")
+
+    first = FrameHeader(data, pos)
+    frames, tag_offset = [], None
+    xing_at = pos + first.xing_offset()
+    if data[xing_at:xing_at + 4] in (b'Xing', b'Info'):
+        tag_offset = pos
+        pos += first.length
+    elif data[pos + 36:pos + 40] == b'VBRI':
+        pos += first.length
+
+    while pos + 4 <= len(data):
+        try:
+            header = FrameHeader(data, pos)
+        except UnsupportedFormat:
+            if frames: break
+            raise
+        if header.signature != first.signature or pos + header.length > len(data):
+            break
+        frames.append((pos, header.length))
+        pos += header.length
+    if not frames:
+        raise UnsupportedFormat("No MP3 frames found.")
+    return frames, first, tag_offset
+
+
+def build_xing_frame(data: bytes, tag_offset: int, header: FrameHeader, frame_lengths: list) -> bytes:
+    frame = bytearray(data[tag_offset:tag_offset + header.length])
+    xing_at = header.xing_offset()
+    flags = struct.unpack('>I', frame[xing_at + 4:xing_at + 8])[0]
+    pos = xing_at + 8
+    total_bytes = len(frame) + sum(frame_lengths)
+    if flags & XING_FRAMES:
+        frame[pos:pos + 4] = struct.pack('>I', len(frame_lengths))
+        pos += 4
+    if flags & XING_BYTES:
+        frame[pos:pos + 4] = struct.pack('>I', total_bytes)
+        pos += 4
+    if flags & XING_TOC:
+        offsets, running = [], len(frame)
+        for length in frame_lengths:
+            offsets.append(running)
+            running += length
+        frame[pos:pos + 100] = bytes(min(255, offsets[i * len(offsets) // 100] * 256 // total_bytes) for i in range(100))
+        pos += 100
+    # Drop the LAME extension: its encoder delay/padding and CRC describe the original file.
+    frame[pos + (4 if flags & 0x8 else 0):] = bytes(len(frame) - pos - (4 if flags & 0x8 else 0))
+    return bytes(frame)
+
+
+def duration_ms(data: bytes) -> float:
+    frames, header, _ = read_frames(data)
+    return len(frames) * header.samples * 1000 / header.sample_rate
+
+
+def slice_mp3(data: bytes, start_ms: int | None, end_ms: int | None) -> bytes:
+    """Copies the MP3 frames that start inside [start_ms, end_ms) without decoding them.
+
+    Raises UnsupportedFormat for anything that isn't a plain MPEG audio stream, so the
+    caller can fall back to a full decode. Out-of-range windows return the input as-is.
+    """
+    frames, header, tag_offset = read_frames(data)
+    frame_ms = header.samples * 1000 / header.sample_rate
+    if start_ms is None or end_ms is None or not (0 <= start_ms < end_ms <= len(frames) * frame_ms):
+        return data
+
+    first_frame = int(start_ms // frame_ms)
+    last_frame = min(len(frames), int(-(-end_ms // frame_ms)))
+    selected = frames[first_frame:last_frame]
+    start, end = selected[0][0], selected[-1][0] + selected[-1][1]
+
+    parts = []
+    if tag_offset is not None:
+        parts.append(build_xing_frame(data, tag_offset, header, [length for _, length in selected]))
+    parts.append(data[start:end])
+    return b''.join(parts)
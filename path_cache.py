@@ -0,0 +1,100 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import time
+from collections import OrderedDict
+
+
+class PathCache:
+    """Disk-backed LRU cache of rendered CHOpt paths (image plus filtered stdout)."""
+
+    def __init__(self, folder: str, max_bytes: int = 512 * 1024 * 1024) -> None:
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self.index_file = os.path.join(folder, "index.json")
+        self.hits = 0
+        self.misses = 0
+        self.total_bytes = 0
+        self.entries = OrderedDict()
+        os.makedirs(folder, exist_ok=True)
+        self._load()
+
+    @staticmethod
+    def make_key(chart_hash: str, instrument: str, difficulty: str, squeeze_percent: int, **options) -> str:
+        parts = [chart_hash, instrument, difficulty, str(squeeze_percent)]
+        parts += [f"{name}={options[name]}" for name in sorted(options)]
+        return hashlib.sha256("|".join(parts).encode()).hexdigest()
+
+    def _load(self):
+        try:
+            with open(self.index_file, 'r') as f:
+                stored = json.load(f).get('entries', {})
+        except (FileNotFoundError, json.JSONDecodeError):
+            stored = {}
+        for key, entry in sorted(stored.items(), key=lambda item: item[1].get('last_access', 0)):
+            if os.path.exists(os.path.join(self.folder, entry['image'])):
+                self.entries[key] = entry
+                self.total_bytes += entry.get('size', 0)
+
+    def _save(self):
+        temp_file = f"{self.index_file}.tmp"
+        with open(temp_file, 'w') as f:
+            json.dump({'entries': self.entries}, f)
+        os.replace(temp_file, self.index_file)
+
+    def get(self, key: str) -> dict | None:
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        image_path = os.path.join(self.folder, entry['image'])
+        if not os.path.exists(image_path):
+            self._drop(key)
+            self.misses += 1
+            return None
+        entry['last_access'] = time.time()
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return {'image': image_path, 'output': entry['output']}
+
+    def put(self, key: str, image_path: str, output: str, shortname: str, version: int) -> dict:
+        image_name = f"{key}.png"
+        cached_path = os.path.join(self.folder, image_name)
+        shutil.copyfile(image_path, cached_path)
+        if key in self.entries:
+            self._drop(key, remove_file=False)
+        size = os.path.getsize(cached_path)
+        self.entries[key] = {'image': image_name, 'output': output, 'size': size,
+                             'shortname': shortname, 'version': version, 'last_access': time.time()}
+        self.total_bytes += size
+        self._evict()
+        self._save()
+        return {'image': cached_path, 'output': output}
+
+    def invalidate_track(self, shortname: str, keep_version: int = None) -> int:
+        stale = [key for key, entry in self.entries.items()
+                 if entry['shortname'] == shortname and entry['version'] != keep_version]
+        for key in stale:
+            self._drop(key)
+        if stale:
+            logging.info(f"Invalidated {len(stale)} cached paths for {shortname}.")
+            self._save()
+        return len(stale)
+
+    def _evict(self):
+        while self.total_bytes > self.max_bytes and len(self.entries) > 1:
+            self._drop(next(iter(self.entries)))
+
+    def _drop(self, key: str, remove_file: bool = True):
+        entry = self.entries.pop(key)
+        self.total_bytes -= entry.get('size', 0)
+        if remove_file:
+            try:
+                os.remove(os.path.join(self.folder, entry['image']))
+            except FileNotFoundError:
+                pass
+
+    def stats(self) -> dict:
+        return {'hits': self.hits, 'misses': self.misses, 'entries': len(self.entries), 'bytes': self.total_bytes}
@@ -0,0 +1,96 @@
+import asyncio
+import enum
+import logging
+import random
+import time
+
+
+class PollOutcome(enum.Enum):
+    CHANGED = "changed"
+    IDLE = "idle"
+    ERROR = "error"
+    RATE_LIMITED = "rate_limited"
+
+
+class AdaptivePoller:
+    """Runs `cycle` repeatedly, adapting the delay between runs to what it reports.
+
+    A cycle returns a PollOutcome (or a (PollOutcome, retry_after) tuple). Changes
+    reset the delay to `min_interval`; idle cycles back off exponentially up to
+    `max_interval`; errors and rate limits jump straight to at least
+    `error_interval` (or the server's Retry-After). Each delay gets +/- `jitter`.
+    Cycles run one after another in a single task, so they never overlap.
+    `on_cycle(outcome, duration)` is called after every cycle.
+    """
+
+    def __init__(self, cycle, min_interval: float = 10.0, max_interval: float = 300.0, backoff: float = 2.0,
+                 jitter: float = 0.2, error_interval: float = 60.0, on_cycle=None) -> None:
+        self.cycle = cycle
+        self.on_cycle = on_cycle
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.jitter = jitter
+        self.error_interval = error_interval
+        self.interval = min_interval
+        self.next_delay = 0.0
+        self.cycles = 0
+        self.last_outcome = None
+        self.last_cycle_duration = None
+        self.last_change_at = None
+        self._task = None
+
+    def is_running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        if not self.is_running():
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self.is_running():
+            self._task.cancel()
+
+    def _next_interval(self, outcome: PollOutcome, retry_after: float | None) -> float:
+        if outcome == PollOutcome.CHANGED:
+            self.last_change_at = time.time()
+            return self.min_interval
+        if outcome == PollOutcome.IDLE:
+            return min(self.max_interval, self.interval * self.backoff)
+        floor = max(self.error_interval, retry_after or 0)
+        return max(floor, min(self.max_interval, self.interval * self.backoff))
+
+    async def _run(self):
+        while True:
+            started = time.monotonic()
+            retry_after = None
+            try:
+                outcome = await self.cycle()
+                if isinstance(outcome, tuple):
+                    outcome, retry_after = outcome
+                outcome = outcome or PollOutcome.IDLE
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.error(f"Poll cycle failed: {e}")
+                outcome = PollOutcome.ERROR
+
+            self.cycles += 1
+            self.last_outcome = outcome
+            self.last_cycle_duration = time.monotonic() - started
+            if self.on_cycle:
+                self.on_cycle(outcome, self.last_cycle_duration)
+            self.interval = self._next_interval(outcome, retry_after)
+            self.next_delay = self.interval * random.uniform(1 - self.jitter, 1 + self.jitter)
+            logging.info(f"Poll cycle finished ({outcome.value}) in {self.last_cycle_duration:.2f}s, next in {self.next_delay:.0f}s.")
+            await asyncio.sleep(self.next_delay)
+
+    def stats(self) -> dict:
+        return {
+            'interval': self.interval,
+            'next_delay': self.next_delay,
+            'cycles': self.cycles,
+            'last_outcome': self.last_outcome.value if self.last_outcome else None,
+            'last_cycle_duration': self.last_cycle_duration,
+            'last_change_age': time.time() - self.last_change_at if self.last_change_at else None,
+        }
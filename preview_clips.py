@@ -0,0 +1,157 @@
+import asyncio
+import hashlib
+import io
+import logging
+import multiprocessing
+import os
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+import aiohttp
+
+from mp3_slice import UnsupportedFormat, slice_mp3
+
+RECENT_CLIP_TTL = 300.0
+
+
+def clip_audio(audio_data: bytes, start_ms: int | None, end_ms: int | None) -> bytes:
+    from pydub import AudioSegment
+
+    audio = AudioSegment.from_file(io.BytesIO(audio_data), format="mp3")
+    if start_ms is not None and end_ms is not None:
+        if start_ms < end_ms and start_ms >= 0 and end_ms <= len(audio):
+            audio = audio[start_ms:end_ms]
+            logging.info(f"Trimmed audio from {start_ms}ms to {end_ms}ms")
+        else:
+            logging.warning(f"Invalid trim parameters: start={start_ms}, end={end_ms}, audio_length={len(audio)}")
+    buffer = io.BytesIO()
+    audio.export(buffer, format="mp3")
+    return buffer.getvalue()
+
+
+class PreviewClipService:
+    """Builds audio preview clips and keeps the results on disk.
+
+    MP3 sources are cut at frame boundaries without re-encoding; anything the frame
+    slicer can't handle is decoded and re-encoded with pydub in a process pool.
+
+    Clips are keyed by source URL, the source's ETag (or content hash when the server
+    sends none) and the preview window, and concurrent requests for the same clip
+    share one in-flight job.
+    """
+
+    def __init__(self, folder: str, workers: int = 2, max_bytes: int = 256 * 1024 * 1024) -> None:
+        self.folder = folder
+        self.workers = workers
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._executor = None
+        self._in_flight = {}
+        self._recent = OrderedDict()
+        os.makedirs(folder, exist_ok=True)
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context('spawn'))
+        return self._executor
+
+    def _clip_path(self, url: str, version: str, start_ms, end_ms) -> str:
+        key = hashlib.sha256(f"{url}|{version}|{start_ms}|{end_ms}".encode()).hexdigest()
+        return os.path.join(self.folder, f"{key}.mp3")
+
+    async def get_clip(self, urls: list, start_ms: int | None, end_ms: int | None) -> str | None:
+        """Returns the path of a cached clip built from the first URL that can be fetched."""
+        flight_key = (tuple(urls), start_ms, end_ms)
+        recent = self._recent.get(flight_key)
+        if recent and recent[1] > time.monotonic() and os.path.exists(recent[0]):
+            self._touch(recent[0])
+            return recent[0]
+
+        if (task := self._in_flight.get(flight_key)) is None:
+            task = asyncio.create_task(self._build_clip(urls, start_ms, end_ms))
+            self._in_flight[flight_key] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(flight_key, None))
+        clip_path = await asyncio.shield(task)
+        if clip_path:
+            self._remember(flight_key, clip_path)
+        return clip_path
+
+    def _remember(self, flight_key: tuple, clip_path: str):
+        """Records a recent clip; entries are kept in expiry order, so expired ones are dropped from the front."""
+        now = time.monotonic()
+        self._recent[flight_key] = (clip_path, now + RECENT_CLIP_TTL)
+        self._recent.move_to_end(flight_key)
+        while self._recent and next(iter(self._recent.values()))[1] <= now:
+            self._recent.popitem(last=False)
+
+    async def _build_clip(self, urls: list, start_ms, end_ms) -> str | None:
+        async with aiohttp.ClientSession() as session:
+            for url in urls:
+                try:
+                    # Hosts that refuse HEAD are treated as sending no ETag; only a failed GET skips the URL.
+                    etag = None
+                    try:
+                        async with session.head(url, allow_redirects=True) as response:
+                            if response.status == 200:
+                                etag = response.headers.get('ETag') or response.headers.get('Last-Modified')
+                            else:
+                                logging.info(f"HEAD {url} returned {response.status}; fetching without an ETag.")
+                    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                        logging.info(f"HEAD {url} failed ({e}); fetching without an ETag.")
+
+                    if etag and os.path.exists(clip_path := self._clip_path(url, etag, start_ms, end_ms)):
+                        self._touch(clip_path)
+                        return clip_path
+
+                    logging.info(f"Attempting to fetch audio from: {url}")
+                    async with session.get(url) as response:
+                        if response.status != 200:
+                            logging.warning(f"Failed to fetch {url}. Status: {response.status}")
+                            continue
+                        audio_data = await response.read()
+                        etag = response.headers.get('ETag') or response.headers.get('Last-Modified') \
+                            or hashlib.sha256(audio_data).hexdigest()
+
+                    clip_path = self._clip_path(url, etag, start_ms, end_ms)
+                    if os.path.exists(clip_path):
+                        self._touch(clip_path)
+                        return clip_path
+
+                    self.misses += 1
+                    try:
+                        clip_data = await asyncio.to_thread(slice_mp3, audio_data, start_ms, end_ms)
+                    except UnsupportedFormat as e:
+                        logging.info(f"Falling back to a full decode for {url}: {e}")
+                        loop = asyncio.get_running_loop()
+                        clip_data = await loop.run_in_executor(self.executor, clip_audio, audio_data, start_ms, end_ms)
+                    self._store(clip_path, clip_data)
+                    return clip_path
+                except Exception as e:
+                    logging.warning(f"Failed to process {url}: {e}")
+                    continue
+        return None
+
+    def _touch(self, clip_path: str):
+        self.hits += 1
+        os.utime(clip_path)
+
+    def _store(self, clip_path: str, clip_data: bytes):
+        temp_file = f"{clip_path}.tmp"
+        with open(temp_file, 'wb') as f:
+            f.write(clip_data)
+        os.replace(temp_file, clip_path)
+
+        entries = [(entry.stat().st_mtime, entry.stat().st_size, entry.path)
+                   for entry in os.scandir(self.folder) if entry.name.endswith('.mp3')]
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes: break
+            if path == clip_path: continue
+            os.remove(path)
+            total -= size
+
+    def stats(self) -> dict:
+        return {'hits': self.hits, 'misses': self.misses, 'in_flight': len(self._in_flight)}
@@ -0,0 +1,137 @@
+import asyncio
+import cProfile
+import functools
+import logging
+import os
+import random
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+MODES = ('cpu', 'memory', 'both')
+
+
+class ProfileTarget:
+    __slots__ = ('remaining', 'sample_percent', 'mode')
+
+    def __init__(self, remaining: int | None, sample_percent: float | None, mode: str) -> None:
+        self.remaining = remaining
+        self.sample_percent = sample_percent
+        self.mode = mode
+
+
+class Profiler:
+    """Opt-in cProfile/tracemalloc capture for named call sites.
+
+    A target is armed for the next N calls, for a sampling percentage of calls, or
+    both (N sampled calls). Unarmed targets cost one dict lookup. Only one capture runs
+    at a time; calls that arrive while another capture is active run unprofiled.
+
+    cProfile only sees the thread that armed it, so targets are synchronous functions,
+    whether they run on the loop or in `asyncio.to_thread`. Profiling a coroutine would
+    also capture every other task the loop ran across its awaits, so `profiled()`
+    refuses coroutine functions.
+    Dumps go to `folder` as `<target>-<timestamp>.prof` (cProfile) and `.snapshot`
+    (tracemalloc), keeping the newest `retention` files.
+    """
+
+    def __init__(self, folder: str, retention: int = 20) -> None:
+        self.folder = folder
+        self.retention = retention
+        self.targets = {}
+        self._active = False
+        self._lock = threading.Lock()
+        self._sequence = 0
+        os.makedirs(folder, exist_ok=True)
+
+    def arm(self, name: str, calls: int | None = None, sample_percent: float | None = None, mode: str = 'cpu'):
+        if mode not in MODES:
+            raise ValueError(f"Unknown profiling mode '{mode}'.")
+        if calls is None and sample_percent is None:
+            calls = 1
+        self.targets[name] = ProfileTarget(calls, sample_percent, mode)
+        logging.info(f"Profiling armed for {name}: calls={calls}, sample={sample_percent}%, mode={mode}.")
+
+    def disarm(self, name: str):
+        self.targets.pop(name, None)
+
+    def _claim(self, name: str) -> str | None:
+        """Takes the capture slot for one call of `name` if it is armed; callable from any thread."""
+        if name not in self.targets:
+            return None
+        with self._lock:
+            target = self.targets.get(name)
+            if target is None or self._active:
+                return None
+            if target.sample_percent is not None and random.uniform(0, 100) >= target.sample_percent:
+                return None
+            if target.remaining is not None:
+                target.remaining -= 1
+                if target.remaining <= 0:
+                    self.disarm(name)
+            self._active = True
+            return target.mode
+
+    @contextmanager
+    def session(self, name: str):
+        if (mode := self._claim(name)) is None:
+            yield
+            return
+
+        profile = cProfile.Profile() if mode in ('cpu', 'both') else None
+        started_tracing = mode in ('memory', 'both') and not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start(25)
+        started = time.perf_counter()
+        if profile:
+            profile.enable()
+        try:
+            yield
+        finally:
+            if profile:
+                profile.disable()
+            elapsed = time.perf_counter() - started
+            snapshot = tracemalloc.take_snapshot() if mode in ('memory', 'both') and tracemalloc.is_tracing() else None
+            if started_tracing:
+                tracemalloc.stop()
+            with self._lock:
+                self._active = False
+            try:
+                self._dump(name, profile, snapshot, elapsed)
+            except OSError as e:
+                logging.error(f"Failed to write profile for {name}: {e}")
+
+    def profiled(self, name: str):
+        """Decorator that runs `session(name)` around each call of a synchronous function."""
+        def decorator(func):
+            if asyncio.iscoroutinefunction(func):
+                raise TypeError(f"Cannot profile coroutine function {func.__qualname__}; profile the synchronous work it runs instead.")
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.session(name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def _dump(self, name: str, profile: cProfile.Profile | None, snapshot, elapsed: float):
+        self._sequence += 1
+        base = os.path.join(self.folder, f"{name}-{time.strftime('%Y%m%d-%H%M%S')}-{self._sequence}")
+        if profile:
+            profile.dump_stats(f"{base}.prof")
+        if snapshot:
+            snapshot.dump(f"{base}.snapshot")
+        logging.info(f"Profiled {name} ({elapsed:.3f}s) to {base}.*")
+        self._rotate()
+
+    def _rotate(self):
+        dumps = sorted((entry.stat().st_mtime, entry.path) for entry in os.scandir(self.folder)
+                       if entry.name.endswith(('.prof', '.snapshot')))
+        for _, path in dumps[:max(0, len(dumps) - self.retention)]:
+            os.remove(path)
+
+    def recent_dumps(self, limit: int = 5) -> list[str]:
+        dumps = sorted(((entry.stat().st_mtime, entry.name) for entry in os.scandir(self.folder)
+                        if entry.name.endswith(('.prof', '.snapshot'))), reverse=True)
+        return [name for _, name in dumps[:limit]]
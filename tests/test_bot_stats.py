@@ -0,0 +1,52 @@
+import json
+import os
+import tempfile
+import unittest
+
+from bot_stats import BotStats
+
+
+class BotStatsHistoryTest(unittest.TestCase):
+    def setUp(self):
+        scratch = tempfile.TemporaryDirectory()
+        self.addCleanup(scratch.cleanup)
+        self.stats_file = os.path.join(scratch.name, 'bot_stats.json')
+        self.history_file = os.path.join(scratch.name, 'track_history.json')
+        self.history = {}
+
+    def save_history(self, track_id: str, timestamp: str):
+        self.history.setdefault(track_id, []).insert(0, {'timestamp': timestamp, 'changes': []})
+        with open(self.history_file, 'w') as f:
+            json.dump(self.history, f)
+
+    def loaded(self) -> BotStats:
+        stats = BotStats(self.stats_file)
+        stats.load(self.history_file)
+        return stats
+
+    def test_saved_updates_survive_a_reload(self):
+        stats = self.loaded()
+        self.save_history('a', '2026-01-01T00:00:00')
+        stats.record_saved_updates(self.history_file, ['2026-01-01T00:00:00'])
+        stats.save()
+
+        reloaded = self.loaded()
+        self.assertEqual(reloaded.updates, 1)
+        self.assertEqual(reloaded.latest_update, '2026-01-01T00:00:00')
+
+    def test_history_saved_without_stats_is_rebuilt(self):
+        stats = self.loaded()
+        self.save_history('a', '2026-01-01T00:00:00')
+        stats.record_saved_updates(self.history_file, ['2026-01-01T00:00:00'])
+        stats.save()
+        # The process dies after writing the history but before saving the stats.
+        self.save_history('b', '2026-01-02T00:00:00')
+
+        reloaded = self.loaded()
+        self.assertEqual(reloaded.updates, 2)
+        self.assertEqual(reloaded.latest_update, '2026-01-02T00:00:00')
+        self.assertEqual(self.loaded().updates, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
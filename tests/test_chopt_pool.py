@@ -0,0 +1,96 @@
+import asyncio
+import sys
+import time
+import unittest
+
+from chopt_pool import PRIORITY_BACKGROUND, ChoptPool, ChoptQueueFull, ChoptTimeout
+
+
+def stub(label: str, seconds: float = 0.0) -> list:
+    """A stand-in for the CHOpt executable that sleeps, then prints `label`."""
+    return [sys.executable, '-c', f"import time; time.sleep({seconds}); print({label!r})"]
+
+
+class ChoptPoolTest(unittest.IsolatedAsyncioTestCase):
+    async def start_blocker(self, pool: ChoptPool, seconds: float = 0.5) -> asyncio.Task:
+        blocker = asyncio.create_task(pool.run(stub('blocker', seconds), user_id='blocker'))
+        while pool.running == 0:
+            await asyncio.sleep(0.01)
+        return blocker
+
+    async def test_users_are_served_round_robin(self):
+        pool = ChoptPool(workers=1)
+        blocker = await self.start_blocker(pool)
+        finished = []
+
+        async def render(user_id: str, label: str):
+            _, stdout, _ = await pool.run(stub(label), user_id=user_id)
+            finished.append(stdout.strip())
+
+        jobs = [asyncio.create_task(render('a', label)) for label in ('a1', 'a2', 'a3')]
+        await asyncio.sleep(0)
+        jobs.append(asyncio.create_task(render('b', 'b1')))
+        await asyncio.gather(blocker, *jobs)
+        self.assertEqual(finished, ['a1', 'b1', 'a2', 'a3'])
+
+    async def test_full_queue_rejects_new_jobs(self):
+        pool = ChoptPool(workers=1, max_queue=2)
+        blocker = await self.start_blocker(pool)
+        queued = [asyncio.create_task(pool.run(stub(str(i)), user_id=i)) for i in range(2)]
+        await asyncio.sleep(0)
+        with self.assertRaises(ChoptQueueFull):
+            await pool.run(stub('rejected'), user_id='late')
+        await asyncio.gather(blocker, *queued)
+        self.assertEqual(pool.queue_depth, 0)
+
+    async def test_timeout_kills_the_process(self):
+        pool = ChoptPool(workers=1)
+        started = time.monotonic()
+        with self.assertRaises(ChoptTimeout):
+            await pool.run(stub('slow', 30), timeout=0.5)
+        self.assertLess(time.monotonic() - started, 10)
+        self.assertEqual(pool.running, 0)
+
+    async def test_interactive_job_preempts_and_requeues_background_work(self):
+        pool = ChoptPool(workers=1)
+        background = asyncio.create_task(pool.run(stub('background', 1.0), priority=PRIORITY_BACKGROUND))
+        while pool.running == 0:
+            await asyncio.sleep(0.01)
+
+        _, stdout, _ = await pool.run(stub('interactive'), user_id='user')
+        self.assertEqual(stdout.strip(), 'interactive')
+        self.assertFalse(background.done())
+        _, stdout, _ = await background
+        self.assertEqual(stdout.strip(), 'background')
+
+    async def test_reserved_batch_uses_one_admission(self):
+        pool = ChoptPool(workers=1, max_queue=2)
+        blocker = await self.start_blocker(pool)
+        with pool.reserve():
+            batch = [asyncio.create_task(pool.run(stub(f'batch{i}'), user_id='batch', reserved=True)) for i in range(4)]
+            single = asyncio.create_task(pool.run(stub('single'), user_id='single'))
+            await asyncio.sleep(0)
+            with self.assertRaises(ChoptQueueFull):
+                await pool.run(stub('rejected'), user_id='late')
+            with self.assertRaises(ChoptQueueFull):
+                with pool.reserve():
+                    pass
+            await asyncio.gather(blocker, single, *batch)
+
+    async def test_positions_are_only_reported_while_waiting(self):
+        pool = ChoptPool(workers=1)
+        idle_positions, waiting_positions = [], []
+
+        async def record(positions: list, position: int):
+            positions.append(position)
+
+        await pool.run(stub('idle'), on_position=lambda p: record(idle_positions, p))
+        blocker = await self.start_blocker(pool)
+        await asyncio.gather(blocker, pool.run(stub('waiting'), user_id='user', on_position=lambda p: record(waiting_positions, p)))
+        await asyncio.sleep(0)
+        self.assertEqual(idle_positions, [])
+        self.assertEqual(waiting_positions, [1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import cluster
+from cluster import ClusterStore, shard_for_guild
+
+
+class ClusterStoreLeaseTest(unittest.TestCase):
+    def setUp(self):
+        scratch = tempfile.TemporaryDirectory()
+        self.addCleanup(scratch.cleanup)
+        self.store = ClusterStore(os.path.join(scratch.name, 'cluster.db'))
+        self.now = 1_000_000.0
+        clock = mock.patch.object(cluster.time, 'time', side_effect=lambda: self.now)
+        clock.start()
+        self.addCleanup(clock.stop)
+
+    def test_holder_renews_its_own_lease(self):
+        self.assertTrue(self.store.acquire_lease('poller', 'a', ttl=10))
+        self.now += 8
+        self.assertTrue(self.store.acquire_lease('poller', 'a', ttl=10))
+        self.now += 8
+        self.assertEqual(self.store.lease_holder('poller'), 'a')
+        self.assertFalse(self.store.acquire_lease('poller', 'b', ttl=10))
+
+    def test_valid_lease_refuses_other_holders(self):
+        self.assertTrue(self.store.acquire_lease('poller', 'a', ttl=10))
+        self.now += 9.9
+        self.assertFalse(self.store.acquire_lease('poller', 'b', ttl=10))
+        self.assertEqual(self.store.lease_holder('poller'), 'a')
+
+    def test_expired_lease_is_taken_over(self):
+        self.assertTrue(self.store.acquire_lease('poller', 'a', ttl=10))
+        self.now += 10.1
+        self.assertIsNone(self.store.lease_holder('poller'))
+        self.assertTrue(self.store.acquire_lease('poller', 'b', ttl=10))
+        self.assertEqual(self.store.lease_holder('poller'), 'b')
+        self.assertFalse(self.store.acquire_lease('poller', 'a', ttl=10))
+
+    def test_released_lease_is_free_immediately(self):
+        self.assertTrue(self.store.acquire_lease('poller', 'a', ttl=10))
+        self.store.release_lease('poller', 'b')
+        self.assertEqual(self.store.lease_holder('poller'), 'a')
+        self.store.release_lease('poller', 'a')
+        self.assertTrue(self.store.acquire_lease('poller', 'b', ttl=10))
+
+
+class ShardRoutingTest(unittest.TestCase):
+    def test_matches_discord_sharding_formula(self):
+        guild_id = 81384788765712384
+        self.assertEqual(shard_for_guild(guild_id, 4), (guild_id >> 22) % 4)
+        self.assertEqual(shard_for_guild(guild_id, 1), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
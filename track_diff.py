@@ -0,0 +1,73 @@
+from collections.abc import Mapping
+from typing import Any, NamedTuple
+
+
+class Change(NamedTuple):
+    path: str
+    old: Any
+    new: Any
+
+
+class IgnoreTrie:
+    """Precompiled set of ignored dotted key prefixes, matched segment by segment."""
+
+    def __init__(self, prefixes: list) -> None:
+        self.root = {}
+        for prefix in prefixes:
+            node = self.root
+            for segment in prefix.split('.'):
+                node = node.setdefault(segment, {})
+            node[None] = True
+
+    def child(self, node: dict, key: str) -> dict | None:
+        """Returns the trie node for `key` below `node`, or None when `key` is ignored."""
+        next_node = node.get(key) if node else None
+        if next_node is not None and next_node.get(None):
+            return None
+        return next_node or {}
+
+
+def _leaves(value, path: str):
+    if isinstance(value, Mapping):
+        for key in value:
+            yield from _leaves(value[key], f"{path}.{key}")
+    else:
+        yield path, value
+
+
+def _diff(old: dict, new: dict, ignored: IgnoreTrie, node: dict, prefix: str, changes: list):
+    for key in sorted(old.keys() | new.keys()):
+        child_node = ignored.child(node, key)
+        if child_node is None: continue
+
+        old_value, new_value = old.get(key), new.get(key)
+        if old_value is new_value or old_value == new_value: continue
+
+        path = f"{prefix}{key}"
+        old_is_dict, new_is_dict = isinstance(old_value, Mapping), isinstance(new_value, Mapping)
+        if old_is_dict and new_is_dict:
+            _diff(old_value, new_value, ignored, child_node, f"{path}.", changes)
+        elif old_is_dict or new_is_dict:
+            leaves = [(leaf, value, None) for leaf, value in _leaves(old_value, path)] if old_is_dict \
+                else [(path, old_value, None)]
+            leaves += [(leaf, None, value) for leaf, value in _leaves(new_value, path)] if new_is_dict \
+                else [(path, None, new_value)]
+            changes.extend(Change(leaf, o, n) for leaf, o, n in sorted(leaves, key=lambda c: c[0]) if o != n)
+        else:
+            changes.append(Change(path, old_value, new_value))
+
+
+def diff_tracks(old: dict, new: dict, ignored: IgnoreTrie = None) -> list[Change]:
+    """Returns the leaf-level changes between two track dicts, keyed by dotted path.
+
+    Equal nested subtrees are skipped with a single comparison instead of being
+    flattened, and ignored prefixes are pruned before their subtrees are visited.
+    """
+    changes = []
+    ignored = ignored or IgnoreTrie([])
+    _diff(old, new, ignored, ignored.root, '', changes)
+    return changes
+
+
+def changes_to_dict(changes: list[Change]) -> dict:
+    return {change.path: {'old': change.old, 'new': change.new} for change in changes}
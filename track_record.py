@@ -0,0 +1,196 @@
+import sys
+from collections.abc import Mapping
+
+# Fields whose values repeat across the catalog; one interned copy is shared by every track.
+INTERNED_FIELDS = ('artist', 'album', 'genre', 'key', 'rating', 'charter', 'complete', 'embedColor', 'format')
+
+_schemas = {}
+_difficulty_indexes = {}
+
+
+def _intern(value):
+    return sys.intern(value) if type(value) is str else value
+
+
+def _intern_nested(value):
+    if type(value) is dict:
+        return {sys.intern(k): _intern_nested(v) for k, v in value.items()}
+    return _intern(value)
+
+
+def _schema(keys: tuple) -> tuple:
+    """Returns the shared (key order, present known fields, absent known fields) for tracks with exactly these keys."""
+    if (schema := _schemas.get(keys)) is None:
+        schema = _schemas[keys] = (tuple(sys.intern(k) for k in keys), FIELD_SET.intersection(keys),
+                                   tuple(name for name in FIELDS if name not in keys))
+    return schema
+
+
+class Difficulties(Mapping):
+    """Read-only instrument -> level mapping stored as one tuple of levels.
+
+    Tracks with the same instruments in the same order share a single key index.
+    """
+
+    __slots__ = ('_index', '_levels')
+
+    def __init__(self, difficulties: dict) -> None:
+        keys = tuple(difficulties)
+        if (index := _difficulty_indexes.get(keys)) is None:
+            index = _difficulty_indexes[keys] = {sys.intern(k): i for i, k in enumerate(keys)}
+        self._index = index
+        self._levels = tuple(difficulties.values())
+
+    def __getitem__(self, instrument: str):
+        return self._levels[self._index[instrument]]
+
+    def get(self, instrument: str, default=None):
+        i = self._index.get(instrument)
+        return default if i is None else self._levels[i]
+
+    def __contains__(self, instrument) -> bool:
+        return instrument in self._index
+
+    def __iter__(self):
+        return iter(self._index)
+
+    def __len__(self) -> int:
+        return len(self._levels)
+
+    def values(self):
+        return self._levels
+
+    def __eq__(self, other) -> bool:
+        if type(other) is Difficulties and self._index is other._index:
+            return self._levels == other._levels
+        return Mapping.__eq__(self, other)
+
+    __hash__ = None
+
+    def to_dict(self) -> dict:
+        return dict(zip(self._index, self._levels))
+
+    def __repr__(self) -> str:
+        return f"Difficulties({self.to_dict()!r})"
+
+
+class Track(Mapping):
+    """Compact, read-only catalog entry.
+
+    Known fields are slots (None when the source JSON omitted them), so hot paths can
+    read `track.title` directly. Everything else stays reachable through the dict
+    interface (`track['x']`, `track.get('x')`, `'x' in track`), which answers exactly
+    as the original dict would, and `to_dict()` reproduces the original JSON. Those
+    lookups cost one set check and a slot read for known fields; only names the
+    source JSON did not have fall through to `_extra`.
+    """
+
+    __slots__ = ('id', 'title', 'artist', 'album', 'genre', 'releaseYear', 'duration', 'bpm', 'key', 'rating',
+                 'charter', 'complete', 'createdAt', 'lastFeatured', 'currentversion', 'cover', 'previewUrl',
+                 'previewTime', 'previewEndTime', 'videoUrl', 'spotify', 'download', 'charturl', 'format',
+                 'loading_phrase', 'difficulties', 'youtubeLinks', 'embedColor', 'modalShadowColors',
+                 'new', 'rotated', 'finish', '_keys', '_fields', '_extra')
+
+    id: str
+    title: str | None
+    artist: str | None
+    album: str | None
+    genre: str | None
+    releaseYear: int | None
+    duration: str | None
+    bpm: int | float | None
+    key: str | None
+    rating: str | None
+    charter: str | None
+    complete: str | None
+    createdAt: str | None
+    lastFeatured: str | None
+    currentversion: int | None
+    cover: str | None
+    previewUrl: str | None
+    previewTime: int | None
+    previewEndTime: int | None
+    videoUrl: str | None
+    spotify: str | None
+    download: str | None
+    charturl: str | None
+    format: str | None
+    loading_phrase: str | None
+    difficulties: Difficulties | None
+    youtubeLinks: dict | None
+    embedColor: str | None
+    modalShadowColors: dict | None
+    new: bool | None
+    rotated: bool | None
+    finish: bool | None
+
+    def __init__(self, data: dict) -> None:
+        set_slot = object.__setattr__
+        keys, fields, absent = _schema(tuple(data))
+        set_slot(self, '_keys', keys)
+        set_slot(self, '_fields', fields)
+        for name in absent:
+            set_slot(self, name, None)
+        extra = None
+        for name, value in data.items():
+            if name in FIELD_SET:
+                if (convert := _CONVERTERS.get(name)) is not None:
+                    value = convert(value)
+                set_slot(self, name, value)
+            else:
+                if extra is None:
+                    extra = {}
+                extra[name] = _intern_nested(value)
+        set_slot(self, '_extra', extra)
+
+    @classmethod
+    def coerce(cls, track) -> 'Track':
+        return track if type(track) is cls else cls(track)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Track records are read-only; build a new one from to_dict().")
+
+    def __getitem__(self, name: str):
+        if name in self._fields:
+            return getattr(self, name)
+        if (extra := self._extra) is not None and name in extra:
+            return extra[name]
+        raise KeyError(name)
+
+    def get(self, name: str, default=None):
+        if name in self._fields:
+            return getattr(self, name)
+        extra = self._extra
+        return default if extra is None else extra.get(name, default)
+
+    def __contains__(self, name) -> bool:
+        return name in self._fields or (self._extra is not None and name in self._extra)
+
+    def __iter__(self):
+        return iter(self._keys)
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    __hash__ = None
+
+    def to_dict(self) -> dict:
+        data = {name: getattr(self, name) if name in self._fields else self._extra[name] for name in self._keys}
+        if type(difficulties := data.get('difficulties')) is Difficulties:
+            data['difficulties'] = difficulties.to_dict()
+        return data
+
+    def __repr__(self) -> str:
+        return f"Track({self.id!r})"
+
+    def __reduce__(self):
+        return (Track, (self.to_dict(),))
+
+
+FIELDS = tuple(name for name in Track.__slots__ if not name.startswith('_'))
+FIELD_SET = frozenset(FIELDS)
+_CONVERTERS = {
+    **dict.fromkeys(INTERNED_FIELDS, _intern),
+    'difficulties': lambda value: Difficulties(value) if type(value) is dict else value,
+    'modalShadowColors': _intern_nested,
+}
@@ -0,0 +1,98 @@
+import codecs
+import json
+import re
+
+CHUNK_SIZE = 64 * 1024
+WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+
+class TrackStreamError(ValueError):
+    pass
+
+
+class TrackStreamParser:
+    """Incremental parser for the live catalog's top-level `{track_id: {...}, ...}` object.
+
+    Bytes are fed as they arrive and each `(track_id, track_info)` pair is returned as
+    soon as its closing brace has been read, so only the unparsed tail of the stream is
+    buffered. A single track larger than `max_record_size` characters is rejected rather
+    than buffered without bound.
+    """
+
+    def __init__(self, max_record_size: int = 4 * 1024 * 1024) -> None:
+        self.max_record_size = max_record_size
+        self._decoder = json.JSONDecoder()
+        self._text = codecs.getincrementaldecoder('utf-8')()
+        self._buffer = ''
+        self._state = 'start'
+        self._key = None
+
+    def feed(self, chunk: bytes) -> list[tuple[str, dict]]:
+        self._buffer += self._text.decode(chunk)
+        return self._drain(final=False)
+
+    def close(self) -> list[tuple[str, dict]]:
+        self._buffer += self._text.decode(b'', final=True)
+        entries = self._drain(final=True)
+        if self._state != 'done':
+            raise TrackStreamError("Catalog ended before its closing brace.")
+        return entries
+
+    def _decode(self, buffer: str, pos: int, final: bool):
+        try:
+            return self._decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError as e:
+            if final:
+                raise TrackStreamError(f"Malformed catalog: {e}") from e
+            return None
+
+    def _drain(self, final: bool) -> list[tuple[str, dict]]:
+        buffer, pos, entries = self._buffer, 0, []
+        while (pos := WHITESPACE.match(buffer, pos).end()) < len(buffer):
+            char = buffer[pos]
+            if self._state == 'start':
+                if char != '{':
+                    raise TrackStreamError(f"Expected a dictionary of tracks, got {char!r}.")
+                self._state, pos = 'first_key', pos + 1
+            elif self._state in ('first_key', 'key'):
+                if char == '}' and self._state == 'first_key':
+                    self._state, pos = 'done', pos + 1
+                    continue
+                if char != '"':
+                    raise TrackStreamError(f"Expected a track id at offset {pos}, got {char!r}.")
+                if (decoded := self._decode(buffer, pos, final)) is None:
+                    break
+                (self._key, pos), self._state = decoded, 'colon'
+            elif self._state == 'colon':
+                if char != ':':
+                    raise TrackStreamError(f"Expected ':' after track id {self._key!r}, got {char!r}.")
+                self._state, pos = 'value', pos + 1
+            elif self._state == 'value':
+                if char != '{':
+                    raise TrackStreamError(f"Track {self._key!r} is not an object.")
+                if (decoded := self._decode(buffer, pos, final)) is None:
+                    break
+                track_info, pos = decoded
+                entries.append((self._key, track_info))
+                self._state = 'separator'
+            elif self._state == 'separator':
+                if char not in ',}':
+                    raise TrackStreamError(f"Expected ',' or '}}' after track {self._key!r}, got {char!r}.")
+                self._state, pos = 'key' if char == ',' else 'done', pos + 1
+            else:
+                raise TrackStreamError("Unexpected data after the end of the catalog.")
+
+        self._buffer = buffer[pos:]
+        if len(self._buffer) > self.max_record_size:
+            raise TrackStreamError(f"Track after {self._key!r} exceeds {self.max_record_size} characters.")
+        return entries
+
+
+async def iter_track_entries(chunks):
+    """Yields `(track_id, track_info)` pairs from an async iterator of response body chunks."""
+    parser = TrackStreamParser()
+    async for chunk in chunks:
+        for entry in parser.feed(chunk):
+            yield entry
+    for entry in parser.close():
+        yield entry
@@ -0,0 +1,56 @@
+import logging
+import os
+import shutil
+import tempfile
+import time
+
+_active_workspaces = set()
+
+
+class SessionWorkspace:
+    """A private directory for one job's temporary files, removed as a unit."""
+
+    def __init__(self, root: str, prefix: str = "session") -> None:
+        os.makedirs(root, exist_ok=True)
+        self.path = tempfile.mkdtemp(prefix=f"{prefix}_", dir=root)
+        _active_workspaces.add(self.path)
+
+    def file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def cleanup(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+        _active_workspaces.discard(self.path)
+
+    def detach(self):
+        """Gives up ownership without deleting, leaving the directory to sweep_orphaned_workspaces."""
+        _active_workspaces.discard(self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.cleanup()
+
+
+def sweep_orphaned_workspaces(root: str, max_age: float) -> int:
+    """Removes workspace directories under `root` that no live job owns and that are older than `max_age` seconds."""
+    removed, cutoff = 0, time.time() - max_age
+    try:
+        entries = list(os.scandir(root))
+    except FileNotFoundError:
+        return 0
+    for entry in entries:
+        if entry.path in _active_workspaces: continue
+        try:
+            if entry.stat().st_mtime > cutoff: continue
+            if entry.is_dir():
+                shutil.rmtree(entry.path, ignore_errors=True)
+            else:
+                os.remove(entry.path)
+            removed += 1
+        except FileNotFoundError:
+            continue
+    if removed:
+        logging.info(f"Removed {removed} orphaned workspace entries from {root}.")
+    return removed